@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Compare parsing a whole compare response with reading only its commits.
+
+Uses a stored compare API response (a synthetic one with many changed files
+is generated if --fixture isn't given) and reports the parse time, peak RSS
+and bytes read of decoding the whole body with json.loads versus streaming
+just the `commits` array out of it. Each method runs in its own process so
+that peak RSS is measured separately.
+
+    python -m benchmarks.compare_parsing --files 3000
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from changelog.client import STREAM_CHUNK_SIZE
+from changelog.jsonstream import iter_array
+from changelog.tests.stub_server import (
+    compare_response,
+    synthetic_commits,
+    synthetic_files,
+)
+
+
+def read_chunks(path, counter):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+            counter[0] += len(chunk)
+            yield chunk
+
+
+def whole(path):
+    counter = [0]
+    content = b"".join(read_chunks(path, counter))
+    commits = json.loads(content.decode("utf-8"))["commits"]
+    return [(c["sha"], c["commit"]["message"]) for c in commits], counter[0]
+
+
+def streaming(path):
+    counter = [0]
+    commits = iter_array(read_chunks(path, counter), "commits")
+    return [(c["sha"], c["commit"]["message"]) for c in commits], counter[0]
+
+
+METHODS = {"whole": whole, "streaming": streaming}
+
+
+def max_rss_kib():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024.0 if sys.platform == "darwin" else float(rss)
+
+
+def run(method, path, repeat):
+    """Measure one method in this process and print the results as JSON"""
+    baseline = max_rss_kib()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        commits, read = METHODS[method](path)
+        timings.append(time.perf_counter() - start)
+    print(
+        json.dumps(
+            {
+                "commits": len(commits),
+                "best": min(timings),
+                "peak_rss_kib": max_rss_kib() - baseline,
+                "read": read,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", help="stored compare API response")
+    parser.add_argument("--commits", type=int, default=250)
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--method", choices=sorted(METHODS), help="internal")
+    args = parser.parse_args()
+
+    if args.method is not None:
+        return run(args.method, args.fixture, args.repeat)
+
+    path = args.fixture
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                compare_response(
+                    synthetic_commits(args.commits),
+                    synthetic_files(args.files),
+                ),
+                f,
+            )
+    print("{}: {:.1f} MiB".format(path, os.path.getsize(path) / 2.0**20))
+
+    try:
+        for method in ("whole", "streaming"):
+            output = subprocess.check_output(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.compare_parsing",
+                    "--method",
+                    method,
+                    "--fixture",
+                    path,
+                    "--repeat",
+                    str(args.repeat),
+                ]
+            )
+            result = json.loads(output.decode("utf-8"))
+            print(
+                "{:<10} {:>5} commits  best {:>8.4f}s  "
+                "peak RSS +{:>8.1f} KiB  read {:>8.1f} KiB".format(
+                    method,
+                    result["commits"],
+                    result["best"],
+                    result["peak_rss_kib"],
+                    result["read"] / 1024.0,
+                )
+            )
+    finally:
+        if args.fixture is None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Measure end-to-end fetch_changes latency against a slow GitHub API.
+
+Runs against a local stub server that delays every response, comparing
+resolving the two ends of the range one after the other with the concurrent
+resolution that fetch_changes does.
+
+    python -m benchmarks.latency --latency 0.1
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubClient,
+    GitHubCommitSource,
+    extract_pr,
+    fetch_changes,
+    get_github_config,
+    is_pr,
+    resolve_current_commit,
+    resolve_previous_commit,
+)
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+def sequential(github_config, client):
+    source = GitHubCommitSource(github_config, "o", "r", client)
+    previous_commit = resolve_previous_commit(source)
+    current_commit = resolve_current_commit(source)
+    commits = source.iter_commits_between(previous_commit, current_commit)
+    return [extract_pr(c.message) for c in commits if is_pr(c.message)]
+
+
+def concurrent(github_config, client):
+    return fetch_changes(github_config, "o", "r", client=client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--latency", type=float, default=0.1, help="seconds per request"
+    )
+    parser.add_argument("--commits", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    commits = synthetic_commits(args.commits + 1)
+    repo = StubRepo(commits, {"1.0.0": commits[0]["sha"]})
+    with StubGitHub(repo, latency=args.latency) as stub:
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, stub.api_url, None
+        )
+        for func in (sequential, concurrent):
+            timings = []
+            with GitHubClient(github_config) as client:
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    func(github_config, client)
+                    timings.append(time.perf_counter() - start)
+            print(
+                "{:<10} best {:>7.3f}s  mean {:>7.3f}s".format(
+                    func.__name__, min(timings), sum(timings) / len(timings)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
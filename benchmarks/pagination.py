@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Compare eager and streaming retrieval of a large compare range.
+
+Replays a commit range (synthetic, or a recorded list of compare API commit
+objects given with --fixture) against a local stub server and reports the
+wall time and peak Python memory of building the whole commit list versus
+matching PRs as each page arrives.
+
+    python -m benchmarks.pagination --commits 10000
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    extract_pr,
+    get_commits_between,
+    get_github_config,
+    is_pr,
+    iter_commits_between,
+)
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+def eager(github_config, first, last):
+    commits = get_commits_between(github_config, "o", "r", first, last)
+    return [extract_pr(c.message) for c in commits if is_pr(c.message)]
+
+
+def streaming(github_config, first, last):
+    commits = iter_commits_between(github_config, "o", "r", first, last)
+    return [extract_pr(c.message) for c in commits if is_pr(c.message)]
+
+
+def measure(func, *args):
+    """Time a call, then repeat it under tracemalloc for its peak memory"""
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--commits", type=int, default=10000)
+    parser.add_argument("--fixture", help="JSON list of commit objects")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture) as f:
+            commits = json.load(f)
+    else:
+        commits = synthetic_commits(args.commits + 1)
+
+    repo = StubRepo(commits)
+    first, last = commits[0]["sha"], commits[-1]["sha"]
+    with StubGitHub(repo) as stub:
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, stub.api_url, None
+        )
+        for func in (eager, streaming):
+            timings = []
+            for _ in range(args.repeat):
+                prs, elapsed, peak = measure(func, github_config, first, last)
+                timings.append(elapsed)
+            print(
+                "{:<10} {:>6} PRs  best {:>8.3f}s  peak {:>8.1f} KiB".format(
+                    func.__name__, len(prs), min(timings), peak / 1024.0
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Compare PR matching with PRMatcher against the original is_pr/extract_pr.
+
+The original pair ran up to four regular expression scans over the whole of
+every commit message. Messages here mix merge commits, squash-and-merge
+commits with long multi-paragraph descriptions and ordinary commits.
+
+    python -m benchmarks.pr_matching --messages 100000
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import re
+import time
+
+from changelog import PRMatcher, PullRequest
+
+
+MERGE_PR_RE = re.compile(r"^Merge pull request #([0-9]+) from .*\n\n(.*)")
+SQUASH_PR_RE = re.compile(r"^(.*) \(#([0-9]+)\).*")
+
+
+def legacy_is_pr(message):
+    return MERGE_PR_RE.search(message) or SQUASH_PR_RE.search(message)
+
+
+def legacy_extract_pr(message):
+    merge_match = MERGE_PR_RE.match(message)
+    squash_match = SQUASH_PR_RE.match(message)
+
+    if merge_match is not None:
+        number, title = merge_match.groups()
+        return PullRequest(number=number, title=title)
+    elif squash_match is not None:
+        title, number = squash_match.groups()
+        return PullRequest(number=number, title=title)
+
+
+def synthetic_messages(count, seed=0):
+    rng = random.Random(seed)
+    paragraph = " ".join(["Lorem ipsum dolor sit amet (see #12)."] * 20)
+    messages = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.3:
+            message = (
+                "Merge pull request #{0} from some/branch-{0}\n\n" "Title {0}"
+            )
+        elif kind < 0.7:
+            paragraphs = "\n\n".join([paragraph] * rng.randint(1, 8))
+            message = "Title {0} (#{0})\n\n" + paragraphs
+        else:
+            message = "Plain commit {0}\n\n" + paragraph
+        messages.append(message.format(i))
+    return messages
+
+
+def legacy(messages):
+    return [legacy_extract_pr(m) for m in messages if legacy_is_pr(m)]
+
+
+def single_pass(messages):
+    matcher = PRMatcher()
+    return [pr for pr in map(matcher.match, messages) if pr is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    messages = synthetic_messages(args.messages)
+    results = {}
+    for func in (legacy, single_pass):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[func.__name__] = func(messages)
+            timings.append(time.perf_counter() - start)
+        print(
+            "{:<12} {:>7} PRs  best {:>7.3f}s".format(
+                func.__name__, len(results[func.__name__]), min(timings)
+            )
+        )
+
+    assert results["legacy"] == results["single_pass"]
+
+
+if __name__ == "__main__":
+    main()
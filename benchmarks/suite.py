@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Run every end-to-end benchmark at several sizes and store the results.
+
+Each size is a synthetic repo served by the local stub server, with tags
+spread through its history. The benchmarks are generate_changelog with a
+new client for every run, fetch_changes sharing one client, fetch_history
+across every tag, and parsing a compare response without any HTTP. Results
+are written as JSON so that runs against different versions can be
+compared:
+
+    python -m benchmarks.suite --label before
+    python -m benchmarks.suite --label after --compare before
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    Commit,
+    GitHubClient,
+    fetch_changes,
+    fetch_history,
+    generate_changelog,
+    get_github_config,
+    iter_matches,
+)
+from changelog.client import STREAM_CHUNK_SIZE
+from changelog.hedge import Hedger, percentile
+from changelog.jsonstream import iter_array
+from changelog.tests.stub_server import (
+    DEFAULT_SHAPES,
+    MESSAGE_SHAPES,
+    StubGitHub,
+    compare_response,
+    synthetic_repo,
+)
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+
+def bench_generate_changelog(stub, github_config, client):
+    generate_changelog(
+        "o",
+        "r",
+        "1.0.0",
+        branch="main",
+        github_base_url=PUBLIC_GITHUB_URL,
+        github_api_url=stub.api_url,
+        hedge_percentile=stub.hedge_percentile,
+    )
+
+
+def bench_fetch_changes(stub, github_config, client):
+    fetch_changes(github_config, "o", "r", "1.0.0", client=client)
+
+
+def bench_fetch_history(stub, github_config, client):
+    fetch_history(github_config, "o", "r", client=client)
+
+
+def bench_parse(stub, github_config, client):
+    """Parse one compare response holding the whole history"""
+    content = io.BytesIO(stub.compare_content)
+    chunks = iter(lambda: content.read(STREAM_CHUNK_SIZE), b"")
+    commits = (
+        Commit(c["sha"], c["commit"]["message"])
+        for c in iter_array(chunks, "commits")
+    )
+    for _ in iter_matches(commits):
+        pass
+
+
+BENCHMARKS = [
+    bench_generate_changelog,
+    bench_fetch_changes,
+    bench_fetch_history,
+    bench_parse,
+]
+
+
+def run_size(commits, args):
+    """Run every benchmark against a repo of the given size"""
+    repo = synthetic_repo(commits, args.tags, args.shapes, files=args.files)
+    results = []
+    with StubGitHub(repo, latency=args.latency, tail=args.tail) as stub:
+        stub.compare_content = json.dumps(
+            compare_response(repo.commits, repo.files)
+        ).encode("utf-8")
+        stub.hedge_percentile = args.hedge_percentile
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, stub.api_url, None
+        )
+        hedger = None
+        if args.hedge_percentile is not None:
+            hedger = Hedger(args.hedge_percentile)
+        with GitHubClient(github_config, hedger=hedger) as client:
+            for bench in BENCHMARKS:
+                timings = []
+                for _ in range(args.repeat):
+                    stub.request_count = 0
+                    start = time.perf_counter()
+                    bench(stub, github_config, client)
+                    timings.append(time.perf_counter() - start)
+                results.append(
+                    {
+                        "benchmark": bench.__name__.replace("bench_", "", 1),
+                        "commits": commits,
+                        "best": min(timings),
+                        "median": statistics.median(timings),
+                        "p99": percentile(timings, 99),
+                        "requests": stub.request_count,
+                    }
+                )
+                print_result(results[-1])
+    return results
+
+
+def print_result(result, baseline=None):
+    line = (
+        "{:<20}{:>8}  best {:>9.4f}s  median {:>9.4f}s  p99 {:>9.4f}s  "
+        "{:>5} requests"
+    )
+    line = line.format(
+        result["benchmark"],
+        result["commits"],
+        result["best"],
+        result["median"],
+        result["p99"],
+        result["requests"],
+    )
+    if baseline is not None:
+        line += "  {:>+7.1%} vs {:.4f}s".format(
+            result["best"] / baseline["best"] - 1, baseline["best"]
+        )
+    print(line)
+
+
+def git_revision():
+    try:
+        output = subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"],
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("utf-8").strip()
+
+
+def results_path(label):
+    """Results are stored under benchmarks/results unless given a path"""
+    if label.endswith(".json"):
+        return label
+    return os.path.join(RESULTS_DIR, label + ".json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=DEFAULT_SIZES,
+        help="comma separated commit counts",
+    )
+    parser.add_argument("--tags", type=int, default=10)
+    parser.add_argument(
+        "--shapes",
+        type=lambda value: value.split(","),
+        default=DEFAULT_SHAPES,
+        help="comma separated message shapes, from {}".format(
+            ", ".join(sorted(MESSAGE_SHAPES))
+        ),
+    )
+    parser.add_argument("--files", type=int, default=0)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds per request"
+    )
+    parser.add_argument(
+        "--tail",
+        type=lambda value: tuple(float(part) for part in value.split(",")),
+        default=None,
+        help="fraction of responses that are slow, and how many seconds "
+        "more they take, e.g. 0.02,0.5",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=None,
+        help="hedge requests slower than this percentile",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--label",
+        help="name to store the results under (defaults to the git revision)",
+    )
+    parser.add_argument(
+        "--compare", metavar="LABEL", help="stored results to compare with"
+    )
+    args = parser.parse_args()
+
+    results = []
+    for commits in args.sizes:
+        results.extend(run_size(commits, args))
+
+    label = args.label or git_revision() or "latest"
+    path = results_path(label)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "label": label,
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "settings": {
+                    "tags": args.tags,
+                    "shapes": list(args.shapes),
+                    "files": args.files,
+                    "latency": args.latency,
+                    "tail": args.tail,
+                    "hedge_percentile": args.hedge_percentile,
+                    "repeat": args.repeat,
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("Results stored in {}".format(path))
+
+    if args.compare:
+        with open(results_path(args.compare)) as f:
+            baseline = {
+                (r["benchmark"], r["commits"]): r
+                for r in json.load(f)["results"]
+            }
+        print()
+        print("Compared with {}:".format(args.compare))
+        for result in results:
+            key = (result["benchmark"], result["commits"])
+            print_result(result, baseline.get(key))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the tail latency of fetch_changes with and without hedged requests.
+
+Runs against a local stub server that delays a small fraction of its
+responses by much more than the rest, and reports the percentiles of many
+runs, each making a handful of requests. Without hedging, every run that
+draws a slow response waits for all of it.
+
+    python -m benchmarks.tail --latency 0.01 --tail 0.02,0.5
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubClient,
+    fetch_changes,
+    get_github_config,
+)
+from changelog.hedge import DEFAULT_HEDGE_PERCENTILE, Hedger, percentile
+from changelog.tests.stub_server import StubGitHub, synthetic_repo
+
+
+PERCENTILES = [50, 90, 99]
+
+
+def run(stub, github_config, hedger, args):
+    timings = []
+    with GitHubClient(github_config, hedger=hedger) as client:
+        # Let the hedger see enough responses to take percentiles of
+        for _ in range(args.warmup):
+            fetch_changes(github_config, "o", "r", "1.0.0", client=client)
+
+        stub.request_count = 0
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            fetch_changes(github_config, "o", "r", "1.0.0", client=client)
+            timings.append(time.perf_counter() - start)
+    return timings, stub.request_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--latency", type=float, default=0.01, help="seconds per request"
+    )
+    parser.add_argument(
+        "--tail",
+        type=lambda value: tuple(float(part) for part in value.split(",")),
+        default=(0.02, 0.5),
+        help="fraction of responses that are slow, and how many seconds "
+        "more they take",
+    )
+    parser.add_argument("--commits", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument(
+        "--hedge-percentile", type=float, default=DEFAULT_HEDGE_PERCENTILE
+    )
+    args = parser.parse_args()
+
+    repo = synthetic_repo(args.commits, tags=1)
+    with StubGitHub(repo, latency=args.latency, tail=args.tail) as stub:
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, stub.api_url, None
+        )
+        for name, hedger in [
+            ("unhedged", None),
+            ("hedged", Hedger(args.hedge_percentile)),
+        ]:
+            timings, requests = run(stub, github_config, hedger, args)
+            columns = ["{:<10}".format(name)]
+            for p in PERCENTILES:
+                columns.append(
+                    "p{} {:>7.3f}s".format(p, percentile(timings, p))
+                )
+            columns.append("{:>6} requests".format(requests))
+            print("  ".join(columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,47 @@ release, or between two releases on the same branch.
 from __future__ import print_function
 
 import argparse
+import json
 import os
 import re
+import sys
+import time
 from collections import namedtuple
 
-import requests
+from changelog.cache import ResponseCache
+from changelog.client import STREAM_CHUNK_SIZE, GitHubClient, finish
+from changelog.deadline import Deadline, DeadlineExceeded  # noqa: F401
+from changelog.hedge import Hedger
+from changelog.jsonstream import KeyNotFoundError, iter_array
+from changelog.manifest import (  # noqa: F401
+    BatchEntry,
+    ManifestError,
+    read_manifest,
+)
+from changelog.stats import PhaseEvent, Stats, timed
+from changelog.transport import DEFAULT_TRANSPORT, TRANSPORTS
 
 
 DEFAULT_BRANCH = "main"
 PUBLIC_GITHUB_URL = "https://github.com"
 PUBLIC_GITHUB_API_URL = "https://api.github.com"
+# The compare endpoint returns at most this many commits per page
+COMPARE_PAGE_SIZE = 100
+# The commits endpoint returns at most this many commits per page
+COMMITS_PAGE_SIZE = 100
 GitHubConfig = namedtuple("GitHubConfig", ["base_url", "api_url", "headers"])
 
 Commit = namedtuple("Commit", ["sha", "message"])
 PullRequest = namedtuple("PullRequest", ["number", "title"])
+# A PR and the sha of the commit that merged it
+Merge = namedtuple("Merge", ["sha", "pr"])
+BatchResult = namedtuple("BatchResult", ["entry", "changelog", "error"])
+# The PRs, or Merges, in a release, newest first. The tag is None for
+# unreleased changes.
+Release = namedtuple("Release", ["tag", "prs"])
+
+# Number of repos processed at once when generating changelogs in bulk
+DEFAULT_MAX_WORKERS = 8
 
 # Merge commits use a double linebreak between the branch name and the title
 MERGE_PR_RE = re.compile(r"^Merge pull request #([0-9]+) from .*\n\n(.*)")
@@ -27,6 +54,29 @@ MERGE_PR_RE = re.compile(r"^Merge pull request #([0-9]+) from .*\n\n(.*)")
 # Squash-and-merge commits use the PR title with the number in parentheses
 SQUASH_PR_RE = re.compile(r"^(.*) \(#([0-9]+)\).*")
 
+# Either of the above, tried in the same order, so that a message is only
+# scanned once
+PR_RE = re.compile(
+    r"Merge pull request #([0-9]+) from .*\n\n(.*)|(.*) \(#([0-9]+)\)"
+)
+
+# Extra PR patterns are matched against this many lines at the start of a
+# message
+PR_MATCH_LINES = 3
+
+# Full commit shas, which unlike tags and branches never change what they
+# point to
+COMMIT_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+# Headings that PRs are grouped under by their labels, in order, with the
+# labels that put a PR under each
+DEFAULT_LABEL_GROUPS = [
+    ("Breaking changes", ["breaking", "breaking change"]),
+    ("Features", ["feature", "enhancement"]),
+    ("Fixes", ["fix", "bug"]),
+]
+OTHER_CHANGES_HEADING = "Other changes"
+
 
 class GitHubError(Exception):
     pass
@@ -46,8 +96,25 @@ def get_github_config(github_base_url, github_api_url, token):
     )
 
 
-def get_commit_for_tag(github_config, owner, repo, tag):
-    """Get the commit sha for a given git tag"""
+def get_commit_for_tag(github_config, owner, repo, tag, client=None):
+    """Get the commit sha for a given git tag
+
+    Concurrent lookups of the same tag share one request.
+    """
+    if client is None:
+        client = GitHubClient(github_config)
+    return client.coalesce(
+        (github_config.api_url, owner, repo, "tag", tag),
+        request_commit_for_tag,
+        github_config,
+        owner,
+        repo,
+        tag,
+        client,
+    )
+
+
+def request_commit_for_tag(github_config, owner, repo, tag, client):
     tag_url = "/".join(
         [
             github_config.api_url,
@@ -63,7 +130,7 @@ def get_commit_for_tag(github_config, owner, repo, tag):
     tag_json = {}
 
     while "object" not in tag_json or tag_json["object"]["type"] != "commit":
-        tag_response = requests.get(tag_url, headers=github_config.headers)
+        tag_response = client.get(tag_url)
         tag_json = tag_response.json()
 
         if tag_response.status_code != 200:
@@ -78,14 +145,31 @@ def get_commit_for_tag(github_config, owner, repo, tag):
     return tag_json["object"]["sha"]
 
 
-def get_last_commit(github_config, owner, repo, branch=DEFAULT_BRANCH):
-    """Get the last commit sha for the given repo and branch"""
+def get_last_commit(
+    github_config, owner, repo, branch=DEFAULT_BRANCH, client=None
+):
+    """Get the last commit sha for the given repo and branch
+
+    Concurrent lookups of the same branch share one request.
+    """
+    if client is None:
+        client = GitHubClient(github_config)
+    return client.coalesce(
+        (github_config.api_url, owner, repo, "branch", branch),
+        request_last_commit,
+        github_config,
+        owner,
+        repo,
+        branch,
+        client,
+    )
+
+
+def request_last_commit(github_config, owner, repo, branch, client):
     commits_url = "/".join(
         [github_config.api_url, "repos", owner, repo, "commits"]
     )
-    commits_response = requests.get(
-        commits_url, params={"sha": branch}, headers=github_config.headers
-    )
+    commits_response = client.get(commits_url, params={"sha": branch})
     commits_json = commits_response.json()
     if commits_response.status_code != 200:
         raise GitHubError(
@@ -95,18 +179,33 @@ def get_last_commit(github_config, owner, repo, branch=DEFAULT_BRANCH):
     return commits_json[0]["sha"]
 
 
-def get_last_tag(github_config, owner, repo):
-    """Get the last tag for the given repo"""
+def get_last_tag(github_config, owner, repo, client=None):
+    """Get the last tag for the given repo
+
+    Concurrent lookups share one request.
+    """
+    if client is None:
+        client = GitHubClient(github_config)
+    return client.coalesce(
+        (github_config.api_url, owner, repo, "last_tag"),
+        request_last_tag,
+        github_config,
+        owner,
+        repo,
+        client,
+    )
+
+
+def request_last_tag(github_config, owner, repo, client):
     tags_url = "/".join([github_config.api_url, "repos", owner, repo, "tags"])
-    tags_response = requests.get(tags_url, headers=github_config.headers)
+    tags_response = client.get(tags_url)
     tags_response.raise_for_status()
     tags_json = tags_response.json()
     return tags_json[0]["name"]
 
 
-def get_commits_between(github_config, owner, repo, first_commit, last_commit):
-    """Get a list of commits between two commits"""
-    commits_url = "/".join(
+def get_compare_url(github_config, owner, repo, first_commit, last_commit):
+    return "/".join(
         [
             github_config.api_url,
             "repos",
@@ -116,112 +215,967 @@ def get_commits_between(github_config, owner, repo, first_commit, last_commit):
             first_commit + "..." + last_commit,
         ]
     )
-    commits_response = requests.get(commits_url, headers=github_config.headers)
-    commits_json = commits_response.json()
-    if commits_response.status_code != 200:
+
+
+def is_immutable_range(first_commit, last_commit):
+    """Determine whether a comparison can be cached indefinitely, which it
+    can between two shas"""
+    return bool(
+        COMMIT_SHA_RE.match(first_commit) and COMMIT_SHA_RE.match(last_commit)
+    )
+
+
+def iter_comparison(response, first_commit, last_commit, fields=None):
+    """Yield the commits in a streamed page of a comparison
+
+    Only the response's commits are read, skipping the files changed that
+    follow them. The fields before the commits, such as the comparison's
+    status and total_commits, are stored in the `fields` dict if one is
+    given.
+    """
+    if response.status_code != 200:
         raise GitHubError(
             "Unable to get commits between {} and {}. {}".format(
-                first_commit, last_commit, commits_json["message"]
+                first_commit, last_commit, response.json()["message"]
             )
         )
 
-    if "commits" not in commits_json:
+    chunks = response.iter_content(STREAM_CHUNK_SIZE)
+    try:
+        for c in iter_array(chunks, "commits", fields):
+            yield Commit(c["sha"], c["commit"]["message"])
+    except KeyNotFoundError:
         raise GitHubError(
             "Commits not found between {} and {}.".format(
                 first_commit, last_commit
             )
         )
+    finally:
+        finish(response, chunks)
+
 
-    commits = [
-        Commit(c["sha"], c["commit"]["message"])
-        for c in commits_json["commits"]
-    ]
-    return commits
+def iter_pages(client, url, params, error_message, **kwargs):
+    """Yield the response for each page of a list, following the Link
+    headers to the next page
+
+    A page that isn't a 200 raises a GitHubError of error_message followed
+    by GitHub's message. Other keyword arguments, e.g. immutable, are passed
+    on to client.get.
+    """
+    while url is not None:
+        response = client.get(url, params=params, **kwargs)
+        if response.status_code != 200:
+            raise GitHubError(
+                "{}. {}".format(error_message, response.json()["message"])
+            )
+        yield response
+
+        # The next page URL already carries the query string
+        url = response.links.get("next", {}).get("url")
+        params = None
+
+
+def iter_commits_between(
+    github_config, owner, repo, first_commit, last_commit, client=None
+):
+    """Yield the commits between two commits, one page at a time
+
+    The compare endpoint only returns a limited number of commits per
+    response, so this follows the pagination links until the whole range
+    has been retrieved.
+    """
+    if client is None:
+        client = GitHubClient(github_config)
+    commits_url = get_compare_url(
+        github_config, owner, repo, first_commit, last_commit
+    )
+    pages = iter_pages(
+        client,
+        commits_url,
+        {"per_page": COMPARE_PAGE_SIZE},
+        "Unable to get commits between {} and {}".format(
+            first_commit, last_commit
+        ),
+        immutable=is_immutable_range(first_commit, last_commit),
+        stream=True,
+    )
+    for commits_response in pages:
+        for commit in iter_comparison(
+            commits_response, first_commit, last_commit
+        ):
+            yield commit
+
+
+def is_ancestor(github_config, owner, repo, ancestor, descendant, client=None):
+    """Determine whether a commit is in the history of another"""
+    if client is None:
+        client = GitHubClient(github_config)
+    compare_url = get_compare_url(
+        github_config, owner, repo, ancestor, descendant
+    )
+    compare_response = client.get(compare_url, params={"per_page": 1})
+
+    # The ancestor may no longer exist at all after a force-push
+    if compare_response.status_code == 404:
+        return False
+    compare_json = compare_response.json()
+    if compare_response.status_code != 200:
+        raise GitHubError(
+            "Unable to compare {} and {}. {}".format(
+                ancestor, descendant, compare_json["message"]
+            )
+        )
+    return compare_json["status"] in ("ahead", "identical")
+
+
+def iter_commit_history(github_config, owner, repo, last_commit, client=None):
+    """Yield the history of a commit, newest first, one page at a time"""
+    if client is None:
+        client = GitHubClient(github_config)
+    commits_url = "/".join(
+        [github_config.api_url, "repos", owner, repo, "commits"]
+    )
+    pages = iter_pages(
+        client,
+        commits_url,
+        {"sha": last_commit, "per_page": COMMITS_PAGE_SIZE},
+        "Unable to get the history of {}".format(last_commit),
+        # The history behind a sha never changes
+        immutable=bool(COMMIT_SHA_RE.match(last_commit)),
+    )
+    for commits_response in pages:
+        for c in commits_response.json():
+            yield Commit(c["sha"], c["commit"]["message"])
+
+
+def get_commits_between(
+    github_config, owner, repo, first_commit, last_commit, client=None
+):
+    """Get a list of commits between two commits"""
+    return list(
+        iter_commits_between(
+            github_config, owner, repo, first_commit, last_commit, client
+        )
+    )
+
+
+class PRMatcher(object):
+    """Recognize PR merge commits and extract their PR in a single pass
+
+    Merge and squash-and-merge commits are recognized with one regular
+    expression. Extra patterns, as strings or compiled regular expressions
+    with `number` and `title` named groups, are tried in order after that
+    against only the first few lines of a message.
+    """
+
+    def __init__(self, patterns=None, lines=PR_MATCH_LINES):
+        self.patterns = []
+        for pattern in patterns or []:
+            self.add_pattern(pattern)
+        self.lines = lines
+
+    def add_pattern(self, pattern):
+        pattern = re.compile(pattern)
+        if not {"number", "title"} <= set(pattern.groupindex):
+            raise ValueError(
+                "PR pattern {} needs number and title groups".format(
+                    pattern.pattern
+                )
+            )
+        self.patterns.append(pattern)
+
+    def head(self, message):
+        """Get the start of a message without scanning the rest of it"""
+        end = -1
+        for _ in range(self.lines):
+            end = message.find("\n", end + 1)
+            if end == -1:
+                return message
+        return message[:end]
+
+    def match(self, message):
+        """Return the PullRequest a commit message merged, or None"""
+        match = PR_RE.match(message)
+        if match is not None:
+            number, title, squash_title, squash_number = match.groups()
+            if number is None:
+                number, title = squash_number, squash_title
+            return PullRequest(number=number, title=title)
+
+        if self.patterns:
+            head = self.head(message)
+            for pattern in self.patterns:
+                match = pattern.match(head)
+                if match is not None:
+                    return PullRequest(
+                        number=match.group("number"),
+                        title=match.group("title"),
+                    )
+        return None
+
+
+DEFAULT_PR_MATCHER = PRMatcher()
 
 
 def is_pr(message):
     """Determine whether or not a commit message is a PR merge"""
-    return MERGE_PR_RE.search(message) or SQUASH_PR_RE.search(message)
+    return DEFAULT_PR_MATCHER.match(message) is not None
 
 
 def extract_pr(message):
     """Given a PR merge commit message, extract the PR number and title"""
-    merge_match = MERGE_PR_RE.match(message)
-    squash_match = SQUASH_PR_RE.match(message)
+    pr = DEFAULT_PR_MATCHER.match(message)
+    if pr is None:
+        raise Exception("Commit isn't a PR merge, {}".format(message))
+    return pr
 
-    if merge_match is not None:
-        number, title = merge_match.groups()
-        return PullRequest(number=number, title=title)
-    elif squash_match is not None:
-        title, number = squash_match.groups()
-        return PullRequest(number=number, title=title)
 
-    raise Exception("Commit isn't a PR merge, {}".format(message))
+def iter_matches(commits, matcher=DEFAULT_PR_MATCHER, observer=None):
+    """Yield each commit with the PR it merged, or None
 
+    Given an observer, the time spent waiting for commits and matching them
+    is reported as the "fetch" and "extract" phases once the commits run
+    out or the caller stops.
+    """
+    fetch_time = extract_time = 0
+    commits = iter(commits)
+    try:
+        while True:
+            start = time.perf_counter()
+            commit = next(commits, None)
+            fetched = time.perf_counter()
+            fetch_time += fetched - start
+            if commit is None:
+                return
 
-def fetch_changes(
+            pr = matcher.match(commit.message)
+            extract_time += time.perf_counter() - fetched
+            yield commit, pr
+    finally:
+        if observer is not None:
+            observer.on_phase(PhaseEvent("fetch", fetch_time))
+            observer.on_phase(PhaseEvent("extract", extract_time))
+
+
+class CommitSource(object):
+    """Where fetch_changes gets tags and commits from
+
+    Sources resolve tags and branches to commit shas and list the commits
+    between two of them, oldest first.
+    """
+
+    def get_tags(self):
+        """Get (name, commit sha) pairs for every tag in the repo"""
+        raise NotImplementedError
+
+    def get_last_tag(self):
+        raise NotImplementedError
+
+    def get_commit_for_tag(self, tag):
+        raise NotImplementedError
+
+    def get_last_commit(self, branch=DEFAULT_BRANCH):
+        raise NotImplementedError
+
+    def iter_commits_between(self, first_commit, last_commit):
+        raise NotImplementedError
+
+    def iter_history(self, last_commit):
+        """Yield the history of a commit, newest first"""
+        raise NotImplementedError
+
+    def is_ancestor(self, ancestor, descendant):
+        """Determine whether a commit is in the history of another
+
+        Sources that can't tell say it isn't, which is always safe.
+        """
+        return False
+
+    def get_changed_files(self, shas):
+        """Get the files changed by each commit, as a dict keyed by sha
+
+        Merge commits are compared with their first parent.
+        """
+        raise NotImplementedError
+
+
+class GitHubCommitSource(CommitSource):
+    """Get tags and commits for a repo from the GitHub REST API"""
+
+    def __init__(self, github_config, owner, repo, client=None):
+        if client is None:
+            client = GitHubClient(github_config)
+        self.github_config = github_config
+        self.owner = owner
+        self.repo = repo
+        self.client = client
+
+    def get_tags(self):
+        from changelog.tags import get_tag_index
+
+        return get_tag_index(
+            self.github_config, self.owner, self.repo, self.client
+        ).tags
+
+    def get_last_tag(self):
+        return get_last_tag(
+            self.github_config, self.owner, self.repo, self.client
+        )
+
+    def get_commit_for_tag(self, tag):
+        return get_commit_for_tag(
+            self.github_config, self.owner, self.repo, tag, self.client
+        )
+
+    def get_last_commit(self, branch=DEFAULT_BRANCH):
+        return get_last_commit(
+            self.github_config, self.owner, self.repo, branch, self.client
+        )
+
+    def iter_commits_between(self, first_commit, last_commit):
+        return iter_commits_between(
+            self.github_config,
+            self.owner,
+            self.repo,
+            first_commit,
+            last_commit,
+            self.client,
+        )
+
+    def iter_history(self, last_commit):
+        return iter_commit_history(
+            self.github_config, self.owner, self.repo, last_commit, self.client
+        )
+
+    def is_ancestor(self, ancestor, descendant):
+        return is_ancestor(
+            self.github_config,
+            self.owner,
+            self.repo,
+            ancestor,
+            descendant,
+            self.client,
+        )
+
+    def get_changed_files(self, shas):
+        from changelog.paths import get_changed_files
+
+        return get_changed_files(
+            self.github_config, self.owner, self.repo, shas, self.client
+        )
+
+
+def bound_client(github_config, client=None, deadline=None):
+    """Get a client whose requests must finish by a Deadline, or the
+    client as it is without one"""
+    if deadline is None:
+        return client
+    if client is None:
+        client = GitHubClient(github_config)
+    return client.with_deadline(deadline)
+
+
+def new_hedger(hedge_percentile=None):
+    """Get a Hedger for a client, or None to not hedge"""
+    if hedge_percentile is None:
+        return None
+    return Hedger(hedge_percentile)
+
+
+def resolve_previous_commit(source, previous_tag=None):
+    """Get the commit sha for the previous tag, or for the last tag"""
+    if previous_tag is None:
+        previous_tag = source.get_last_tag()
+    return source.get_commit_for_tag(previous_tag)
+
+
+def resolve_current_commit(source, current_tag=None, branch=DEFAULT_BRANCH):
+    """Get the commit sha for the current tag, or for the head of branch"""
+    if current_tag is None:
+        return source.get_last_commit(branch)
+
+    try:
+        return source.get_commit_for_tag(current_tag)
+    except GitHubError:
+        # Try to proceed with the given "tag" as a commit sha
+        return current_tag
+
+
+def iter_changes(
     github_config,
     owner,
     repo,
     previous_tag=None,
     current_tag=None,
     branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
 ):
-    if previous_tag is None:
-        previous_tag = get_last_tag(github_config, owner, repo)
-    previous_commit = get_commit_for_tag(
-        github_config, owner, repo, previous_tag
-    )
+    """Yield a Merge for each PR merged between two tags, oldest first, as
+    soon as the commit that merged it is fetched
 
-    current_commit = None
-    if current_tag is not None:
-        try:
-            current_commit = get_commit_for_tag(
-                github_config, owner, repo, current_tag
+    Given a Deadline, the requests made without a source must all finish by
+    it, or DeadlineExceeded is raised.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if source is None:
+        client = bound_client(github_config, client, deadline)
+        source = GitHubCommitSource(github_config, owner, repo, client)
+
+    # The two ends of the range are independent, so resolve them at the
+    # same time
+    with timed(observer, "resolve"):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            previous_future = executor.submit(
+                resolve_previous_commit, source, previous_tag
             )
-        except GitHubError:
-            # Try to proceed with the given "tag" as a commit sha
-            current_commit = current_tag
-    else:
-        current_commit = get_last_commit(github_config, owner, repo, branch)
+            current_future = executor.submit(
+                resolve_current_commit, source, current_tag, branch
+            )
+            previous_commit = previous_future.result()
+            current_commit = current_future.result()
 
-    commits_between = get_commits_between(
-        github_config, owner, repo, previous_commit, current_commit
+    commits_between = source.iter_commits_between(
+        previous_commit, current_commit
     )
 
-    # Process the commit list looking for PR merges
-    prs = [extract_pr(c.message) for c in commits_between if is_pr(c.message)]
+    # Process the commits looking for PR merges as each page arrives
+    pr_count = 0
+    commit_count = 0
+    for commit, pr in iter_matches(commits_between, matcher, observer):
+        commit_count += 1
+        if pr is not None:
+            pr_count += 1
+            yield Merge(commit.sha, pr)
 
-    if len(prs) == 0 and len(commits_between) > 0:
+    if pr_count == 0 and commit_count > 0:
         raise Exception(
             "Lots of commits and no PRs on branch {}".format(branch)
         )
 
-    prs.reverse()
-    return prs
 
+def fetch_changes(
+    github_config,
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Get the PRs merged between two tags, newest first"""
+    merges = fetch_merges(
+        github_config,
+        owner,
+        repo,
+        previous_tag,
+        current_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+        deadline,
+    )
+    return [merge.pr for merge in merges]
+
+
+def fetch_merges(
+    github_config,
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Get a Merge for each PR merged between two tags, newest first"""
+    merges = list(
+        iter_changes(
+            github_config,
+            owner,
+            repo,
+            previous_tag,
+            current_tag,
+            branch,
+            client,
+            source,
+            matcher,
+            observer,
+            deadline,
+        )
+    )
+    merges.reverse()
+    return merges
 
-def format_changes(github_config, owner, repo, prs, markdown=False):
-    """Format the list of prs in either text or markdown"""
-    lines = []
+
+def iter_history_changes(
+    github_config,
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Yield (tag, merge) with a Merge for the PRs in every release, newest
+    first, as the history is walked
+
+    The tag is None for unreleased changes. The start of each release is
+    yielded as (tag, None) before its PRs, so that releases without any are
+    still seen. See fetch_history.
+    """
+    if source is None:
+        client = bound_client(github_config, client, deadline)
+        source = GitHubCommitSource(github_config, owner, repo, client)
+
+    with timed(observer, "resolve"):
+        current_commit = resolve_current_commit(source, current_tag, branch)
+        previous_commit = None
+        if previous_tag is not None:
+            previous_commit = source.get_commit_for_tag(previous_tag)
+
+        # The first tag listed for a commit names its release
+        tags_by_commit = {}
+        for name, sha in source.get_tags():
+            tags_by_commit.setdefault(sha, name)
+
+    tag = None
+    history = source.iter_history(current_commit)
+    for commit, pr in iter_matches(history, matcher, observer):
+        if commit.sha == previous_commit:
+            break
+        if commit.sha in tags_by_commit:
+            tag = tags_by_commit[commit.sha]
+            yield tag, None
+
+        if pr is not None:
+            yield tag, Merge(commit.sha, pr)
+
+
+def fetch_history(
+    github_config,
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Get the PRs in every release, newest release first
+
+    History is walked once back from the current tag, or the head of the
+    branch, and split into releases wherever a tagged commit is reached.
+    The walk stops at the previous tag if there is one, and otherwise
+    continues to the first commit.
+    """
+    releases = fetch_history_merges(
+        github_config,
+        owner,
+        repo,
+        previous_tag,
+        current_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+        deadline,
+    )
+    return pull_requests(releases, sections=True)
+
+
+def fetch_history_merges(
+    github_config,
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Get the Merges in every release, newest release first, like
+    fetch_history"""
+    releases = [Release(tag=None, prs=[])]
+    for tag, merge in iter_history_changes(
+        github_config,
+        owner,
+        repo,
+        previous_tag,
+        current_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+        deadline,
+    ):
+        if merge is None:
+            releases.append(Release(tag=tag, prs=[]))
+        else:
+            releases[-1].prs.append(merge)
+
+    # Only keep unreleased changes if there are any
+    if not releases[0].prs:
+        releases.pop(0)
+    return releases
+
+
+def pull_requests(merges, sections=False):
+    """Get the PRs of a list of Merges, or with sections, the Releases or
+    PathChanges of the PRs in a list of them"""
+    if sections:
+        return [
+            section._replace(prs=pull_requests(section.prs))
+            for section in merges
+        ]
+    return [merge.pr for merge in merges]
+
+
+def pr_link(github_config, owner, repo, number):
+    return "{github_url}/{owner}/{repo}/pull/{number}".format(
+        github_url=github_config.base_url,
+        owner=owner,
+        repo=repo,
+        number=number,
+    )
+
+
+def format_pr(github_config, owner, repo, pr, markdown=False):
+    """Format a single PR as a line of a changelog"""
+    number = "#{number}".format(number=pr.number)
+    if markdown:
+        link = pr_link(github_config, owner, repo, pr.number)
+        number = "[{number}]({link})".format(number=number, link=link)
+
+    return "- {title} {number}".format(title=pr.title, number=number)
+
+
+def group_by_labels(prs, details, label_groups):
+    """Sort PRs into the first of the label groups their labels match
+
+    label_groups is a list of (heading, labels) pairs, compared without
+    regard to case. PRs without a matching label, or without details, go in
+    a last group headed OTHER_CHANGES_HEADING. Returns (heading, prs) pairs
+    for the groups that have PRs, keeping the PRs in order.
+    """
+    groups = [(heading, []) for heading, _ in label_groups]
+    other = []
     for pr in prs:
-        number = "#{number}".format(number=pr.number)
-        if markdown:
-            link = "{github_url}/{owner}/{repo}/pull/{number}".format(
-                github_url=github_config.base_url,
-                owner=owner,
-                repo=repo,
-                number=pr.number,
-            )
-            number = "[{number}]({link})".format(number=number, link=link)
+        pr_details = details.get(pr.number)
+        labels = set()
+        if pr_details is not None:
+            labels = {label.lower() for label in pr_details.labels}
+        for (_, group_labels), (_, group_prs) in zip(label_groups, groups):
+            if labels & {label.lower() for label in group_labels}:
+                group_prs.append(pr)
+                break
+        else:
+            other.append(pr)
+    groups.append((OTHER_CHANGES_HEADING, other))
+    return [(heading, group) for heading, group in groups if group]
+
+
+def format_changes(
+    github_config,
+    owner,
+    repo,
+    prs,
+    markdown=False,
+    details=None,
+    label_groups=None,
+):
+    """Format the list of prs in either text or markdown
+
+    Given label_groups, the PRs are grouped under headings by the labels in
+    their details; see group_by_labels.
+    """
+    if label_groups is None:
+        return [
+            format_pr(github_config, owner, repo, pr, markdown=markdown)
+            for pr in prs
+        ]
+
+    lines = []
+    for heading, group in group_by_labels(prs, details or {}, label_groups):
+        if lines:
+            lines.append("")
+        lines.append("### " + heading if markdown else heading)
+        lines.extend(
+            format_pr(github_config, owner, repo, pr, markdown=markdown)
+            for pr in group
+        )
+    return lines
+
 
-        lines.append(
-            "- {title} {number}".format(title=pr.title, number=number)
+def format_history(
+    github_config,
+    owner,
+    repo,
+    releases,
+    markdown=False,
+    details=None,
+    label_groups=None,
+):
+    """Format a list of releases as a section per release"""
+    lines = []
+    for release in releases:
+        if lines:
+            lines.append("")
+        heading = release.tag if release.tag is not None else "Unreleased"
+        lines.append("## " + heading if markdown else heading)
+        lines.extend(
+            format_changes(
+                github_config,
+                owner,
+                repo,
+                release.prs,
+                markdown=markdown,
+                details=details,
+                label_groups=label_groups,
+            )
         )
+    return lines
 
+
+def format_paths(
+    github_config,
+    owner,
+    repo,
+    path_changes,
+    markdown=False,
+    details=None,
+    label_groups=None,
+):
+    """Format a list of PathChanges as a section per path"""
+    lines = []
+    for changes in path_changes:
+        if lines:
+            lines.append("")
+        lines.append("## " + changes.path if markdown else changes.path)
+        lines.extend(
+            format_changes(
+                github_config,
+                owner,
+                repo,
+                changes.prs,
+                markdown=markdown,
+                details=details,
+                label_groups=label_groups,
+            )
+        )
     return lines
 
 
+def pr_record(github_config, owner, repo, merge, details=None):
+    """Describe the PR of a Merge as a dict for JSON output
+
+    Records have the sha of the commit that merged the PR, its number
+    (as an int where it is one), title and link. Given details, they also
+    have its labels, author and merge time.
+    """
+    pr = merge.pr
+    number = pr.number
+    if str(number).isdigit():
+        number = int(number)
+    record = {
+        "sha": merge.sha,
+        "number": number,
+        "title": pr.title,
+        "link": pr_link(github_config, owner, repo, pr.number),
+    }
+    if details is not None:
+        pr_details = details.get(str(pr.number))
+        record["labels"] = pr_details.labels if pr_details else []
+        record["author"] = pr_details.author if pr_details else None
+        record["merged_at"] = pr_details.merged_at if pr_details else None
+    return record
+
+
+def format_json(
+    github_config,
+    owner,
+    repo,
+    changes,
+    full_history=False,
+    details=None,
+    indent=2,
+    paths=False,
+):
+    """Format Merges, or with full_history the Releases of them, or with
+    paths the PathChanges of them, as a JSON document"""
+    document = {"owner": owner, "repo": repo}
+    if paths:
+        document["paths"] = [
+            {
+                "path": path_changes.path,
+                "pull_requests": [
+                    pr_record(github_config, owner, repo, merge, details)
+                    for merge in path_changes.prs
+                ],
+            }
+            for path_changes in changes
+        ]
+    elif full_history:
+        document["releases"] = [
+            {
+                "tag": release.tag,
+                "pull_requests": [
+                    pr_record(github_config, owner, repo, merge, details)
+                    for merge in release.prs
+                ],
+            }
+            for release in changes
+        ]
+    else:
+        document["pull_requests"] = [
+            pr_record(github_config, owner, repo, merge, details)
+            for merge in changes
+        ]
+    return json.dumps(document, indent=indent)
+
+
+def iter_changelog_records(
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=None,
+    github_base_url=None,
+    github_api_url=None,
+    github_token=None,
+    client=None,
+    cache_dir=None,
+    local_repo=None,
+    graphql=False,
+    pr_patterns=None,
+    tag_index=False,
+    sharded=False,
+    full_history=False,
+    observer=None,
+    transport=DEFAULT_TRANSPORT,
+    timeout=None,
+    hedge_percentile=None,
+):
+    """Yield a pr_record for each PR as soon as the commit that merged it
+    is fetched, e.g. to write out as NDJSON
+
+    Takes the same options as generate_changelog, and the timeout covers
+    every record. PRs come in the order
+    their commits are processed: oldest first for the changes since the
+    previous tag, and newest first for a full history, where each record
+    also has the tag of its "release" (None for unreleased changes).
+    """
+    github_config = get_github_config(
+        github_base_url, github_api_url, github_token
+    )
+
+    owns_client = client is None and local_repo is None
+    if owns_client:
+        cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        client = GitHubClient(
+            github_config,
+            cache=cache,
+            observer=observer,
+            transport=transport,
+            hedger=new_hedger(hedge_percentile),
+        )
+    if client is not None and timeout is not None:
+        client = client.with_deadline(Deadline(timeout))
+
+    source = choose_source(
+        github_config,
+        owner,
+        repo,
+        client,
+        local_repo,
+        graphql,
+        tag_index,
+        sharded,
+    )
+    matcher = PRMatcher(pr_patterns) if pr_patterns else DEFAULT_PR_MATCHER
+    args = (
+        github_config,
+        owner,
+        repo,
+        previous_tag,
+        current_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+    )
+    try:
+        if full_history:
+            for tag, merge in iter_history_changes(*args):
+                if merge is not None:
+                    record = pr_record(github_config, owner, repo, merge)
+                    record["release"] = tag
+                    yield record
+        else:
+            for merge in iter_changes(*args):
+                yield pr_record(github_config, owner, repo, merge)
+    finally:
+        if owns_client:
+            client.close()
+
+
+def choose_source(
+    github_config,
+    owner,
+    repo,
+    client=None,
+    local_repo=None,
+    graphql=False,
+    tag_index=False,
+    sharded=False,
+):
+    """Get the CommitSource for generate_changelog's options, or None for
+    the GitHub REST API"""
+    if local_repo is not None:
+        from changelog.local import LocalCommitSource
+
+        return LocalCommitSource(local_repo)
+    if graphql:
+        from changelog.graphql import GraphQLCommitSource
+
+        return GraphQLCommitSource(github_config, owner, repo, client)
+    if sharded:
+        from changelog.shard import ShardedCommitSource
+
+        return ShardedCommitSource(github_config, owner, repo, client)
+    if tag_index:
+        from changelog.tags import IndexedCommitSource
+
+        return IndexedCommitSource(github_config, owner, repo, client)
+    return None
+
+
 def generate_changelog(
     owner,
     repo,
@@ -233,60 +1187,415 @@ def generate_changelog(
     github_base_url=None,
     github_api_url=None,
     github_token=None,
+    client=None,
+    cache_dir=None,
+    local_repo=None,
+    graphql=False,
+    pr_patterns=None,
+    tag_index=False,
+    sharded=False,
+    full_history=False,
+    state_dir=None,
+    observer=None,
+    transport=DEFAULT_TRANSPORT,
+    label_groups=None,
+    output_format=None,
+    index_path=None,
+    timeout=None,
+    hedge_percentile=None,
+    paths=None,
 ):
+    """Generate a changelog as text or markdown, or with output_format="json"
+    as a JSON document of PR records; see pr_record
+
+    Given index_path, changes between two tags that are both in the
+    ReleaseIndex there are read from it instead of fetched.
 
+    Given paths, e.g. the directories of a monorepo's packages, the
+    changelog has a section for each path with the PRs that changed files
+    under it; see fetch_path_changes. They can't be combined with
+    full_history, state_dir or index_path.
+
+    Given a timeout in seconds, every request must finish within that long
+    of the call starting, or DeadlineExceeded is raised. Given a
+    hedge_percentile, a client opened for this changelog hedges GETs that
+    take longer than that percentile of its responses; see Hedger.
+    """
+    if paths is not None:
+        if full_history or state_dir is not None or index_path is not None:
+            raise ValueError(
+                "paths can't be used with full_history, state_dir or "
+                "index_path"
+            )
+    deadline = Deadline(timeout) if timeout is not None else None
     github_config = get_github_config(
         github_base_url, github_api_url, github_token
     )
 
-    prs = fetch_changes(
-        github_config, owner, repo, previous_tag, current_tag, branch
+    indexed = None
+    if index_path is not None and not full_history:
+        if previous_tag is not None and current_tag is not None:
+            from changelog.index import ReleaseIndex
+
+            with timed(observer, "resolve"):
+                with ReleaseIndex(index_path) as index:
+                    indexed = index.merges(
+                        owner, repo, previous_tag, current_tag
+                    )
+
+    # Reuse the caller's client, otherwise open one just for this changelog.
+    # Local clones only need one to look up the PRs' labels.
+    owns_client = client is None
+    if local_repo is not None and label_groups is None:
+        owns_client = False
+    if owns_client:
+        cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        client = GitHubClient(
+            github_config,
+            cache=cache,
+            observer=observer,
+            transport=transport,
+            hedger=new_hedger(hedge_percentile),
+        )
+    if client is not None:
+        client = bound_client(github_config, client, deadline)
+
+    source = choose_source(
+        github_config,
+        owner,
+        repo,
+        client,
+        local_repo,
+        graphql,
+        tag_index,
+        sharded,
     )
-    lines = format_changes(github_config, owner, repo, prs, markdown=markdown)
+    matcher = PRMatcher(pr_patterns) if pr_patterns else DEFAULT_PR_MATCHER
+    fetch = fetch_history_merges if full_history else fetch_merges
+    try:
+        if indexed is not None:
+            changes = indexed
+        elif paths is not None:
+            from changelog.paths import fetch_path_merges
+
+            changes = fetch_path_merges(
+                github_config,
+                owner,
+                repo,
+                paths,
+                previous_tag,
+                current_tag,
+                branch,
+                client,
+                source,
+                matcher,
+                observer,
+            )
+        elif state_dir is not None:
+            from changelog.checkpoint import (
+                CheckpointStore,
+                fetch_merges_incremental,
+            )
+
+            changes = fetch_merges_incremental(
+                github_config,
+                owner,
+                repo,
+                CheckpointStore(state_dir),
+                previous_tag,
+                branch,
+                client,
+                source,
+                matcher,
+                observer,
+            )
+        else:
+            changes = fetch(
+                github_config,
+                owner,
+                repo,
+                previous_tag,
+                current_tag,
+                branch,
+                client,
+                source,
+                matcher,
+                observer,
+            )
+
+        details = None
+        if label_groups is not None:
+            from changelog.enrich import get_pr_details
+
+            merges = changes
+            if full_history or paths is not None:
+                merges = [
+                    merge for section in changes for merge in section.prs
+                ]
+            prs = pull_requests(merges)
+            with timed(observer, "enrich"):
+                details = get_pr_details(
+                    github_config,
+                    owner,
+                    repo,
+                    [pr.number for pr in prs],
+                    client,
+                )
+    finally:
+        if owns_client:
+            client.close()
+    if output_format == "json":
+        with timed(observer, "format"):
+            return format_json(
+                github_config,
+                owner,
+                repo,
+                changes,
+                full_history=full_history,
+                details=details,
+                indent=None if single_line else 2,
+                paths=paths is not None,
+            )
+
+    formatter = format_history if full_history else format_changes
+    if paths is not None:
+        formatter = format_paths
+    with timed(observer, "format"):
+        lines = formatter(
+            github_config,
+            owner,
+            repo,
+            pull_requests(changes, full_history or paths is not None),
+            markdown=markdown,
+            details=details,
+            label_groups=label_groups,
+        )
 
     separator = "\\n" if single_line else "\n"
     return separator.join(lines)
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Generate a CHANGELOG between two git tags based on GitHub"
-        "Pull Request merge commit messages"
+def generate_changelogs(
+    entries,
+    markdown=False,
+    single_line=False,
+    github_base_url=None,
+    github_api_url=None,
+    github_token=None,
+    client=None,
+    cache_dir=None,
+    max_workers=DEFAULT_MAX_WORKERS,
+    observer=None,
+    transport=DEFAULT_TRANSPORT,
+    label_groups=None,
+    timeout=None,
+    hedge_percentile=None,
+):
+    """Generate changelogs for many repos, yielding each as it finishes
+
+    Every entry is a BatchEntry. Repos are processed on a pool of at most
+    max_workers threads that share one client, and a failure for one repo
+    is reported in its BatchResult rather than stopping the others. An
+    observer is told about the requests and phases of every repo. The
+    timeout is for each repo's changelog.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    github_config = get_github_config(
+        github_base_url, github_api_url, github_token
     )
+
+    # Each changelog resolves both ends of its range at once
+    owns_client = client is None
+    if owns_client:
+        cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        client = GitHubClient(
+            github_config,
+            pool_maxsize=max_workers * 2,
+            cache=cache,
+            observer=observer,
+            transport=transport,
+            hedger=new_hedger(hedge_percentile),
+        )
+
+    def generate(entry):
+        try:
+            changelog = generate_changelog(
+                entry.owner,
+                entry.repo,
+                entry.previous_tag,
+                entry.current_tag,
+                markdown=markdown,
+                single_line=single_line,
+                branch=entry.branch,
+                github_base_url=github_base_url,
+                github_api_url=github_api_url,
+                github_token=github_token,
+                client=client,
+                observer=observer,
+                label_groups=label_groups,
+                timeout=timeout,
+            )
+        except Exception as e:
+            return BatchResult(entry=entry, changelog=None, error=e)
+        return BatchResult(entry=entry, changelog=changelog, error=None)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(generate, entry) for entry in entries]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        if owns_client:
+            client.close()
+
+
+def pr_pattern(value):
+    """Check a --pr-pattern argument is one PRMatcher can use"""
+    try:
+        PRMatcher([value])
+    except (re.error, ValueError) as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def label_group(value):
+    """Parse a --label-group argument into a (heading, labels) pair"""
+    heading, _, labels = value.partition("=")
+    labels = [label.strip() for label in labels.split(",") if label.strip()]
+    if not heading.strip() or not labels:
+        raise argparse.ArgumentTypeError(
+            "expected HEADING=LABEL[,LABEL...], got {}".format(value)
+        )
+    return heading.strip(), labels
+
+
+def add_output_arguments(parser):
     parser.add_argument(
-        "owner", metavar="OWNER", help="owner of the repo on GitHub"
+        "-m", "--markdown", action="store_true", help="output in markdown"
     )
     parser.add_argument(
-        "repo", metavar="REPO", help="name of the repo on GitHub"
+        "-s",
+        "--single-line",
+        action="store_true",
+        help="output as single line joined by \\n characters",
     )
+
+
+def add_label_arguments(parser):
     parser.add_argument(
-        "previous_tag",
-        metavar="PREVIOUS",
-        nargs="?",
-        help="previous release tag (defaults to last tag)",
+        "--group-by-labels",
+        action="store_true",
+        help="Look up the PRs' labels and group them under {}, or {}".format(
+            ", ".join(heading for heading, _ in DEFAULT_LABEL_GROUPS),
+            OTHER_CHANGES_HEADING,
+        ),
     )
     parser.add_argument(
-        "current_tag",
-        metavar="CURRENT",
-        nargs="?",
-        help="current release tag (defaults to HEAD)",
+        "--label-group",
+        dest="label_groups",
+        metavar="HEADING=LABEL[,LABEL...]",
+        type=label_group,
+        action="append",
+        default=None,
+        help="Group PRs with any of these labels under this heading, "
+        "instead of the default groups (repeatable)",
     )
+
+
+def add_source_arguments(
+    parser,
+    tag_index_help="Resolve tags from one listing of all the repo's tags",
+):
+    """Add the options for where commits and PRs are read from, returning
+    the group of mutually exclusive sources for more to be added to"""
     parser.add_argument(
-        "-m", "--markdown", action="store_true", help="output in markdown"
+        "--pr-pattern",
+        dest="pr_patterns",
+        metavar="REGEX",
+        type=pr_pattern,
+        action="append",
+        default=None,
+        help="Also treat commits matching this regular expression, with "
+        "number and title named groups, as PR merges (repeatable)",
     )
+    sources = parser.add_mutually_exclusive_group()
+    sources.add_argument(
+        "--local-repo",
+        metavar="PATH",
+        type=str,
+        action="store",
+        default=None,
+        help="Read tags and commits from a local clone of the repo instead "
+        "of the GitHub API",
+    )
+    sources.add_argument(
+        "--tag-index", action="store_true", help=tag_index_help
+    )
+    return sources
+
+
+def pop_label_groups(args):
+    """Get the label_groups to pass on from parsed label arguments"""
+    group_by_labels = args.pop("group_by_labels")
+    label_groups = args.pop("label_groups")
+    if label_groups is None and group_by_labels:
+        return DEFAULT_LABEL_GROUPS
+    return label_groups
+
+
+def hedge_percentile(value):
+    """Check a --hedge-percentile argument is a percentile"""
+    try:
+        percentile = float(value)
+    except ValueError:
+        percentile = None
+    if percentile is None or not 0 < percentile < 100:
+        raise argparse.ArgumentTypeError(
+            "expected a number between 0 and 100, got {}".format(value)
+        )
+    return percentile
+
+
+def add_latency_arguments(parser):
     parser.add_argument(
-        "-s",
-        "--single-line",
-        action="store_true",
-        help="output as single line joined by \\n characters",
+        "--timeout",
+        metavar="SECONDS",
+        type=float,
+        default=None,
+        help="Give up on a changelog that isn't finished in this long",
     )
     parser.add_argument(
-        "--branch",
-        type=str,
-        action="store",
-        default=DEFAULT_BRANCH,
-        help="Override the " "target branch (defaults to main)",
+        "--hedge-percentile",
+        metavar="P",
+        type=hedge_percentile,
+        default=None,
+        help="Send a second copy of any GET that takes longer than this "
+        "percentile of the responses so far, e.g. 95, and use whichever "
+        "answers first",
     )
+
+
+def add_stats_argument(parser):
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+        default=None,
+        help="Report the requests made and the time taken by each phase on "
+        "stderr, as a table (the default) or as JSON",
+    )
+
+
+def print_stats(stats, stats_format):
+    if stats_format == "json":
+        print(json.dumps(stats.to_dict(), indent=2), file=sys.stderr)
+    else:
+        print("\n".join(stats.format_table()), file=sys.stderr)
+
+
+def add_github_arguments(parser):
     parser.add_argument(
         "--github-base-url",
         type=str,
@@ -312,12 +1621,279 @@ def main():
         default=None,
         help="GitHub oauth token to auth " "your Github requests with",
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        action="store",
+        default=os.environ.get("CHANGELOG_CACHE_DIR"),
+        help="Cache GitHub API responses in this directory and revalidate "
+        "them on later runs (defaults to $CHANGELOG_CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache_dir",
+        action="store_const",
+        const=None,
+        help="Don't cache GitHub API responses",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default=os.environ.get("CHANGELOG_TRANSPORT", DEFAULT_TRANSPORT),
+        help="HTTP library to make requests with; urllib needs only the "
+        "standard library and starts faster (defaults to "
+        "$CHANGELOG_TRANSPORT or {})".format(DEFAULT_TRANSPORT),
+    )
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="changelog batch",
+        description="Generate a CHANGELOG for every repo in a manifest",
+    )
+    parser.add_argument(
+        "manifest",
+        metavar="MANIFEST",
+        help="JSON, YAML or CSV list of repos with the columns owner, repo, "
+        "previous, current and branch",
+    )
+    add_output_arguments(parser)
+    add_label_arguments(parser)
+    parser.add_argument(
+        "--branch",
+        type=str,
+        action="store",
+        default=DEFAULT_BRANCH,
+        help="Target branch for repos that don't set one (defaults to main)",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        dest="max_workers",
+        metavar="N",
+        type=int,
+        action="store",
+        default=DEFAULT_MAX_WORKERS,
+        help="Number of repos to process at once (defaults to {})".format(
+            DEFAULT_MAX_WORKERS
+        ),
+    )
+    add_latency_arguments(parser)
+    add_stats_argument(parser)
+    add_github_arguments(parser)
+
+    args = vars(parser.parse_args(argv))
+    args["label_groups"] = pop_label_groups(args)
+    try:
+        entries = read_manifest(args.pop("manifest"), args.pop("branch"))
+    except ManifestError as e:
+        parser.error(str(e))
+    stats_format = args.pop("stats")
+    stats = Stats() if stats_format is not None else None
+
+    failures = 0
+    for result in generate_changelogs(entries, observer=stats, **args):
+        name = "{}/{}".format(result.entry.owner, result.entry.repo)
+        if result.error is not None:
+            failures += 1
+            print("{}: {}".format(name, result.error), file=sys.stderr)
+            continue
+
+        heading = "## " + name if args["markdown"] else name
+        print(heading)
+        print(result.changelog)
+        print()
+
+    if stats is not None:
+        print_stats(stats, stats_format)
+    return 1 if failures else 0
+
+
+def serve_main(argv):
+    from changelog.serve import main as serve
+
+    return serve(argv)
+
+
+def index_main(argv):
+    from changelog.index import index_main as index
+
+    return index(argv)
+
+
+def lookup_main(argv):
+    from changelog.index import lookup_main as lookup
+
+    return lookup(argv)
+
+
+# Subcommands are chosen by the first argument, before owner and repo
+SUBCOMMANDS = {
+    "batch": batch_main,
+    "serve": serve_main,
+    "index": index_main,
+    "lookup": lookup_main,
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in SUBCOMMANDS:
+        return SUBCOMMANDS[argv[0]](argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description="Generate a CHANGELOG between two git tags based on GitHub"
+        "Pull Request merge commit messages"
+    )
+    parser.add_argument(
+        "owner", metavar="OWNER", help="owner of the repo on GitHub"
+    )
+    parser.add_argument(
+        "repo", metavar="REPO", help="name of the repo on GitHub"
+    )
+    parser.add_argument(
+        "previous_tag",
+        metavar="PREVIOUS",
+        nargs="?",
+        help="previous release tag (defaults to last tag)",
+    )
+    parser.add_argument(
+        "current_tag",
+        metavar="CURRENT",
+        nargs="?",
+        help="current release tag (defaults to HEAD)",
+    )
+    add_output_arguments(parser)
+    add_label_arguments(parser)
+    parser.add_argument(
+        "--branch",
+        type=str,
+        action="store",
+        default=DEFAULT_BRANCH,
+        help="Override the " "target branch (defaults to main)",
+    )
+    sources = add_source_arguments(
+        parser,
+        tag_index_help="Resolve tags from one listing of all the repo's "
+        "tags, and default the previous tag to the highest semantic version",
+    )
+    sources.add_argument(
+        "--graphql",
+        action="store_true",
+        help="Use the GitHub GraphQL API, which needs fewer requests but "
+        "always needs a token",
+    )
+    sources.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Like --tag-index, and also split the range at the tags in "
+        "between and fetch its pages concurrently",
+    )
+    parser.add_argument(
+        "--full-history",
+        action="store_true",
+        help="Output a section for every release back to PREVIOUS, or to "
+        "the first commit, from one walk of the history",
+    )
+    parser.add_argument(
+        "--path",
+        dest="paths",
+        metavar="PATH",
+        type=str,
+        action="append",
+        default=None,
+        help="Only list the PRs that changed files under this directory, "
+        "in a section of its own (repeatable)",
+    )
+    parser.add_argument(
+        "--state-dir",
+        metavar="DIR",
+        type=str,
+        action="store",
+        default=None,
+        help="Keep a checkpoint for the branch in this directory and only "
+        "fetch the commits added since the last run",
+    )
+    formats = parser.add_mutually_exclusive_group()
+    formats.add_argument(
+        "--json",
+        dest="output_format",
+        action="store_const",
+        const="json",
+        default=None,
+        help="Output a JSON document with the sha, number, title and link "
+        "of each PR",
+    )
+    formats.add_argument(
+        "--ndjson",
+        dest="output_format",
+        action="store_const",
+        const="ndjson",
+        help="Output a JSON record for each PR on its own line, as soon as "
+        "the commit that merged it is fetched",
+    )
+    parser.add_argument(
+        "--index",
+        dest="index_path",
+        metavar="PATH",
+        default=None,
+        help="Read the changes between PREVIOUS and CURRENT from an index "
+        "built by changelog index, when both tags are in it",
+    )
+    add_latency_arguments(parser)
+    add_stats_argument(parser)
+    add_github_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.full_history and args.graphql:
+        parser.error("--full-history can't be used with --graphql")
+    if args.output_format is not None and args.markdown:
+        parser.error("--markdown can't be used with --json or --ndjson")
+    if args.paths is not None:
+        for name, value in [
+            ("--full-history", args.full_history),
+            ("--state-dir", args.state_dir is not None),
+            ("--index", args.index_path is not None),
+            ("--ndjson", args.output_format == "ndjson"),
+        ]:
+            if value:
+                parser.error("--path can't be used with {}".format(name))
+    if args.output_format == "ndjson":
+        if args.state_dir is not None:
+            parser.error("--ndjson can't be used with --state-dir")
+        if args.group_by_labels or args.label_groups is not None:
+            parser.error("--ndjson can't be used with label groups")
+    if args.state_dir is not None:
+        if args.current_tag is not None or args.full_history:
+            parser.error(
+                "--state-dir only works for changes since the previous tag"
+            )
+
+    args = vars(args)
+    args["label_groups"] = pop_label_groups(args)
+    stats_format = args.pop("stats")
+    stats = Stats() if stats_format is not None else None
 
-    changelog = generate_changelog(**vars(args))
-    print(changelog)
+    if args["output_format"] == "ndjson":
+        for name in [
+            "output_format",
+            "markdown",
+            "single_line",
+            "state_dir",
+            "label_groups",
+            "index_path",
+            "paths",
+        ]:
+            del args[name]
+        for record in iter_changelog_records(observer=stats, **args):
+            print(json.dumps(record), flush=True)
+    else:
+        changelog = generate_changelog(observer=stats, **args)
+        print(changelog)
+    if stats is not None:
+        print_stats(stats, stats_format)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio versions of fetch_changes and generate_changelog, for generating
+changelogs from within an event loop without blocking it.
+
+These make the same requests as the synchronous functions with aiohttp and
+return exactly the same PullRequests and formatting. Many changelogs can be
+generated concurrently on one loop, sharing one connection pool.
+"""
+import asyncio
+import json
+
+from changelog import (
+    COMPARE_PAGE_SIZE,
+    DEFAULT_BRANCH,
+    DEFAULT_PR_MATCHER,
+    Commit,
+    GitHubError,
+    PRMatcher,
+    format_changes,
+    get_github_config,
+)
+from changelog.client import DEFAULT_POOL_MAXSIZE, DEFAULT_TIMEOUT
+from changelog.ratelimit import DEFAULT_RATE_LIMITER
+
+
+try:
+    import aiohttp
+except ImportError:
+    raise ImportError(
+        "The asyncio API requires aiohttp. "
+        "Install it with `pip install github-changelog[async]`."
+    )
+
+
+class AsyncResponse(object):
+    """The parts of a response that changelog uses, read in full"""
+
+    def __init__(self, status_code, headers, content, links):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.links = links
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+
+class AsyncGitHubClient(object):
+    """An aiohttp session for the GitHub API
+
+    Pass the same aiohttp.TCPConnector to many clients to share one
+    connection pool between them. The session is opened on first use, so
+    that it belongs to the running event loop.
+    """
+
+    def __init__(
+        self,
+        github_config,
+        connector=None,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        timeout=DEFAULT_TIMEOUT,
+        rate_limiter=DEFAULT_RATE_LIMITER,
+    ):
+        self.config = github_config
+        self.connector = connector
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.session = None
+
+    @property
+    def identity(self):
+        return self.config.headers.get("Authorization")
+
+    @property
+    def rate_limit(self):
+        return self.rate_limiter.budget(self.identity)
+
+    def open(self):
+        if self.session is None:
+            connect_timeout, read_timeout = self.timeout
+            connector = self.connector
+            if connector is None:
+                connector = aiohttp.TCPConnector(limit=self.pool_maxsize)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                connector_owner=self.connector is None,
+                headers=self.config.headers,
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=connect_timeout, sock_read=read_timeout
+                ),
+            )
+        return self.session
+
+    async def get(self, url, params=None):
+        return await self.send("GET", url, params=params)
+
+    async def post(self, url, json=None):
+        return await self.send("POST", url, json=json)
+
+    async def send(self, method, url, **kwargs):
+        """Make a request within the rate limit, retrying it if GitHub asks
+        us to slow down or fails on its end"""
+        session = self.open()
+        attempt = 0
+        while True:
+            delay = self.rate_limiter.delay(self.identity)
+            if 0 < delay <= self.rate_limiter.max_wait:
+                await asyncio.sleep(delay)
+
+            async with session.request(method, url, **kwargs) as response:
+                content = await response.read()
+                links = {
+                    rel: {"url": str(link["url"])}
+                    for rel, link in response.links.items()
+                }
+                result = AsyncResponse(
+                    response.status, response.headers, content, links
+                )
+            self.rate_limiter.update(self.identity, result)
+
+            delay = self.rate_limiter.retry_delay(result, attempt)
+            if delay is None:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncGitHubCommitSource(object):
+    """Get tags and commits for a repo from the GitHub REST API, like
+    GitHubCommitSource but with coroutines"""
+
+    def __init__(self, github_config, owner, repo, client):
+        self.repo_url = "/".join([github_config.api_url, "repos", owner, repo])
+        self.client = client
+
+    async def get_last_tag(self):
+        tags_response = await self.client.get(self.repo_url + "/tags")
+        if tags_response.status_code != 200:
+            raise GitHubError(
+                "Unable to get tags. {}".format(
+                    tags_response.json()["message"]
+                )
+            )
+        return tags_response.json()[0]["name"]
+
+    async def get_commit_for_tag(self, tag):
+        tag_url = self.repo_url + "/git/refs/tags/" + tag
+        tag_json = {}
+
+        while (
+            "object" not in tag_json or tag_json["object"]["type"] != "commit"
+        ):
+            tag_response = await self.client.get(tag_url)
+            tag_json = tag_response.json()
+
+            if tag_response.status_code != 200:
+                raise GitHubError(
+                    "Unable to get tag {}. {}".format(tag, tag_json["message"])
+                )
+
+            # If we're given a tag object we have to look up the commit
+            if tag_json["object"]["type"] == "tag":
+                tag_url = tag_json["object"]["url"]
+
+        return tag_json["object"]["sha"]
+
+    async def get_last_commit(self, branch=DEFAULT_BRANCH):
+        params = {"sha": branch} if branch is not None else None
+        commits_response = await self.client.get(
+            self.repo_url + "/commits", params=params
+        )
+        commits_json = commits_response.json()
+        if commits_response.status_code != 200:
+            raise GitHubError(
+                "Unable to get commits. {}".format(commits_json["message"])
+            )
+
+        return commits_json[0]["sha"]
+
+    async def iter_commits_between(self, first_commit, last_commit):
+        """Yield the commits between two commits, one page at a time"""
+        commits_url = "{}/compare/{}...{}".format(
+            self.repo_url, first_commit, last_commit
+        )
+        params = {"per_page": str(COMPARE_PAGE_SIZE)}
+
+        while commits_url is not None:
+            commits_response = await self.client.get(commits_url, params)
+            commits_json = commits_response.json()
+            if commits_response.status_code != 200:
+                raise GitHubError(
+                    "Unable to get commits between {} and {}. {}".format(
+                        first_commit, last_commit, commits_json["message"]
+                    )
+                )
+
+            if "commits" not in commits_json:
+                raise GitHubError(
+                    "Commits not found between {} and {}.".format(
+                        first_commit, last_commit
+                    )
+                )
+
+            for c in commits_json["commits"]:
+                yield Commit(c["sha"], c["commit"]["message"])
+
+            # The next page URL already carries the query string
+            commits_url = commits_response.links.get("next", {}).get("url")
+            params = None
+
+
+async def resolve_previous_commit(source, previous_tag=None):
+    """Get the commit sha for the previous tag, or for the last tag"""
+    if previous_tag is None:
+        previous_tag = await source.get_last_tag()
+    return await source.get_commit_for_tag(previous_tag)
+
+
+async def resolve_current_commit(
+    source, current_tag=None, branch=DEFAULT_BRANCH
+):
+    """Get the commit sha for the current tag, or for the head of branch"""
+    if current_tag is None:
+        return await source.get_last_commit(branch)
+
+    try:
+        return await source.get_commit_for_tag(current_tag)
+    except GitHubError:
+        # Try to proceed with the given "tag" as a commit sha
+        return current_tag
+
+
+async def fetch_changes(
+    github_config,
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+):
+    """Get the PRs merged between two tags, newest first
+
+    Without a client or a source, a client is opened just for this call.
+    """
+    owns_client = client is None and source is None
+    if owns_client:
+        client = AsyncGitHubClient(github_config)
+    if source is None:
+        source = AsyncGitHubCommitSource(github_config, owner, repo, client)
+
+    prs = []
+    commit_count = 0
+    try:
+        # The two ends of the range are independent, so resolve them at the
+        # same time
+        previous_commit, current_commit = await asyncio.gather(
+            resolve_previous_commit(source, previous_tag),
+            resolve_current_commit(source, current_tag, branch),
+        )
+
+        # Process the commits looking for PR merges as each page arrives
+        async for commit in source.iter_commits_between(
+            previous_commit, current_commit
+        ):
+            commit_count += 1
+            pr = matcher.match(commit.message)
+            if pr is not None:
+                prs.append(pr)
+    finally:
+        if owns_client:
+            await client.close()
+
+    if len(prs) == 0 and commit_count > 0:
+        raise Exception(
+            "Lots of commits and no PRs on branch {}".format(branch)
+        )
+
+    prs.reverse()
+    return prs
+
+
+async def generate_changelog(
+    owner,
+    repo,
+    previous_tag=None,
+    current_tag=None,
+    markdown=False,
+    single_line=False,
+    branch=None,
+    github_base_url=None,
+    github_api_url=None,
+    github_token=None,
+    client=None,
+    pr_patterns=None,
+):
+    github_config = get_github_config(
+        github_base_url, github_api_url, github_token
+    )
+
+    matcher = PRMatcher(pr_patterns) if pr_patterns else DEFAULT_PR_MATCHER
+
+    # Reuse the caller's client, otherwise open one just for this changelog
+    owns_client = client is None
+    if owns_client:
+        client = AsyncGitHubClient(github_config)
+
+    try:
+        prs = await fetch_changes(
+            github_config,
+            owner,
+            repo,
+            previous_tag,
+            current_tag,
+            branch,
+            client,
+            matcher=matcher,
+        )
+    finally:
+        if owns_client:
+            await client.close()
+    lines = format_changes(github_config, owner, repo, prs, markdown=markdown)
+
+    separator = "\\n" if single_line else "\n"
+    return separator.join(lines)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Caches of GitHub API responses, on disk or in memory.
+
+Responses are revalidated with conditional requests (If-None-Match and
+If-Modified-Since). GitHub answers those with a 304 when nothing has changed,
+and 304s do not count against the API rate limit. Responses that can never
+change, like a comparison between two commit shas, are served straight from
+the cache without a request at all. A ResponseCache keeps entries on disk
+between runs, and a MemoryCache keeps them in memory for long-running
+processes.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from changelog.transport import Response
+
+
+# Total size of the cache directory before least recently used entries are
+# evicted
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+# Response headers that are kept alongside the cached body
+CACHED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Link"]
+
+
+def cache_key(url, params=None, identity=None):
+    """Key a request by its URL, query parameters and credentials"""
+    parts = [url, json.dumps(params or {}, sort_keys=True)]
+    if identity is not None:
+        parts.append(hashlib.sha256(identity.encode("utf-8")).hexdigest())
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class CacheEntry(object):
+    """A cached response and the validators needed to revalidate it"""
+
+    def __init__(self, url, status_code, headers, body, immutable=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.immutable = immutable
+
+    @property
+    def etag(self):
+        return self.headers.get("ETag")
+
+    @property
+    def last_modified(self):
+        return self.headers.get("Last-Modified")
+
+    @classmethod
+    def from_response(cls, response, immutable=False):
+        headers = {
+            name: response.headers[name]
+            for name in CACHED_HEADERS
+            if name in response.headers
+        }
+        return cls(
+            response.url,
+            response.status_code,
+            headers,
+            response.content.decode("utf-8"),
+            immutable=immutable,
+        )
+
+    def to_response(self):
+        """Build a Response equivalent to the cached one"""
+        return Response(
+            self.status_code,
+            self.headers,
+            self.body.encode("utf-8"),
+            url=self.url,
+        )
+
+
+class ResponseCache(object):
+    """A size-capped, least recently used cache of responses in a directory
+
+    Entries are keyed by the request URL, its query parameters and a hash of
+    the credentials used, so that different tokens never share responses.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, url, params=None, identity=None):
+        return cache_key(url, params, identity)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """Return the CacheEntry for a key, or None if it isn't cached"""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                entry = CacheEntry(**json.load(f))
+        except (IOError, OSError, ValueError, TypeError):
+            return None
+
+        self.touch(key)
+        return entry
+
+    def set(self, key, entry):
+        """Store an entry atomically, then evict down to the size cap"""
+        import tempfile
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry.__dict__, f)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def touch(self, key):
+        """Mark an entry as recently used"""
+        try:
+            os.utime(self.path(key), None)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used entries beyond max_size"""
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total_size -= size
+
+
+class MemoryCache(object):
+    """A size-capped, least recently used cache of responses in memory
+
+    Keyed in the same way as a ResponseCache, and safe to share between
+    threads.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def key(self, url, params=None, identity=None):
+        return cache_key(url, params, identity)
+
+    def get(self, key):
+        """Return the CacheEntry for a key, or None if it isn't cached"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """Store an entry, then evict down to the size cap"""
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self.entries[key] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental changelogs that pick up where the last run left off.
+
+A checkpoint records, for one owner/repo/branch, the range that was last
+processed and the PRs found in it, with the commits that merged them. The
+next run only fetches the commits added since then. If the previous tag has
+moved, or the checkpoint is no longer in the branch's history because it
+was force-pushed, the whole range is processed again.
+"""
+import json
+import os
+import tempfile
+from collections import namedtuple
+from urllib.parse import quote
+
+from changelog import (
+    DEFAULT_BRANCH,
+    DEFAULT_PR_MATCHER,
+    GitHubCommitSource,
+    Merge,
+    PullRequest,
+    iter_matches,
+    resolve_current_commit,
+    resolve_previous_commit,
+)
+from changelog.stats import timed
+
+
+# previous_commit and last_commit are the ends of the range processed, and
+# merges a Merge for each PR found in it, newest first
+Checkpoint = namedtuple(
+    "Checkpoint", ["previous_commit", "last_commit", "merges"]
+)
+
+
+class CheckpointStore(object):
+    """Checkpoints kept as a JSON file per owner/repo/branch in a
+    directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, owner, repo, branch):
+        name = quote("/".join([owner, repo, str(branch)]), safe="")
+        return os.path.join(self.directory, name + ".json")
+
+    def load(self, owner, repo, branch):
+        """Return the Checkpoint for a branch, or None if there isn't one"""
+        try:
+            with open(self.path(owner, repo, branch)) as f:
+                data = json.load(f)
+            return Checkpoint(
+                previous_commit=data["previous_commit"],
+                last_commit=data["last_commit"],
+                merges=[
+                    Merge(sha, PullRequest(*pr)) for sha, pr in data["merges"]
+                ],
+            )
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, owner, repo, branch, checkpoint):
+        """Store a checkpoint atomically"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(checkpoint._asdict(), f)
+        os.replace(tmp_path, self.path(owner, repo, branch))
+
+
+def fetch_changes_incremental(
+    github_config,
+    owner,
+    repo,
+    store,
+    previous_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+):
+    """Get the PRs merged into a branch since the previous tag, like
+    fetch_changes, reusing and then updating the branch's checkpoint"""
+    merges = fetch_merges_incremental(
+        github_config,
+        owner,
+        repo,
+        store,
+        previous_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+    )
+    return [merge.pr for merge in merges]
+
+
+def fetch_merges_incremental(
+    github_config,
+    owner,
+    repo,
+    store,
+    previous_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+):
+    """Get a Merge for each PR merged into a branch since the previous tag,
+    newest first, like fetch_changes_incremental"""
+    if source is None:
+        source = GitHubCommitSource(github_config, owner, repo, client)
+
+    with timed(observer, "resolve"):
+        previous_commit = resolve_previous_commit(source, previous_tag)
+        current_commit = resolve_current_commit(source, branch=branch)
+
+    # Only resume from a checkpoint for the same base that is still in the
+    # branch's history
+    checkpoint = store.load(owner, repo, branch)
+    resumable = False
+    if checkpoint is not None:
+        resumable = checkpoint.previous_commit == previous_commit
+    if resumable:
+        resumable = source.is_ancestor(checkpoint.last_commit, current_commit)
+    if resumable:
+        first_commit = checkpoint.last_commit
+        known_merges = checkpoint.merges
+    else:
+        first_commit, known_merges = previous_commit, []
+
+    merges = []
+    commit_count = 0
+    if first_commit != current_commit:
+        commits = source.iter_commits_between(first_commit, current_commit)
+        for commit, pr in iter_matches(commits, matcher, observer):
+            commit_count += 1
+            if pr is not None:
+                merges.append(Merge(commit.sha, pr))
+    merges.reverse()
+    merges.extend(known_merges)
+
+    if len(merges) == 0 and commit_count > 0:
+        raise Exception(
+            "Lots of commits and no PRs on branch {}".format(branch)
+        )
+
+    store.save(
+        owner,
+        repo,
+        branch,
+        Checkpoint(previous_commit, current_commit, merges),
+    )
+    return merges
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP client shared by every GitHub API call made while generating a
+changelog.
+"""
+import copy
+import functools
+import time
+
+from changelog.cache import CacheEntry
+from changelog.coalesce import DEFAULT_SINGLE_FLIGHT
+from changelog.ratelimit import DEFAULT_RATE_LIMITER
+from changelog.stats import request_event
+from changelog.transport import DEFAULT_TRANSPORT, new_session
+
+
+# Number of hosts and connections per host kept alive in the pool
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+
+# Requests made at once by the parts of a changelog that fan out, such as
+# looking up PRs or the files they changed, which fits within the pool
+DEFAULT_CONCURRENT_REQUESTS = 8
+
+# Seconds to wait for a connection and then for each read from the socket
+DEFAULT_TIMEOUT = (5, 30)
+
+# Bytes read from streamed responses at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Most bytes left unread in a streamed response that are still read so its
+# connection can be reused, rather than closing it
+DRAIN_LIMIT = 64 * 1024
+
+
+class GitHubClient(object):
+    """A pooled, keep-alive HTTP session for the GitHub API
+
+    A client is built from a GitHubConfig and can be reused across many
+    changelogs so that connections (and their TLS handshakes) are shared.
+    Given a ResponseCache, responses are cached and revalidated with
+    conditional requests. Requests are paced and retried by a RateLimiter,
+    which by default is shared by every client in the process, as is the
+    SingleFlight that concurrent lookups of tags and branches are merged
+    by. Given an Observer, it's told about every request and cache hit. The
+    transport names the HTTP library requests are made with, one of
+    TRANSPORTS. Given a Hedger, slow GETs are hedged; see changelog.hedge.
+    """
+
+    def __init__(
+        self,
+        github_config,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        timeout=DEFAULT_TIMEOUT,
+        cache=None,
+        rate_limiter=DEFAULT_RATE_LIMITER,
+        observer=None,
+        transport=DEFAULT_TRANSPORT,
+        single_flight=DEFAULT_SINGLE_FLIGHT,
+        hedger=None,
+    ):
+        self.config = github_config
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.observer = observer
+        self.single_flight = single_flight
+        self.hedger = hedger
+        self.deadline = None
+
+        # Hedged requests and their duplicates are made on a pool of threads
+        self.executor = None
+        if hedger is not None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.executor = ThreadPoolExecutor(max_workers=2 * pool_maxsize)
+
+        self.session = new_session(transport, pool_connections, pool_maxsize)
+        self.session.headers.update(github_config.headers)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    def get(self, url, params=None, immutable=False, **kwargs):
+        """Make a GET request, applying the default timeout
+
+        If the response for this URL can never change, pass immutable=True
+        to allow it to be served from the cache without revalidation.
+        """
+        if self.cache is None:
+            return self.send("GET", url, params=params, **kwargs)
+
+        key = self.cache.key(url, params, self.identity)
+        entry = self.cache.get(key)
+        if entry is not None and entry.immutable:
+            response = entry.to_response()
+            if self.observer is not None:
+                self.observer.on_request(
+                    request_event("GET", url, response, 0, cache="hit")
+                )
+            return response
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry is not None and entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        response = self.send(
+            "GET", url, params=params, headers=headers, **kwargs
+        )
+
+        if response.status_code == 304 and entry is not None:
+            return entry.to_response()
+
+        cacheable = immutable or any(
+            name in response.headers for name in ("ETag", "Last-Modified")
+        )
+        if response.status_code == 200 and cacheable:
+            self.cache.set(
+                key, CacheEntry.from_response(response, immutable=immutable)
+            )
+
+        return response
+
+    def post(self, url, json=None, **kwargs):
+        """Make a POST request, applying the default timeout"""
+        return self.send("POST", url, json=json, **kwargs)
+
+    def coalesce(self, key, function, *args):
+        """Call function(*args), sharing the result with concurrent calls
+        for the same key, and waiting on them no longer than this client's
+        deadline; see SingleFlight"""
+        return self.single_flight.do(
+            key + (self.identity,), function, *args, deadline=self.deadline
+        )
+
+    @property
+    def identity(self):
+        """The credentials requests are made with"""
+        return self.session.headers.get("Authorization")
+
+    @property
+    def rate_limit(self):
+        """The last known RateLimitBudget for this client's token"""
+        return self.rate_limiter.budget(self.identity)
+
+    def with_deadline(self, deadline):
+        """Get a client that shares this one's session, cache and limits,
+        and whose requests must finish within a Deadline
+
+        Closing either client closes both.
+        """
+        client = copy.copy(self)
+        client.deadline = deadline
+        return client
+
+    def send(self, method, url, **kwargs):
+        """Make a request within the rate limit, retrying it if GitHub asks
+        us to slow down or fails on its end"""
+        timeout = kwargs.pop("timeout", self.timeout)
+        request = getattr(self.session, method.lower())
+        attempt = 0
+        while True:
+            self.rate_limiter.wait(self.identity, self.deadline)
+            if self.deadline is not None:
+                self.deadline.check()
+                kwargs["timeout"] = self.deadline.timeout(timeout)
+            else:
+                kwargs["timeout"] = timeout
+
+            start = time.perf_counter()
+            try:
+                if self.hedger is not None and method == "GET":
+                    response = self.hedger.call(
+                        self.executor,
+                        functools.partial(request, url, **kwargs),
+                    )
+                    self.hedger.record(time.perf_counter() - start)
+                else:
+                    response = request(url, **kwargs)
+            except Exception:
+                # Each transport reports timeouts its own way, so a request
+                # cut short by the deadline is reported as running out of it
+                if self.deadline is not None:
+                    self.deadline.check()
+                raise
+            elapsed = time.perf_counter() - start
+            self.rate_limiter.update(self.identity, response)
+
+            if self.observer is not None:
+                cache = None
+                if self.cache is not None and method == "GET":
+                    revalidated = response.status_code == 304
+                    cache = "revalidated" if revalidated else "miss"
+                self.observer.on_request(
+                    request_event(
+                        method, url, response, elapsed, cache, attempt
+                    )
+                )
+
+            delay = self.rate_limiter.retry_delay(response, attempt)
+            if delay is None:
+                return response
+            if self.deadline is not None:
+                # Give up with the response we have rather than retry
+                # after the deadline
+                if delay >= self.deadline.remaining():
+                    return response
+            response.close()
+            if self.deadline is None:
+                self.rate_limiter.sleep(delay)
+            else:
+                self.deadline.sleep(delay, self.rate_limiter.sleep)
+            attempt += 1
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def finish(response, chunks, limit=DRAIN_LIMIT):
+    """Stop reading a streamed response part way through its chunks
+
+    If no more than limit bytes are left they're read so that the connection
+    goes back to the pool. Otherwise the connection is closed, which costs
+    a new one for the next request but saves downloading the rest.
+    """
+    read = 0
+    for chunk in chunks:
+        read += len(chunk)
+        if read > limit:
+            break
+    response.close()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Sharing lookups between concurrent callers.
+
+Changelogs generated at the same time, e.g. by changelog serve, often
+resolve the same tags and branch heads at the same moment. A SingleFlight
+keys each lookup by what it asks for, and a caller that asks while the same
+lookup is in flight waits for it and shares its result instead of making
+its own request. A failed lookup's error is shared the same way but never
+kept, except that a lookup cut short by its caller's Deadline is tried
+again by the callers waiting on it, who each wait no longer than their own
+Deadline allows.
+
+By default a result is dropped as soon as its lookup finishes, so callers
+that come one after another always make their own requests. Given a
+max_age, results are also kept for that many seconds, which suits a busy
+service better than it suits a tag or branch that has just moved.
+"""
+import threading
+import time
+
+from changelog.deadline import DeadlineExceeded
+
+
+# Seconds results are kept by services that opt in to keeping them
+LOOKUP_MAX_AGE = 2.0
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished = None
+
+
+class SingleFlight(object):
+    """Merge concurrent calls with the same key into one
+
+    Keys are tuples starting with the API URL, owner and repo they're
+    about, so that a repo's results can be forgotten.
+    """
+
+    def __init__(self, max_age=0, clock=time.monotonic):
+        self.max_age = max_age
+        self.clock = clock
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, function, *args, deadline=None):
+        """Call function(*args), unless a call with the same key is in
+        flight or finished within max_age, and return its result
+
+        Given a Deadline, waiting for another caller's call raises
+        DeadlineExceeded once it passes.
+        """
+        while True:
+            with self.lock:
+                now = self.clock()
+                call = self.calls.get(key)
+                if call is not None and call.finished is not None:
+                    if now - call.finished > self.max_age:
+                        call = None
+                leader = call is None
+                if leader:
+                    self.prune(now)
+                    call = self.calls[key] = _Call()
+            if leader:
+                break
+
+            if deadline is None:
+                call.done.wait()
+            else:
+                while not call.done.wait(deadline.remaining()):
+                    deadline.check()
+            # The leader ran out of its own time, which says nothing about
+            # this caller's, so try again
+            if isinstance(call.error, DeadlineExceeded):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                call.finished = self.clock()
+                keep = call.error is None and self.max_age > 0
+                if not keep and self.calls.get(key) is call:
+                    del self.calls[key]
+            call.done.set()
+        return call.result
+
+    def prune(self, now):
+        """Drop the results older than max_age, with the lock held"""
+        for key, call in list(self.calls.items()):
+            if call.finished is None:
+                continue
+            if now - call.finished > self.max_age:
+                del self.calls[key]
+
+    def forget(self, api_url, owner, repo):
+        """Drop the results about a repo, e.g. after a push, so that later
+        callers neither share them nor join lookups already in flight"""
+        repo_key = (api_url, owner.lower(), repo.lower())
+        with self.lock:
+            for key in list(self.calls):
+                if (key[0], key[1].lower(), key[2].lower()) == repo_key:
+                    del self.calls[key]
+
+
+# Shared by every client in the process unless they're given their own
+DEFAULT_SINGLE_FLIGHT = SingleFlight()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Bounding how long a whole changelog may take.
+
+Every request has connect and read timeouts, but a changelog makes many
+requests, and a slow server answering each of them just in time can still
+stall it for as long as it likes. A Deadline is a budget of seconds for a
+whole call, e.g. generate_changelog(timeout=60). A client given one checks
+it before every request, never waits longer than what's left of it, and
+gives up retrying or waiting on the rate limit rather than sleeping past
+it.
+"""
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call runs out of its Deadline"""
+
+
+class Deadline(object):
+    """A point in time that a call must finish by"""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        """Seconds left, never less than 0"""
+        return max(0.0, self.expires - self.clock())
+
+    def check(self):
+        """Raise DeadlineExceeded if there's no time left"""
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(
+                "Gave up after {:g} seconds".format(self.seconds)
+            )
+
+    def sleep(self, seconds, sleep=time.sleep):
+        """Sleep for a number of seconds, raising DeadlineExceeded instead
+        if that would take up all the time left"""
+        if seconds >= self.remaining():
+            raise DeadlineExceeded(
+                "Gave up rather than wait {:g} seconds".format(seconds)
+            )
+        sleep(seconds)
+        self.check()
+
+    def timeout(self, timeout):
+        """Cap a request's timeout, a number or a (connect, read) pair like
+        requests takes, to the time left"""
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(
+                remaining if t is None else min(t, remaining) for t in timeout
+            )
+        return min(timeout, remaining)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Labels, authors, merge times and descriptions of the PRs in a changelog.
+
+PRs are never looked up one at a time. With a token, they're fetched from
+the GraphQL API 100 to a query, with one aliased field per PR. Without one,
+the repo's closed PRs are listed newest first from the REST API, 100 to a
+page, until every PR has been found. Either way the requests are made
+concurrently, and the details are kept in memory by PR number so that
+later changelogs only fetch the PRs they haven't seen, up to a limit past
+which the least recently used are dropped.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from changelog import GitHubClient, GitHubError
+from changelog.client import DEFAULT_CONCURRENT_REQUESTS
+from changelog.graphql import get_graphql_url
+
+
+# labels are the names of the PR's labels, author the login of the user
+# who opened it (None for deleted users) and merged_at an ISO 8601 time
+PRDetails = namedtuple(
+    "PRDetails", ["number", "title", "labels", "author", "merged_at", "body"]
+)
+
+# The most PRs asked for in one GraphQL query, and listed in one REST page
+PRS_PER_QUERY = 100
+PULLS_PAGE_SIZE = 100
+
+# Seconds the details of a PR are used for before they're fetched again
+DETAILS_MAX_AGE = 300
+
+# PRs whose details are kept at once before the least recently used are
+# dropped
+MAX_DETAILS = 10000
+
+# Up to 20 labels are fetched for each PR with GraphQL
+PR_DETAILS_FRAGMENT = """
+fragment PRDetails on PullRequest {
+  number
+  title
+  body
+  mergedAt
+  author { login }
+  labels(first: 20) { nodes { name } }
+}
+"""
+
+
+def pull_requests_query(count):
+    """Build a query for `count` PRs, with variables $pr0, $pr1 and so on
+    holding their numbers"""
+    variables = "".join(", $pr{}: Int!".format(i) for i in range(count))
+    fields = "\n".join(
+        "    pr{0}: pullRequest(number: $pr{0}) {{ ...PRDetails }}".format(i)
+        for i in range(count)
+    )
+    return (
+        "query PullRequests($owner: String!, $repo: String!{}) {{\n"
+        "  repository(owner: $owner, name: $repo) {{\n{}\n  }}\n}}\n{}"
+    ).format(variables, fields, PR_DETAILS_FRAGMENT)
+
+
+def details_from_graphql(node):
+    author = node.get("author")
+    return PRDetails(
+        number=str(node["number"]),
+        title=node["title"],
+        labels=[label["name"] for label in node["labels"]["nodes"]],
+        author=author["login"] if author else None,
+        merged_at=node.get("mergedAt"),
+        body=node.get("body"),
+    )
+
+
+def details_from_rest(pull):
+    user = pull.get("user")
+    return PRDetails(
+        number=str(pull["number"]),
+        title=pull["title"],
+        labels=[label["name"] for label in pull.get("labels", [])],
+        author=user["login"] if user else None,
+        merged_at=pull.get("merged_at"),
+        body=pull.get("body"),
+    )
+
+
+def fetch_details_graphql(
+    github_config, owner, repo, numbers, client, max_workers
+):
+    """Fetch PRs with one GraphQL query per PRS_PER_QUERY of them"""
+    graphql_url = get_graphql_url(github_config.api_url)
+
+    def fetch(batch):
+        variables = {"owner": owner, "repo": repo}
+        for i, number in enumerate(batch):
+            variables["pr{}".format(i)] = int(number)
+        response = client.post(
+            graphql_url,
+            json={
+                "query": pull_requests_query(len(batch)),
+                "variables": variables,
+            },
+        )
+        response_json = response.json()
+        if response.status_code != 200:
+            raise GitHubError(
+                "Unable to get PRs. {}".format(response_json["message"])
+            )
+
+        # Numbers that aren't PRs, e.g. issues, come back as null with a
+        # NOT_FOUND error, which leaves them without details
+        errors = [
+            e["message"]
+            for e in response_json.get("errors") or []
+            if e.get("type") != "NOT_FOUND"
+        ]
+        repository = (response_json.get("data") or {}).get("repository")
+        if errors or repository is None:
+            raise GitHubError("Unable to get PRs. {}".format(" ".join(errors)))
+        return [
+            details_from_graphql(node)
+            for node in repository.values()
+            if node is not None
+        ]
+
+    batches = []
+    for start in range(0, len(numbers), PRS_PER_QUERY):
+        end = start + PRS_PER_QUERY
+        batches.append(numbers[start:end])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [
+            details
+            for batch_details in executor.map(fetch, batches)
+            for details in batch_details
+        ]
+
+
+def fetch_details_rest(
+    github_config, owner, repo, numbers, client, max_workers
+):
+    """Find PRs in the listing of closed PRs, newest first
+
+    PR numbers are given out in the order PRs are opened, so the listing
+    can stop at the first page that reaches past the oldest PR wanted.
+    Pages are fetched max_workers at a time.
+    """
+    pulls_url = "/".join(
+        [github_config.api_url, "repos", owner, repo, "pulls"]
+    )
+    wanted = {int(number) for number in numbers}
+    oldest = min(wanted)
+
+    def fetch(page):
+        response = client.get(
+            pulls_url,
+            params={
+                "state": "closed",
+                "sort": "created",
+                "direction": "desc",
+                "per_page": PULLS_PAGE_SIZE,
+                "page": page,
+            },
+        )
+        response_json = response.json()
+        if response.status_code != 200:
+            raise GitHubError(
+                "Unable to get PRs. {}".format(response_json["message"])
+            )
+        return response_json
+
+    found = []
+    page = 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while wanted:
+            pages = range(page, page + max_workers)
+            done = False
+            for pulls in executor.map(fetch, pages):
+                for pull in pulls:
+                    if pull["number"] in wanted:
+                        wanted.discard(pull["number"])
+                        found.append(details_from_rest(pull))
+                if len(pulls) < PULLS_PAGE_SIZE:
+                    done = True
+                elif pulls[-1]["number"] <= oldest:
+                    done = True
+            if done:
+                break
+            page += max_workers
+    return found
+
+
+_details = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_pr_details(
+    github_config,
+    owner,
+    repo,
+    numbers,
+    client=None,
+    graphql=None,
+    max_workers=DEFAULT_CONCURRENT_REQUESTS,
+    max_age=DETAILS_MAX_AGE,
+):
+    """Get the PRDetails of PRs by number, as a dict keyed by number
+
+    Only PRs this process hasn't fetched in the last max_age seconds with
+    the client's credentials are fetched. They're fetched with GraphQL if
+    graphql is True, or by default if the client has a token. Numbers that
+    aren't PRs of the repo are left out, as are those that aren't numbers
+    at all, e.g. issue keys matched by a custom PRMatcher pattern.
+    """
+    if client is None:
+        client = GitHubClient(github_config)
+    if graphql is None:
+        graphql = client.identity is not None
+
+    key = (github_config.api_url, owner, repo, client.identity)
+    now = time.time()
+    details = {}
+    missing = []
+    with _lock:
+        for number in dict.fromkeys(str(number) for number in numbers):
+            if not number.isdigit():
+                continue
+            kept = _details.get(key + (number,))
+            if kept is not None and now - kept[1] <= max_age:
+                _details.move_to_end(key + (number,))
+                details[number] = kept[0]
+            else:
+                missing.append(number)
+
+    if missing:
+        fetch = fetch_details_graphql if graphql else fetch_details_rest
+        fetched = fetch(
+            github_config, owner, repo, missing, client, max_workers
+        )
+        with _lock:
+            for pr_details in fetched:
+                details_key = key + (pr_details.number,)
+                _details[details_key] = (pr_details, now)
+                _details.move_to_end(details_key)
+                details[pr_details.number] = pr_details
+            while len(_details) > MAX_DETAILS:
+                _details.popitem(last=False)
+    return details
+
+
+def forget_pr_details(github_config, owner, repo):
+    """Drop this process's details of a repo's PRs"""
+    key = (github_config.api_url, owner, repo)
+    with _lock:
+        for details_key in list(_details):
+            if details_key[:3] == key:
+                del _details[details_key]
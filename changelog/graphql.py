@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+A commit source that uses the GitHub GraphQL API, asking only for the
+commit shas and messages that changelogs need, 100 commits per request.
+"""
+from changelog import (
+    DEFAULT_BRANCH,
+    Commit,
+    CommitSource,
+    GitHubClient,
+    GitHubError,
+    is_ancestor,
+    iter_commits_between,
+)
+
+
+# The most commits GraphQL returns in a single page of history
+HISTORY_PAGE_SIZE = 100
+
+LAST_TAG_QUERY = """
+query LastTag($owner: String!, $repo: String!) {
+  repository(owner: $owner, name: $repo) {
+    refs(
+      refPrefix: "refs/tags/"
+      first: 1
+      orderBy: {field: TAG_COMMIT_DATE, direction: DESC}
+    ) {
+      nodes { name }
+    }
+  }
+}
+"""
+
+RESOLVE_REF_QUERY = """
+query ResolveRef($owner: String!, $repo: String!, $ref: String!) {
+  repository(owner: $owner, name: $repo) {
+    ref(qualifiedName: $ref) {
+      target {
+        __typename
+        oid
+        ... on Tag { target { __typename oid } }
+      }
+    }
+  }
+}
+"""
+
+DEFAULT_BRANCH_QUERY = """
+query DefaultBranch($owner: String!, $repo: String!) {
+  repository(owner: $owner, name: $repo) {
+    ref: defaultBranchRef {
+      target { __typename oid }
+    }
+  }
+}
+"""
+
+PEEL_TAG_QUERY = """
+query PeelTag($owner: String!, $repo: String!, $oid: GitObjectID!) {
+  repository(owner: $owner, name: $repo) {
+    object(oid: $oid) {
+      __typename
+      oid
+      ... on Tag { target { __typename oid } }
+    }
+  }
+}
+"""
+
+HISTORY_QUERY = """
+query History(
+  $owner: String!
+  $repo: String!
+  $oid: GitObjectID!
+  $first: Int!
+  $after: String
+) {
+  repository(owner: $owner, name: $repo) {
+    object(oid: $oid) {
+      ... on Commit {
+        history(first: $first, after: $after) {
+          pageInfo { hasNextPage endCursor }
+          nodes { oid message }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def get_graphql_url(api_url):
+    """Get the GraphQL endpoint that goes with a REST API URL
+
+    GitHub Enterprise serves REST at /api/v3 and GraphQL at /api/graphql,
+    while github.com serves both from api.github.com.
+    """
+    api_url = api_url.rstrip("/")
+    if api_url.endswith("/v3"):
+        return api_url[: -len("/v3")] + "/graphql"
+    return api_url + "/graphql"
+
+
+class GraphQLCommitSource(CommitSource):
+    """Get tags and commits for a repo from the GitHub GraphQL API"""
+
+    def __init__(self, github_config, owner, repo, client=None):
+        if client is None:
+            client = GitHubClient(github_config)
+        self.github_config = github_config
+        self.graphql_url = get_graphql_url(github_config.api_url)
+        self.owner = owner
+        self.repo = repo
+        self.client = client
+
+    def query(self, query, **variables):
+        """Run a query against the repo and return its repository data"""
+        variables.update(owner=self.owner, repo=self.repo)
+        response = self.client.post(
+            self.graphql_url, json={"query": query, "variables": variables}
+        )
+        response_json = response.json()
+        if response.status_code != 200:
+            raise GitHubError(
+                "GraphQL request failed. {}".format(response_json["message"])
+            )
+        if response_json.get("errors"):
+            raise GitHubError(
+                "GraphQL request failed. {}".format(
+                    " ".join(e["message"] for e in response_json["errors"])
+                )
+            )
+        return response_json["data"]["repository"]
+
+    def peel(self, target):
+        """Follow annotated tags until reaching the commit they point to"""
+        while target["__typename"] == "Tag":
+            if "target" not in target:
+                target = self.query(PEEL_TAG_QUERY, oid=target["oid"])[
+                    "object"
+                ]
+            target = target["target"]
+        return target["oid"]
+
+    def get_last_tag(self):
+        tags = self.query(LAST_TAG_QUERY)["refs"]["nodes"]
+        if not tags:
+            raise GitHubError("No tags found.")
+        return tags[0]["name"]
+
+    def get_commit_for_tag(self, tag):
+        ref = self.query(RESOLVE_REF_QUERY, ref="refs/tags/" + tag)["ref"]
+        if ref is None:
+            raise GitHubError("Unable to get tag {}.".format(tag))
+        return self.peel(ref["target"])
+
+    def get_last_commit(self, branch=DEFAULT_BRANCH):
+        if branch is None:
+            ref = self.query(DEFAULT_BRANCH_QUERY)["ref"]
+        else:
+            ref = self.query(RESOLVE_REF_QUERY, ref="refs/heads/" + branch)[
+                "ref"
+            ]
+        if ref is None:
+            raise GitHubError("Unable to get commits on {}.".format(branch))
+        return ref["target"]["oid"]
+
+    def is_ancestor(self, ancestor, descendant):
+        return is_ancestor(
+            self.github_config,
+            self.owner,
+            self.repo,
+            ancestor,
+            descendant,
+            self.client,
+        )
+
+    def iter_commits_between(self, first_commit, last_commit):
+        """Walk history back from last_commit until reaching first_commit
+
+        History is returned newest first, so the range is collected before
+        yielding its commits oldest first, as the compare API does.
+
+        If first_commit isn't on the first page, it's checked to be in the
+        history of last_commit before walking on. Otherwise, e.g. for a tag
+        on a release branch, walking would only stop at the first commit,
+        so the range is compared from their merge base with the REST API
+        instead.
+        """
+        commits = []
+        after = None
+        while True:
+            commit = self.query(
+                HISTORY_QUERY,
+                oid=last_commit,
+                first=HISTORY_PAGE_SIZE,
+                after=after,
+            )["object"]
+            if commit is None:
+                raise GitHubError(
+                    "Unable to get commits between {} and {}.".format(
+                        first_commit, last_commit
+                    )
+                )
+
+            history = commit["history"]
+            for node in history["nodes"]:
+                if node["oid"] == first_commit:
+                    return iter(reversed(commits))
+                commits.append(Commit(node["oid"], node["message"]))
+
+            if not history["pageInfo"]["hasNextPage"]:
+                raise GitHubError(
+                    "Commits not found between {} and {}.".format(
+                        first_commit, last_commit
+                    )
+                )
+            if after is None:
+                if not self.is_ancestor(first_commit, last_commit):
+                    return iter_commits_between(
+                        self.github_config,
+                        self.owner,
+                        self.repo,
+                        first_commit,
+                        last_commit,
+                        self.client,
+                    )
+            after = history["pageInfo"]["endCursor"]
+
+    def get_changed_files(self, shas):
+        """Get the files changed by each commit from the REST API, as
+        GraphQL doesn't list them"""
+        from changelog.paths import get_changed_files
+
+        return get_changed_files(
+            self.github_config, self.owner, self.repo, shas, self.client
+        )
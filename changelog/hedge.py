@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Hedged requests, which cut the tail of slow GET responses.
+
+Most responses from GitHub arrive quickly, but now and then one takes many
+times longer, and a changelog that makes dozens of requests is as slow as
+its slowest. A client with a Hedger sends a duplicate of any GET that
+hasn't been answered after the given percentile of the latencies it has
+seen, and uses whichever response arrives first. At the 95th percentile
+that's about one extra request in twenty, in exchange for rarely waiting on
+the slowest response. Only GETs are hedged, as they're safe to repeat.
+"""
+import threading
+from collections import deque
+
+
+DEFAULT_HEDGE_PERCENTILE = 95
+
+# Latencies the percentile is taken over, and the fewest that it's taken
+# over. Until then, duplicates are sent after INITIAL_HEDGE_DELAY seconds.
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+INITIAL_HEDGE_DELAY = 1.0
+
+# Never hedge sooner than this, however fast responses have been
+MIN_HEDGE_DELAY = 0.01
+
+
+def percentile(values, p):
+    """Get the p-th percentile of some values, by the nearest rank"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = -(-len(ordered) * p // 100)
+    return ordered[max(0, min(len(ordered), int(rank)) - 1)]
+
+
+class Hedger(object):
+    """Track recent response latencies and decide when to hedge"""
+
+    def __init__(
+        self,
+        percentile=DEFAULT_HEDGE_PERCENTILE,
+        window=LATENCY_WINDOW,
+        min_samples=MIN_SAMPLES,
+        initial_delay=INITIAL_HEDGE_DELAY,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.hedged = 0
+
+    def record(self, elapsed):
+        with self.lock:
+            self.latencies.append(elapsed)
+
+    def delay(self):
+        """Seconds to wait for a response before sending a duplicate"""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            latencies = list(self.latencies)
+        return max(MIN_HEDGE_DELAY, percentile(latencies, self.percentile))
+
+    def call(self, executor, function):
+        """Call function on the executor, and again if the first call takes
+        longer than delay(), returning whichever result comes first
+
+        The other result is closed once it arrives. If one call fails, the
+        other's result is still used; if both fail, the first error is
+        raised.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        first = executor.submit(function)
+        done, _ = wait([first], timeout=self.delay())
+        if done:
+            return first.result()
+
+        with self.lock:
+            self.hedged += 1
+        pending = {first, executor.submit(function)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                for other in pending | (done - {future}):
+                    other.add_done_callback(close_result)
+                return future.result()
+        raise error
+
+
+def close_result(future):
+    if future.exception() is None:
+        future.result().close()
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+A local SQLite index of which release shipped each PR.
+
+Syncing walks a branch's history newest first, as fetch_history does, and
+stores every commit with the PR it merged and the tag of its release. Once
+a commit is in a release it stays there, so later syncs stop at the first
+released commit they reach and only walk the commits added since, along
+with any that were unreleased last time. If a tag that was indexed moves
+or is deleted, or a new tag points at an already released commit, the
+repo is indexed again from scratch.
+
+Commits are numbered from the oldest, so a changelog between two indexed
+tags, and the release of a PR, are each one indexed query.
+"""
+from __future__ import print_function
+
+import argparse
+import sqlite3
+import sys
+from collections import namedtuple
+
+from changelog import (
+    DEFAULT_BRANCH,
+    DEFAULT_PR_MATCHER,
+    GitHubCommitSource,
+    Merge,
+    PRMatcher,
+    PullRequest,
+    add_github_arguments,
+    add_source_arguments,
+    choose_source,
+    get_github_config,
+    iter_matches,
+)
+from changelog.cache import ResponseCache
+from changelog.client import GitHubClient
+from changelog.stats import timed
+
+
+# release is the tag of the release the PR went out in, or None if it's
+# unreleased
+IndexedPR = namedtuple("IndexedPR", ["number", "title", "sha", "release"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    head TEXT NOT NULL,
+    PRIMARY KEY (owner, repo)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    PRIMARY KEY (owner, repo, name)
+);
+CREATE TABLE IF NOT EXISTS commits (
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    number TEXT,
+    title TEXT,
+    release TEXT,
+    PRIMARY KEY (owner, repo, sha)
+);
+CREATE INDEX IF NOT EXISTS commits_by_position
+    ON commits (owner, repo, position);
+CREATE INDEX IF NOT EXISTS commits_by_number
+    ON commits (owner, repo, number);
+"""
+
+
+class ReleaseIndex(object):
+    """The PRs and releases of any number of repos, in one SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get_tags(self, owner, repo):
+        """Get the indexed tags of a repo, as a dict of name to sha"""
+        rows = self.connection.execute(
+            "SELECT name, sha FROM tags WHERE owner = ? AND repo = ?",
+            (owner, repo),
+        )
+        return dict(rows)
+
+    def get_release(self, owner, repo, sha):
+        """Get (position, release) for an indexed commit, or None"""
+        return self.connection.execute(
+            "SELECT position, release FROM commits "
+            "WHERE owner = ? AND repo = ? AND sha = ?",
+            (owner, repo, sha),
+        ).fetchone()
+
+    def needs_rebuild(self, owner, repo, branch, tags):
+        """Determine whether what's indexed for a repo can't be built on"""
+        state = self.connection.execute(
+            "SELECT branch FROM repos WHERE owner = ? AND repo = ?",
+            (owner, repo),
+        ).fetchone()
+        if state is None or state[0] != branch:
+            return True
+
+        known_tags = self.get_tags(owner, repo)
+        for name, sha in known_tags.items():
+            if tags.get(name) != sha:
+                return True
+        for name, sha in tags.items():
+            if name in known_tags:
+                continue
+            indexed = self.get_release(owner, repo, sha)
+            if indexed is not None and indexed[1] is not None:
+                return True
+        return False
+
+    def sync(
+        self,
+        source,
+        owner,
+        repo,
+        branch=DEFAULT_BRANCH,
+        matcher=DEFAULT_PR_MATCHER,
+        observer=None,
+    ):
+        """Index the commits added to a branch since the last sync
+
+        Returns the number of commits walked. Tags are taken from the
+        source as they are, so a long-running process should forget any
+        tag index it keeps for the repo first.
+        """
+        with timed(observer, "resolve"):
+            head = source.get_last_commit(branch)
+            tags = {}
+            tags_by_commit = {}
+            for name, sha in source.get_tags():
+                tags[name] = sha
+                # The first tag listed for a commit names its release
+                tags_by_commit.setdefault(sha, name)
+
+        rebuild = self.needs_rebuild(owner, repo, branch, tags)
+        if not rebuild:
+            last_head = self.connection.execute(
+                "SELECT head FROM repos WHERE owner = ? AND repo = ?",
+                (owner, repo),
+            ).fetchone()[0]
+            if last_head == head and self.get_tags(owner, repo) == tags:
+                return 0
+
+        # Walk back to the first commit already in a release
+        base = 0
+        rows = []
+        release = None
+        for commit, pr in iter_matches(
+            source.iter_history(head), matcher, observer
+        ):
+            if not rebuild:
+                indexed = self.get_release(owner, repo, commit.sha)
+                if indexed is not None and indexed[1] is not None:
+                    base = indexed[0]
+                    break
+            release = tags_by_commit.get(commit.sha, release)
+            if pr is None:
+                rows.append((commit.sha, None, None, release))
+            else:
+                rows.append((commit.sha, pr.number, pr.title, release))
+
+        rows.reverse()
+        with self.connection:
+            if rebuild:
+                self.forget(owner, repo, commit=False)
+            else:
+                # Unreleased commits were all walked again, and any that
+                # weren't seen were force-pushed away
+                self.connection.execute(
+                    "DELETE FROM commits "
+                    "WHERE owner = ? AND repo = ? AND release IS NULL",
+                    (owner, repo),
+                )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO commits "
+                "(owner, repo, sha, position, number, title, release) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (owner, repo, sha, base + i + 1, number, title, tag)
+                    for i, (sha, number, title, tag) in enumerate(rows)
+                ],
+            )
+            self.connection.execute(
+                "DELETE FROM tags WHERE owner = ? AND repo = ?", (owner, repo)
+            )
+            self.connection.executemany(
+                "INSERT INTO tags (owner, repo, name, sha) "
+                "VALUES (?, ?, ?, ?)",
+                [(owner, repo, name, sha) for name, sha in tags.items()],
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO repos (owner, repo, branch, head) "
+                "VALUES (?, ?, ?, ?)",
+                (owner, repo, branch, head),
+            )
+        return len(rows)
+
+    def lookup(self, owner, repo, number):
+        """Get the IndexedPR for a PR number, or None if it isn't indexed"""
+        row = self.connection.execute(
+            "SELECT number, title, sha, release FROM commits "
+            "WHERE owner = ? AND repo = ? AND number = ? "
+            "ORDER BY position LIMIT 1",
+            (owner, repo, str(number)),
+        ).fetchone()
+        return IndexedPR(*row) if row is not None else None
+
+    def changes(self, owner, repo, previous_tag, current_tag):
+        """Get the PRs between two tags, newest first, like fetch_changes
+
+        Returns None unless both tags are indexed.
+        """
+        merges = self.merges(owner, repo, previous_tag, current_tag)
+        if merges is None:
+            return None
+        return [merge.pr for merge in merges]
+
+    def merges(self, owner, repo, previous_tag, current_tag):
+        """Get a Merge for each PR between two tags, newest first, like
+        fetch_merges
+
+        Returns None unless both tags are indexed.
+        """
+        row = self.connection.execute(
+            "SELECT previous.position, current.position "
+            "FROM tags AS previous_tag "
+            "JOIN commits AS previous "
+            "ON previous.owner = previous_tag.owner "
+            "AND previous.repo = previous_tag.repo "
+            "AND previous.sha = previous_tag.sha "
+            "JOIN tags AS current_tag "
+            "ON current_tag.owner = previous_tag.owner "
+            "AND current_tag.repo = previous_tag.repo "
+            "JOIN commits AS current "
+            "ON current.owner = current_tag.owner "
+            "AND current.repo = current_tag.repo "
+            "AND current.sha = current_tag.sha "
+            "WHERE previous_tag.owner = ? AND previous_tag.repo = ? "
+            "AND previous_tag.name = ? AND current_tag.name = ?",
+            (owner, repo, previous_tag, current_tag),
+        ).fetchone()
+        if row is None:
+            return None
+
+        rows = self.connection.execute(
+            "SELECT sha, number, title FROM commits "
+            "WHERE owner = ? AND repo = ? AND position > ? AND position <= ? "
+            "AND number IS NOT NULL ORDER BY position DESC",
+            (owner, repo) + tuple(row),
+        )
+        return [
+            Merge(sha, PullRequest(number, title))
+            for sha, number, title in rows
+        ]
+
+    def forget(self, owner, repo, commit=True):
+        """Drop everything indexed for a repo"""
+        for table in ["repos", "tags", "commits"]:
+            self.connection.execute(
+                "DELETE FROM {} WHERE owner = ? AND repo = ?".format(table),
+                (owner, repo),
+            )
+        if commit:
+            self.connection.commit()
+
+
+def add_index_arguments(parser):
+    parser.add_argument(
+        "owner", metavar="OWNER", help="owner of the repo on GitHub"
+    )
+    parser.add_argument(
+        "repo", metavar="REPO", help="name of the repo on GitHub"
+    )
+    parser.add_argument(
+        "--index",
+        dest="index_path",
+        metavar="PATH",
+        required=True,
+        help="SQLite file holding the index, created if it doesn't exist",
+    )
+    parser.add_argument(
+        "--branch",
+        default=DEFAULT_BRANCH,
+        help="Branch whose history is indexed (defaults to main)",
+    )
+    add_source_arguments(parser)
+    add_github_arguments(parser)
+
+
+def sync_index(index, args):
+    """Sync a repo's index with the options of add_index_arguments"""
+    github_config = get_github_config(
+        args.github_base_url, args.github_api_url, args.github_token
+    )
+    client = None
+    if args.local_repo is None:
+        cache = None
+        if args.cache_dir is not None:
+            cache = ResponseCache(args.cache_dir)
+        client = GitHubClient(
+            github_config, cache=cache, transport=args.transport
+        )
+    source = choose_source(
+        github_config,
+        args.owner,
+        args.repo,
+        client,
+        local_repo=args.local_repo,
+        tag_index=args.tag_index,
+    )
+    if source is None:
+        source = GitHubCommitSource(
+            github_config, args.owner, args.repo, client
+        )
+    matcher = DEFAULT_PR_MATCHER
+    if args.pr_patterns:
+        matcher = PRMatcher(args.pr_patterns)
+    try:
+        return index.sync(source, args.owner, args.repo, args.branch, matcher)
+    finally:
+        if client is not None:
+            client.close()
+
+
+def index_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="changelog index",
+        description="Index which release shipped each PR of a repo, only "
+        "walking the commits added since the last time",
+    )
+    add_index_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with ReleaseIndex(args.index_path) as index:
+        count = sync_index(index, args)
+    print("Indexed {} commits of {}/{}".format(count, args.owner, args.repo))
+
+
+def lookup_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="changelog lookup",
+        description="Find the release that shipped a PR, from an index built "
+        "by changelog index",
+    )
+    add_index_arguments(parser)
+    parser.add_argument(
+        "number", metavar="NUMBER", help="number of the PR to look up"
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Index any new commits and tags before looking the PR up",
+    )
+    args = parser.parse_args(argv)
+    number = args.number.lstrip("#")
+
+    with ReleaseIndex(args.index_path) as index:
+        if args.sync:
+            sync_index(index, args)
+        pr = index.lookup(args.owner, args.repo, number)
+
+    if pr is None:
+        print(
+            "#{} isn't a PR merged into {}/{} {}".format(
+                number, args.owner, args.repo, args.branch
+            ),
+            file=sys.stderr,
+        )
+        return 1
+    print("#{} {}: {}".format(pr.number, pr.title, pr.release or "unreleased"))
+    return 0
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Reading one array out of a large JSON object without parsing the rest.
+
+The compare API returns the commits in a range alongside a `files` array of
+every changed file and its patch, which can run to megabytes that changelogs
+never look at. GitHub sends `commits` before `files`, so reading a response
+only as far as the end of `commits` skips both downloading and parsing the
+files.
+"""
+import codecs
+import json
+
+
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class KeyNotFoundError(ValueError):
+    """Raised when an object ends without the key being looked for"""
+
+
+class _Reader(object):
+    """Decode JSON values one at a time from an iterable of byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+
+    def fill(self):
+        """Read another chunk, returning False once there are no more"""
+        if self.done:
+            return False
+        try:
+            text = self.decoder.decode(next(self.chunks))
+        except StopIteration:
+            text = self.decoder.decode(b"", final=True)
+            self.done = True
+
+        # Drop everything already parsed
+        parsed = self.pos
+        self.buffer = self.buffer[parsed:] + text
+        self.pos = 0
+        return not self.done or bool(text)
+
+    def peek(self):
+        """Get the next character that isn't whitespace, without
+        consuming it"""
+        while True:
+            while self.pos < len(self.buffer):
+                if self.buffer[self.pos] not in WHITESPACE:
+                    return self.buffer[self.pos]
+                self.pos += 1
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON")
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(
+                "Expected {!r} but found {!r}".format(char, found)
+            )
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading as many chunks as it takes"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                end = None
+
+            # A value that reaches the end of the buffer, like a number, may
+            # carry on in the next chunk
+            if end is not None and end < len(self.buffer):
+                self.pos = end
+                return value
+            if self.done:
+                if end is None:
+                    raise ValueError("Unexpected end of JSON")
+                self.pos = end
+                return value
+
+            # Read at least as much again before retrying, so that a large
+            # value is decoded a few times rather than once per chunk
+            target = 2 * (len(self.buffer) - self.pos)
+            self.fill()
+            while not self.done and len(self.buffer) < target:
+                self.fill()
+
+
+def iter_array(chunks, key, fields=None):
+    """Yield the items of the array under `key` in a JSON object
+
+    The object is read from an iterable of byte chunks, such as
+    requests' Response.iter_content, and nothing is read past the end of
+    the array. Values before it are decoded and discarded, or stored in the
+    `fields` dict if one is given.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    while True:
+        if reader.peek() == "}":
+            raise KeyNotFoundError(key)
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            break
+        value = reader.value()
+        if fields is not None:
+            fields[name] = value
+        if reader.peek() != "}":
+            reader.expect(",")
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == "]":
+            return
+        reader.expect(",")
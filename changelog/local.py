@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+A commit source that reads tags and commits from a local clone with git,
+without making any requests to GitHub.
+"""
+import subprocess
+
+from changelog import DEFAULT_BRANCH, Commit, CommitSource, GitHubError
+
+
+# Bytes read from `git log` at a time while streaming commits
+READ_SIZE = 64 * 1024
+
+
+class LocalRepoError(GitHubError):
+    """Raised when git can't resolve a ref in the local clone
+
+    This is a GitHubError so that callers handle a missing tag the same way
+    whichever source it came from.
+    """
+
+
+class LocalCommitSource(CommitSource):
+    """Get tags and commits from a git clone at the given path"""
+
+    def __init__(self, path, git="git"):
+        self.path = path
+        self.git = git
+
+    def run(self, *args, stdin=None):
+        process = subprocess.run(
+            [self.git, "-C", self.path] + list(args),
+            input=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if process.returncode != 0:
+            raise LocalRepoError(
+                "git {} failed. {}".format(
+                    " ".join(args),
+                    process.stderr.decode("utf-8", "replace").strip(),
+                )
+            )
+        return process.stdout.decode("utf-8").strip()
+
+    def rev_parse(self, ref):
+        """Get the commit sha a ref points to, peeling annotated tags"""
+        return self.run("rev-parse", "--verify", "--quiet", ref + "^{commit}")
+
+    def get_last_tag(self):
+        """Get the most recently created tag"""
+        tag = self.run(
+            "for-each-ref",
+            "--sort=-creatordate",
+            "--count=1",
+            "--format=%(refname:short)",
+            "refs/tags",
+        )
+        if not tag:
+            raise LocalRepoError("No tags found in {}".format(self.path))
+        return tag
+
+    def get_tags(self):
+        """List tags newest first, with annotated tags peeled"""
+        tags = []
+        refs = self.run(
+            "for-each-ref",
+            "--sort=-creatordate",
+            "--format=%(refname:short) %(objectname) %(*objectname)",
+            "refs/tags",
+        )
+        for line in refs.splitlines():
+            name, sha, peeled = (line.split(" ") + [""])[:3]
+            tags.append((name, peeled or sha))
+        return tags
+
+    def get_commit_for_tag(self, tag):
+        try:
+            return self.rev_parse("refs/tags/" + tag)
+        except LocalRepoError:
+            raise LocalRepoError("Unable to find tag {}.".format(tag))
+
+    def get_last_commit(self, branch=DEFAULT_BRANCH):
+        # CI checkouts often only have the remote tracking branch
+        refs = [branch, "origin/" + branch] if branch else ["HEAD"]
+        for ref in refs:
+            try:
+                return self.rev_parse(ref)
+            except LocalRepoError:
+                continue
+        raise LocalRepoError("Unable to find branch {}.".format(branch))
+
+    def is_ancestor(self, ancestor, descendant):
+        try:
+            self.run("merge-base", "--is-ancestor", ancestor, descendant)
+        except LocalRepoError:
+            return False
+        return True
+
+    def get_changed_files(self, shas):
+        """List the files changed by every commit with one `git log`
+
+        Renames are listed as their old and new names, and merge commits
+        are compared with their first parent.
+        """
+        files = {sha: [] for sha in shas}
+        if not files:
+            return files
+        output = self.run(
+            "-c",
+            "core.quotePath=false",
+            "log",
+            "--no-walk=unsorted",
+            "--stdin",
+            "-m",
+            "--first-parent",
+            "--no-renames",
+            "--name-only",
+            "-z",
+            "--format=%x01%H",
+            stdin="\n".join(files).encode("utf-8"),
+        )
+
+        # Each commit starts with \x01 and its sha, and file names end
+        # with NUL bytes
+        changed = None
+        for name in output.split("\0"):
+            name = name.lstrip("\n")
+            if name.startswith("\x01"):
+                changed = files.setdefault(name[1:], [])
+            elif name and changed is not None:
+                changed.append(name)
+        return files
+
+    def iter_commits_between(self, first_commit, last_commit):
+        """Stream the commits between two commits out of `git log`
+
+        Commits are yielded oldest first, as the compare API returns them.
+        """
+        return self.log(
+            "Unable to get commits between {} and {}.".format(
+                first_commit, last_commit
+            ),
+            "--reverse",
+            first_commit + ".." + last_commit,
+        )
+
+    def iter_history(self, last_commit):
+        return self.log(
+            "Unable to get the history of {}.".format(last_commit),
+            last_commit,
+        )
+
+    def log(self, error, *args):
+        """Stream commits out of `git log` with the given arguments"""
+        command = [self.git, "-C", self.path, "log", "-z", "--format=%H%n%B"]
+        process = subprocess.Popen(
+            command + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        # Records are separated by NUL bytes, which can't appear in a message
+        buffer = b""
+        with process:
+            for chunk in iter(lambda: process.stdout.read(READ_SIZE), b""):
+                buffer += chunk
+                *records, buffer = buffer.split(b"\0")
+                for record in records:
+                    yield self.parse_commit(record)
+            if buffer:
+                yield self.parse_commit(buffer)
+
+            stderr = process.stderr.read()
+        if process.returncode != 0:
+            raise LocalRepoError(
+                "{} {}".format(
+                    error, stderr.decode("utf-8", "replace").strip()
+                )
+            )
+
+    def parse_commit(self, record):
+        sha, _, message = record.decode("utf-8").partition("\n")
+        return Commit(sha, message.rstrip("\n"))
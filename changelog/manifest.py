@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Reading the manifests of repositories used to generate changelogs in bulk.
+
+A manifest lists one repository per entry with the columns `owner`, `repo`
+and, optionally, `previous`, `current` and `branch`. It can be a JSON or
+YAML list of objects, or a CSV file with a header row.
+
+Every value is read as text, so that a tag such as 1.10 isn't read as the
+number 1.1.
+"""
+import csv
+import json
+import os
+from collections import namedtuple
+
+
+BatchEntry = namedtuple(
+    "BatchEntry", ["owner", "repo", "previous_tag", "current_tag", "branch"]
+)
+
+
+class ManifestError(Exception):
+    pass
+
+
+def load_json(f):
+    # Keep numbers as they were written
+    return json.load(f, parse_int=str, parse_float=str)
+
+
+def load_yaml(f):
+    try:
+        import yaml
+    except ImportError:
+        raise ManifestError(
+            "Reading YAML manifests requires PyYAML. "
+            "Install it with `pip install github-changelog[yaml]`."
+        )
+
+    # Like safe_load, but only null is told apart from text
+    class ManifestLoader(yaml.SafeLoader):
+        pass
+
+    ManifestLoader.yaml_implicit_resolvers = {
+        first: [
+            (tag, regexp)
+            for tag, regexp in resolvers
+            if tag == "tag:yaml.org,2002:null"
+        ]
+        for first, resolvers in ManifestLoader.yaml_implicit_resolvers.items()
+    }
+
+    try:
+        return yaml.load(f, Loader=ManifestLoader)
+    except yaml.YAMLError as e:
+        raise ManifestError("Unable to read YAML manifest. {}".format(e))
+
+
+def text(value):
+    """Get a manifest value as text, or None if it's empty"""
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def parse_entry(row, default_branch):
+    """Make a BatchEntry from one row of a manifest"""
+    try:
+        owner, repo = text(row["owner"]), text(row["repo"])
+    except (KeyError, TypeError):
+        owner = repo = None
+    if owner is None or repo is None:
+        raise ManifestError(
+            "Manifest entries need an owner and a repo, got {}".format(row)
+        )
+
+    return BatchEntry(
+        owner=owner,
+        repo=repo,
+        previous_tag=text(row.get("previous")),
+        current_tag=text(row.get("current")),
+        branch=text(row.get("branch")) or default_branch,
+    )
+
+
+def read_manifest(path, default_branch):
+    """Read the list of BatchEntry in a JSON, YAML or CSV manifest"""
+    extension = os.path.splitext(path)[1].lower()
+    loaders = {
+        ".json": load_json,
+        ".yaml": load_yaml,
+        ".yml": load_yaml,
+        ".csv": lambda f: list(csv.DictReader(f)),
+    }
+    if extension not in loaders:
+        raise ManifestError(
+            "Unknown manifest format {}, expected .json, .yaml, .yml "
+            "or .csv".format(path)
+        )
+
+    try:
+        with open(path) as f:
+            rows = loaders[extension](f)
+    except OSError as e:
+        raise ManifestError("Unable to open manifest. {}".format(e))
+    except (ValueError, csv.Error) as e:
+        # Including json.JSONDecodeError
+        raise ManifestError("Unable to read manifest {}. {}".format(path, e))
+
+    if not isinstance(rows, list):
+        raise ManifestError("Manifest {} isn't a list".format(path))
+
+    return [parse_entry(row, default_branch) for row in rows]
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Changelogs for parts of a repo, such as the packages of a monorepo.
+
+A comparison lists the files changed by the whole range, not by each
+commit, so the files each PR changed are looked up separately: from a local
+clone with one `git log` for every PR, or otherwise with a request for each
+merge commit, made concurrently and cached for good since a commit never
+changes. Only the commits that merged PRs are looked up.
+
+The range is fetched once whatever the number of paths, and each PR is put
+under every path it changed a file in, so a changelog for thirty packages
+costs about the same as one for a single package.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from changelog import (
+    DEFAULT_BRANCH,
+    DEFAULT_PR_MATCHER,
+    GitHubClient,
+    GitHubCommitSource,
+    bound_client,
+    fetch_merges,
+    iter_pages,
+    pull_requests,
+    timed,
+)
+from changelog.client import DEFAULT_CONCURRENT_REQUESTS
+
+
+# The PRs, or Merges, that changed files under a path, newest first
+PathChanges = namedtuple("PathChanges", ["path", "prs"])
+
+# Files listed in one page of a commit, which is the most GitHub allows
+COMMIT_FILES_PAGE_SIZE = 300
+
+
+def normalize_path(path):
+    """Strip a path down to the form git and GitHub list files in, e.g.
+    ./packages/api/ to packages/api"""
+    path = path.strip().replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    path = path.strip("/")
+    return "" if path == "." else path
+
+
+def is_under(filename, path):
+    """Determine whether a file is the path, or in the directory at it"""
+    if not path:
+        return True
+    return filename == path or filename.startswith(path + "/")
+
+
+def get_commit_url(github_config, owner, repo, sha):
+    return "/".join(
+        [github_config.api_url, "repos", owner, repo, "commits", sha]
+    )
+
+
+def fetch_commit_files(github_config, owner, repo, sha, client):
+    """List the files a commit changed, following its pages of files
+
+    Renamed files are listed under both their old and new names. Merge
+    commits list the files changed since their first parent.
+    """
+    pages = iter_pages(
+        client,
+        get_commit_url(github_config, owner, repo, sha),
+        {"per_page": COMMIT_FILES_PAGE_SIZE},
+        "Unable to get the files changed by {}".format(sha),
+        immutable=True,
+    )
+    files = []
+    for response in pages:
+        for changed in response.json().get("files", []):
+            files.append(changed["filename"])
+            if changed.get("previous_filename"):
+                files.append(changed["previous_filename"])
+    return files
+
+
+def get_changed_files(
+    github_config,
+    owner,
+    repo,
+    shas,
+    client=None,
+    max_workers=DEFAULT_CONCURRENT_REQUESTS,
+):
+    """Get the files changed by each commit, as a dict keyed by sha
+
+    Commits are looked up max_workers at a time.
+    """
+    if client is None:
+        client = GitHubClient(github_config)
+    shas = list(dict.fromkeys(shas))
+
+    def fetch(sha):
+        return fetch_commit_files(github_config, owner, repo, sha, client)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(shas, executor.map(fetch, shas)))
+
+
+def bucket_by_paths(merges, files, paths):
+    """Sort Merges under every path their PR changed a file in
+
+    files is a dict of the files changed by each merge commit, keyed by sha.
+    Returns a PathChanges of Merges for each path, in the order given,
+    keeping the Merges in order.
+    """
+    normalized = [normalize_path(path) for path in paths]
+    changes = [PathChanges(path=path, prs=[]) for path in paths]
+    for merge in merges:
+        merge_files = files.get(merge.sha, [])
+        for path, path_changes in zip(normalized, changes):
+            if any(is_under(filename, path) for filename in merge_files):
+                path_changes.prs.append(merge)
+    return changes
+
+
+def fetch_path_changes(
+    github_config,
+    owner,
+    repo,
+    paths,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Get the PRs merged between two tags that changed files under each
+    of the paths, newest first, as a list of PathChanges
+
+    Paths are directories or files relative to the root of the repo. A PR
+    goes under every path it changed a file in, and under none if it
+    changed none of them. The files are listed by the source.
+    """
+    changes = fetch_path_merges(
+        github_config,
+        owner,
+        repo,
+        paths,
+        previous_tag,
+        current_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+        deadline,
+    )
+    return pull_requests(changes, sections=True)
+
+
+def fetch_path_merges(
+    github_config,
+    owner,
+    repo,
+    paths,
+    previous_tag=None,
+    current_tag=None,
+    branch=DEFAULT_BRANCH,
+    client=None,
+    source=None,
+    matcher=DEFAULT_PR_MATCHER,
+    observer=None,
+    deadline=None,
+):
+    """Get the PathChanges of the Merges of the PRs under each of the
+    paths, like fetch_path_changes"""
+    if source is None:
+        client = bound_client(github_config, client, deadline)
+        source = GitHubCommitSource(github_config, owner, repo, client)
+
+    merges = fetch_merges(
+        github_config,
+        owner,
+        repo,
+        previous_tag,
+        current_tag,
+        branch,
+        client,
+        source,
+        matcher,
+        observer,
+    )
+    with timed(observer, "files"):
+        files = source.get_changed_files([merge.sha for merge in merges])
+    return bucket_by_paths(merges, files, paths)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Keeping GitHub API requests within the rate limit.
+
+GitHub reports the remaining quota for each token in the X-RateLimit-*
+headers of every response. Requests are paced once that quota runs low, and
+responses that ask us to slow down (429s, secondary rate limit 403s) or that
+failed on the server (5xx) are retried with jittered exponential backoff.
+"""
+import random
+import threading
+import time
+from collections import namedtuple
+
+
+RateLimitBudget = namedtuple(
+    "RateLimitBudget", ["limit", "remaining", "reset"]
+)
+
+# Start spreading requests out once less than this share of the quota is left
+PACING_THRESHOLD = 0.1
+
+# Retries of a single request, and the bounds of the delay between them
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+# Longer waits than this are returned to the caller rather than slept through
+DEFAULT_MAX_WAIT = 120.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def budget_from_headers(headers):
+    """Get the RateLimitBudget reported in a response's headers, or None"""
+    try:
+        return RateLimitBudget(
+            limit=int(headers["X-RateLimit-Limit"]),
+            remaining=int(headers["X-RateLimit-Remaining"]),
+            reset=int(headers["X-RateLimit-Reset"]),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+class RateLimiter(object):
+    """Track the rate limit budget of each token and pace requests to it
+
+    Budgets are keyed by an identity, usually the Authorization header, so
+    that every client using the same token shares one budget.
+    """
+
+    def __init__(
+        self,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        max_wait=DEFAULT_MAX_WAIT,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.budgets = {}
+        self.lock = threading.Lock()
+
+    def budget(self, identity):
+        """Get the last known RateLimitBudget for an identity, or None"""
+        with self.lock:
+            return self.budgets.get(identity)
+
+    def update(self, identity, response):
+        """Record the budget reported in a response's headers"""
+        budget = budget_from_headers(response.headers)
+        if budget is None:
+            return
+
+        with self.lock:
+            self.budgets[identity] = budget
+
+    def delay(self, identity):
+        """Get how long to wait before the next request for an identity
+
+        Nothing is waited for until the budget runs low. Then the remaining
+        requests are spread evenly over the time until it resets.
+        """
+        budget = self.budget(identity)
+        if budget is None:
+            return 0
+
+        until_reset = max(budget.reset - self.clock(), 0)
+        if budget.remaining <= 0:
+            return until_reset
+        if budget.remaining >= budget.limit * PACING_THRESHOLD:
+            return 0
+        return until_reset / budget.remaining
+
+    def wait(self, identity, deadline=None):
+        """Pace a request, unless that would mean waiting too long
+
+        Given a Deadline, DeadlineExceeded is raised rather than waiting
+        past it.
+        """
+        delay = self.delay(identity)
+        if not 0 < delay <= self.max_wait:
+            return
+        if deadline is None:
+            self.sleep(delay)
+        else:
+            deadline.sleep(delay, self.sleep)
+
+    def is_secondary_rate_limit(self, response):
+        if response.status_code != 403:
+            return False
+        if "Retry-After" in response.headers:
+            return True
+        return "secondary rate limit" in response.text.lower()
+
+    def retry_delay(self, response, attempt):
+        """Get how long to wait before retrying a response, or None if it
+        shouldn't be retried"""
+        if attempt >= self.max_retries:
+            return None
+        if response.status_code not in RETRY_STATUS_CODES:
+            if not self.is_secondary_rate_limit(response):
+                return None
+
+        if "Retry-After" in response.headers:
+            try:
+                delay = float(response.headers["Retry-After"])
+            except ValueError:
+                delay = None
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            delay = float(response.headers.get("X-RateLimit-Reset", 0))
+            delay = max(delay - self.clock(), 0)
+        else:
+            # Full jitter keeps concurrent clients from retrying in step
+            ceiling = min(self.max_backoff, self.backoff * 2**attempt)
+            delay = random.uniform(0, ceiling)
+
+        if delay is None or delay > self.max_wait:
+            return None
+        return delay
+
+
+# Shared by every client in the process unless they're given their own
+DEFAULT_RATE_LIMITER = RateLimiter()
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+A long-running HTTP service that generates changelogs.
+
+Every request shares one GitHubClient, so connections to GitHub stay open
+between changelogs and responses are cached in memory (or on disk, given a
+cache directory). Tags are resolved from a TagIndex kept for each repo,
+branch heads looked up for one changelog are shared with the others
+generated in the next couple of seconds, and a bounded number of finished
+changelogs are kept until they expire or a GitHub webhook reports a change
+to their repo:
+
+    GET /OWNER/REPO?previous=1.0.0&current=1.1.0&branch=main&format=markdown
+    POST /webhook
+
+Only the affected entries are dropped: a push to a branch drops the
+changelogs up to the head of that branch, while a new, moved or deleted
+tag drops the repo's tag index and every one of its changelogs.
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlparse
+
+from changelog import (
+    DEFAULT_BRANCH,
+    DeadlineExceeded,
+    GitHubClient,
+    GitHubError,
+    add_github_arguments,
+    add_latency_arguments,
+    generate_changelog,
+    get_github_config,
+    new_hedger,
+)
+from changelog.cache import MemoryCache, ResponseCache
+from changelog.coalesce import LOOKUP_MAX_AGE, SingleFlight
+from changelog.tags import forget_tag_index
+
+
+# Seconds a changelog is served from memory before it's generated again,
+# unless a webhook drops it first
+CHANGELOG_MAX_AGE = 300
+
+# Changelogs kept at once before the least recently used are dropped
+MAX_CHANGELOGS = 1000
+
+# Webhook events that can change a changelog; others are acknowledged and
+# ignored
+WEBHOOK_EVENTS = ("push", "create", "delete")
+
+FORMATS = {
+    "text": "text/plain; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+}
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+
+class PendingChangelog(object):
+    """A changelog being generated, which a webhook can make out of date
+    before it's kept"""
+
+    def __init__(self, repo_name, branch):
+        self.repo_name = repo_name
+        self.branch = branch
+        self.outdated = False
+
+
+class ChangelogService(object):
+    """Generates changelogs with one client and keeps them until they're
+    out of date
+
+    At most max_changelogs are kept, dropping the least recently used
+    first. Given a timeout, each changelog must be generated within that
+    many seconds.
+    """
+
+    def __init__(
+        self,
+        client,
+        github_base_url,
+        github_api_url,
+        github_token=None,
+        max_age=CHANGELOG_MAX_AGE,
+        timeout=None,
+        max_changelogs=MAX_CHANGELOGS,
+    ):
+        self.client = client
+        self.github_base_url = github_base_url
+        self.github_api_url = github_api_url
+        self.github_token = github_token
+        self.max_age = max_age
+        self.timeout = timeout
+        self.max_changelogs = max_changelogs
+        self.changelogs = OrderedDict()
+        self.pending = []
+        self.lock = threading.Lock()
+
+    @property
+    def github_config(self):
+        return get_github_config(
+            self.github_base_url, self.github_api_url, self.github_token
+        )
+
+    def changelog(
+        self,
+        owner,
+        repo,
+        previous_tag=None,
+        current_tag=None,
+        branch=DEFAULT_BRANCH,
+        markdown=False,
+        full_history=False,
+    ):
+        """Get a changelog, and whether it was kept from an earlier call"""
+        key = (
+            owner,
+            repo,
+            previous_tag,
+            current_tag,
+            branch,
+            markdown,
+            full_history,
+        )
+        # Changelogs of a tag don't change with pushes to its branch
+        pending = PendingChangelog(
+            (owner.lower(), repo.lower()),
+            branch if current_tag is None else None,
+        )
+        with self.lock:
+            kept = self.changelogs.get(key)
+            if kept is not None and time.time() - kept[1] <= self.max_age:
+                self.changelogs.move_to_end(key)
+                return kept[0], True
+            self.pending.append(pending)
+
+        created = time.time()
+        changelog = None
+        try:
+            changelog = generate_changelog(
+                owner,
+                repo,
+                previous_tag,
+                current_tag,
+                markdown=markdown,
+                branch=branch,
+                github_base_url=self.github_base_url,
+                github_api_url=self.github_api_url,
+                github_token=self.github_token,
+                client=self.client,
+                tag_index=True,
+                full_history=full_history,
+                timeout=self.timeout,
+            )
+        finally:
+            with self.lock:
+                self.pending.remove(pending)
+                # A webhook that came in while generating may have made
+                # this changelog out of date already
+                if changelog is not None and not pending.outdated:
+                    self.keep(key, changelog, created)
+        return changelog, False
+
+    def keep(self, key, changelog, created):
+        """Keep a changelog, dropping expired ones and then the least
+        recently used beyond max_changelogs, with the lock held"""
+        now = time.time()
+        for kept_key, (_, kept_created) in list(self.changelogs.items()):
+            if now - kept_created > self.max_age:
+                del self.changelogs[kept_key]
+        self.changelogs[key] = (changelog, created)
+        self.changelogs.move_to_end(key)
+        while len(self.changelogs) > self.max_changelogs:
+            self.changelogs.popitem(last=False)
+
+    def invalidate(self, owner, repo, branch=None):
+        """Drop a repo's changelogs and return how many were dropped
+
+        Given a branch, only the changelogs up to its head are dropped and
+        the repo's tags are assumed not to have changed.
+        """
+        repo_name = (owner.lower(), repo.lower())
+        names = {(owner, repo)}
+        dropped = 0
+        with self.lock:
+            for pending in self.pending:
+                if pending.repo_name != repo_name:
+                    continue
+                if branch is None or pending.branch == branch:
+                    pending.outdated = True
+            for key in list(self.changelogs):
+                # GitHub owner and repo names are case insensitive
+                if (key[0].lower(), key[1].lower()) != repo_name:
+                    continue
+                if branch is not None:
+                    if key[3] is not None or key[4] != branch:
+                        continue
+                names.add(key[:2])
+                del self.changelogs[key]
+                dropped += 1
+
+        self.client.single_flight.forget(
+            self.github_config.api_url, owner, repo
+        )
+        if branch is None:
+            for name in names:
+                forget_tag_index(self.github_config, *name)
+        return dropped
+
+    def handle_event(self, event, payload):
+        """Drop what a GitHub webhook event makes out of date and return how
+        many changelogs were dropped"""
+        if event not in WEBHOOK_EVENTS:
+            return 0
+
+        owner, repo = payload["repository"]["full_name"].split("/", 1)
+        ref = payload["ref"]
+        if event == "push":
+            # Pushes give the full ref, e.g. refs/heads/main or refs/tags/1.0
+            kind, _, name = ref.partition("/")[2].partition("/")
+            if kind == "heads":
+                return self.invalidate(owner, repo, name)
+            return self.invalidate(owner, repo)
+
+        # Creating or deleting a ref gives its short name and type
+        if payload.get("ref_type") == "branch":
+            return self.invalidate(owner, repo, ref)
+        return self.invalidate(owner, repo)
+
+
+def signature_matches(secret, body, signature):
+    """Check the X-Hub-Signature-256 header GitHub signs webhooks with"""
+    if signature is None:
+        return False
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256)
+    return hmac.compare_digest("sha256=" + digest.hexdigest(), signature)
+
+
+def query_flag(value):
+    return value.lower() in ("1", "true", "yes")
+
+
+class ChangelogRequestHandler(BaseHTTPRequestHandler):
+    # Keep connections alive so dashboards can reuse them between requests
+    protocol_version = "HTTP/1.1"
+    server_version = "github-changelog"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def send_body(self, status, body, content_type, headers=None):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, status, text):
+        self.send_body(status, text + "\n", FORMATS["text"])
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if len(parts) != 2 or not all(parts):
+            return self.send_text(404, "Not found, use GET /OWNER/REPO")
+
+        query = {
+            name: values[-1] for name, values in parse_qs(url.query).items()
+        }
+        changelog_format = query.get("format", "text")
+        if changelog_format not in FORMATS:
+            return self.send_text(
+                400,
+                "Unknown format {}, use one of: {}".format(
+                    changelog_format, ", ".join(sorted(FORMATS))
+                ),
+            )
+        full_history = query_flag(query.get("full_history", ""))
+        try:
+            changelog, kept = self.server.service.changelog(
+                parts[0],
+                parts[1],
+                query.get("previous"),
+                query.get("current"),
+                query.get("branch", DEFAULT_BRANCH),
+                markdown=changelog_format == "markdown",
+                full_history=full_history,
+            )
+        except GitHubError as e:
+            return self.send_text(502, str(e))
+        except DeadlineExceeded as e:
+            return self.send_text(504, str(e))
+        except Exception as e:
+            self.log_error("Unable to generate changelog: %r", e)
+            return self.send_text(500, "Unable to generate changelog")
+
+        self.send_body(
+            200,
+            changelog + "\n",
+            FORMATS[changelog_format],
+            {"X-Changelog-Cache": "hit" if kept else "miss"},
+        )
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/webhook":
+            return self.send_text(404, "Not found, use POST /webhook")
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        secret = self.server.webhook_secret
+        if secret is not None:
+            signature = self.headers.get("X-Hub-Signature-256")
+            if not signature_matches(secret, body, signature):
+                return self.send_text(401, "Bad webhook signature")
+
+        try:
+            content = body.decode("utf-8")
+            # Webhooks can be set up to send form encoded payloads
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("application/x-www-form-urlencoded"):
+                content = parse_qs(content)["payload"][0]
+            dropped = self.server.service.handle_event(
+                self.headers.get("X-GitHub-Event"), json.loads(content)
+            )
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return self.send_text(400, "Unable to read webhook payload")
+
+        self.send_body(
+            200, json.dumps({"dropped": dropped}), "application/json"
+        )
+
+
+class ChangelogServer(ThreadingMixIn, HTTPServer):
+    """Serves a ChangelogService, handling each connection in a thread"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service, webhook_secret=None, quiet=False):
+        HTTPServer.__init__(self, address, ChangelogRequestHandler)
+        self.service = service
+        self.webhook_secret = webhook_secret
+        self.quiet = quiet
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="changelog serve",
+        description="Serve changelogs over HTTP, keeping connections and "
+        "caches warm between requests",
+    )
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_HOST,
+        help="Address to listen on (defaults to {})".format(DEFAULT_HOST),
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="Port to listen on (defaults to {})".format(DEFAULT_PORT),
+    )
+    parser.add_argument(
+        "--max-age",
+        metavar="SECONDS",
+        type=float,
+        default=CHANGELOG_MAX_AGE,
+        help="Regenerate changelogs older than this even without a webhook "
+        "(defaults to {})".format(CHANGELOG_MAX_AGE),
+    )
+    parser.add_argument(
+        "--max-changelogs",
+        metavar="COUNT",
+        type=int,
+        default=MAX_CHANGELOGS,
+        help="Keep at most this many changelogs, dropping the least "
+        "recently used first (defaults to {})".format(MAX_CHANGELOGS),
+    )
+    parser.add_argument(
+        "--lookup-max-age",
+        metavar="SECONDS",
+        type=float,
+        default=LOOKUP_MAX_AGE,
+        help="Share the tags and branch heads looked up for one changelog "
+        "with others for this long (defaults to {})".format(LOOKUP_MAX_AGE),
+    )
+    parser.add_argument(
+        "--webhook-secret",
+        default=os.environ.get("CHANGELOG_WEBHOOK_SECRET"),
+        help="Reject webhooks that aren't signed with this secret (defaults "
+        "to $CHANGELOG_WEBHOOK_SECRET)",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="don't log each request"
+    )
+    add_latency_arguments(parser)
+    add_github_arguments(parser)
+    args = parser.parse_args(argv)
+
+    github_config = get_github_config(
+        args.github_base_url, args.github_api_url, args.github_token
+    )
+    if args.cache_dir is not None:
+        cache = ResponseCache(args.cache_dir)
+    else:
+        cache = MemoryCache()
+
+    with GitHubClient(
+        github_config,
+        cache=cache,
+        transport=args.transport,
+        single_flight=SingleFlight(args.lookup_max_age),
+        hedger=new_hedger(args.hedge_percentile),
+    ) as client:
+        service = ChangelogService(
+            client,
+            args.github_base_url,
+            args.github_api_url,
+            args.github_token,
+            max_age=args.max_age,
+            timeout=args.timeout,
+            max_changelogs=args.max_changelogs,
+        )
+        server = ChangelogServer(
+            (args.host, args.port),
+            service,
+            webhook_secret=args.webhook_secret,
+            quiet=args.quiet,
+        )
+        print("Serving changelogs on {}".format(server.url), flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
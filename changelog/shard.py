@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Fetching one large range of commits as concurrent shards.
+
+A comparison lists its commits a page at a time, each page found from the
+last one's next link, so a range of thousands of commits is a long chain of
+requests made one after another. Instead the range is split at the
+semantic version tags between its two ends, and the first page of every
+shard is fetched at once. Each first page says how many commits its shard
+has, so the rest of the pages are then all fetched at once too, by number.
+
+Tags in version order aren't always in history order, e.g. a patch release
+tagged on a maintenance branch. Every shard's comparison says whether its
+base is behind its head, and if any isn't, the range is compared in one go
+as it would have been without shards. Otherwise the shards are joined in
+order, dropping any commit already seen, so the commits are the same.
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from changelog import (
+    COMPARE_PAGE_SIZE,
+    get_compare_url,
+    is_immutable_range,
+    iter_commits_between,
+    iter_comparison,
+)
+from changelog.client import DEFAULT_CONCURRENT_REQUESTS
+from changelog.tags import IndexedCommitSource, version_key
+
+
+# Statuses of a comparison whose base is in the history of its head
+LINEAR_STATUSES = ("ahead", "identical")
+
+
+def shard_boundaries(tags, first_commit, last_commit):
+    """Get the commits to split a range at, oldest first
+
+    These are the ends of the range with the commits of the semantic
+    version tags in between, in version order. Without a version tag on
+    first_commit the range isn't split. Without one on last_commit, e.g. the
+    head of a branch, every tag of a later version than first_commit's is
+    in between.
+    """
+    versions = {}
+    for name, sha in tags:
+        key = version_key(name)
+        if key is not None and sha not in versions:
+            versions[sha] = key
+
+    lower = versions.get(first_commit)
+    if lower is None:
+        return [first_commit, last_commit]
+    upper = versions.get(last_commit)
+
+    between = []
+    for sha, key in versions.items():
+        if sha in (first_commit, last_commit) or key <= lower:
+            continue
+        if upper is None or key < upper:
+            between.append((key, sha))
+    between.sort()
+    return [first_commit] + [sha for _, sha in between] + [last_commit]
+
+
+def fetch_compare_page(
+    github_config, owner, repo, first_commit, last_commit, client, page
+):
+    """Get (fields, commits) for one page of a comparison, where fields
+    are those that come before the commits"""
+    response = client.get(
+        get_compare_url(github_config, owner, repo, first_commit, last_commit),
+        params={"per_page": COMPARE_PAGE_SIZE, "page": page},
+        immutable=is_immutable_range(first_commit, last_commit),
+        stream=True,
+    )
+    fields = {}
+    commits = list(
+        iter_comparison(response, first_commit, last_commit, fields)
+    )
+    return fields, commits
+
+
+def iter_sharded_commits(
+    github_config,
+    owner,
+    repo,
+    first_commit,
+    last_commit,
+    tags,
+    client,
+    max_workers=DEFAULT_CONCURRENT_REQUESTS,
+):
+    """Yield the commits between two commits, like iter_commits_between,
+    with the range split at the tags between them"""
+    boundaries = shard_boundaries(tags, first_commit, last_commit)
+    shards = list(zip(boundaries, boundaries[1:]))
+
+    def fetch_page(shard, page):
+        return fetch_compare_page(
+            github_config, owner, repo, shard[0], shard[1], client, page
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        first_pages = list(executor.map(fetch_page, shards, [1] * len(shards)))
+        if any(
+            fields.get("status") not in LINEAR_STATUSES
+            for fields, _ in first_pages
+        ):
+            first_pages = None
+        else:
+            later_pages = []
+            for shard, (fields, commits) in zip(shards, first_pages):
+                total = fields.get("total_commits", len(commits))
+                page_count = -(-total // COMPARE_PAGE_SIZE)
+                later_pages.append(
+                    [
+                        executor.submit(fetch_page, shard, page)
+                        for page in range(2, page_count + 1)
+                    ]
+                )
+
+            seen = set()
+            for (_, commits), futures in zip(first_pages, later_pages):
+                pages = itertools.chain(
+                    [commits], (future.result()[1] for future in futures)
+                )
+                for page in pages:
+                    for commit in page:
+                        if commit.sha not in seen:
+                            seen.add(commit.sha)
+                            yield commit
+
+    if first_pages is None:
+        for commit in iter_commits_between(
+            github_config, owner, repo, first_commit, last_commit, client
+        ):
+            yield commit
+
+
+class ShardedCommitSource(IndexedCommitSource):
+    """Get tags from a TagIndex and fetch ranges of commits in concurrent
+    shards split at the tags in between"""
+
+    def __init__(
+        self,
+        github_config,
+        owner,
+        repo,
+        client=None,
+        index=None,
+        max_workers=DEFAULT_CONCURRENT_REQUESTS,
+    ):
+        super(ShardedCommitSource, self).__init__(
+            github_config, owner, repo, client, index
+        )
+        self.max_workers = max_workers
+
+    def iter_commits_between(self, first_commit, last_commit):
+        return iter_sharded_commits(
+            self.github_config,
+            self.owner,
+            self.repo,
+            first_commit,
+            last_commit,
+            self.tag_index().tags,
+            self.client,
+            self.max_workers,
+        )
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the requests and phases that make up a changelog.
+
+Pass an Observer to GitHubClient to be told about every HTTP request it
+makes, and to fetch_changes or generate_changelog to be told how long each
+phase took. Stats is an Observer that collects everything and reports it as
+a table or as JSON.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from changelog.ratelimit import budget_from_headers
+
+
+# endpoint is the kind of API call, e.g. "compare". elapsed is the seconds
+# until the response headers arrived, and bytes the Content-Length, if any.
+# cache is "hit" for responses served from the cache without a request,
+# "revalidated" for a 304 and "miss" for a full response, or None without a
+# cache. rate_limit is the RateLimitBudget reported with the response.
+RequestEvent = namedtuple(
+    "RequestEvent",
+    [
+        "method",
+        "url",
+        "endpoint",
+        "status_code",
+        "elapsed",
+        "bytes",
+        "cache",
+        "rate_limit",
+        "attempt",
+    ],
+)
+
+# The phases of a changelog are "resolve", "fetch", "extract", "format"
+# and, when PRs are grouped by their labels, "enrich", or by the paths they
+# changed, "files"
+PhaseEvent = namedtuple("PhaseEvent", ["name", "elapsed"])
+
+ENDPOINTS = [
+    (re.compile(r"/repos/[^/]+/[^/]+/compare/"), "compare"),
+    (re.compile(r"/repos/[^/]+/[^/]+/git/refs/tags/"), "git/refs/tags"),
+    (re.compile(r"/repos/[^/]+/[^/]+/git/tags/"), "git/tags"),
+    (re.compile(r"/repos/[^/]+/[^/]+/commits/[0-9a-f]+$"), "commit"),
+    (re.compile(r"/repos/[^/]+/[^/]+/commits\b"), "commits"),
+    (re.compile(r"/repos/[^/]+/[^/]+/tags\b"), "tags"),
+    (re.compile(r"/graphql\b"), "graphql"),
+]
+
+
+def endpoint_name(url):
+    """Get the kind of API call a URL is for"""
+    for pattern, name in ENDPOINTS:
+        if pattern.search(url):
+            return name
+    return "other"
+
+
+def request_event(method, url, response, elapsed, cache=None, attempt=0):
+    """Describe a response as a RequestEvent"""
+    length = response.headers.get("Content-Length")
+    return RequestEvent(
+        method=method,
+        url=url,
+        endpoint=endpoint_name(url),
+        status_code=response.status_code,
+        elapsed=elapsed,
+        bytes=int(length) if length is not None else None,
+        cache=cache,
+        rate_limit=budget_from_headers(response.headers),
+        attempt=attempt,
+    )
+
+
+class Observer(object):
+    """Receives instrumentation events; override the methods of interest
+
+    Events may arrive from several threads at once.
+    """
+
+    def on_request(self, event):
+        pass
+
+    def on_phase(self, event):
+        pass
+
+
+@contextmanager
+def timed(observer, name):
+    """Report how long the body of a with block took as a phase"""
+    if observer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observer.on_phase(PhaseEvent(name, time.perf_counter() - start))
+
+
+class Stats(Observer):
+    """Collect every event and summarize them"""
+
+    def __init__(self):
+        self.requests = []
+        self.phases = OrderedDict()
+        self.lock = threading.Lock()
+
+    def on_request(self, event):
+        with self.lock:
+            self.requests.append(event)
+
+    def on_phase(self, event):
+        with self.lock:
+            self.phases[event.name] = (
+                self.phases.get(event.name, 0) + event.elapsed
+            )
+
+    @property
+    def rate_limit(self):
+        """The most recent rate limit budget reported, or None"""
+        budgets = [e.rate_limit for e in self.requests if e.rate_limit]
+        return budgets[-1] if budgets else None
+
+    def summary(self):
+        """Totals per endpoint, in the order each was first called"""
+        endpoints = OrderedDict()
+        for event in self.requests:
+            totals = endpoints.setdefault(
+                event.endpoint,
+                {"count": 0, "errors": 0, "cached": 0, "time": 0, "bytes": 0},
+            )
+            totals["count"] += 1
+            totals["time"] += event.elapsed
+            totals["bytes"] += event.bytes or 0
+            if event.status_code >= 400:
+                totals["errors"] += 1
+            if event.cache in ("hit", "revalidated"):
+                totals["cached"] += 1
+        return endpoints
+
+    def to_dict(self):
+        """Everything collected, in a form that can be dumped as JSON"""
+        requests = []
+        for event in self.requests:
+            request = event._asdict()
+            if event.rate_limit is not None:
+                request["rate_limit"] = event.rate_limit._asdict()
+            requests.append(request)
+
+        rate_limit = self.rate_limit
+        return {
+            "requests": requests,
+            "endpoints": self.summary(),
+            "phases": self.phases,
+            "rate_limit": rate_limit._asdict() if rate_limit else None,
+        }
+
+    def format_table(self):
+        """Format the summary as lines of a plain text table"""
+        lines = [
+            "{:<16}{:>8}{:>8}{:>8}{:>10}{:>12}".format(
+                "endpoint", "calls", "errors", "cached", "seconds", "KiB"
+            )
+        ]
+        for endpoint, totals in self.summary().items():
+            lines.append(
+                "{:<16}{:>8}{:>8}{:>8}{:>10.3f}{:>12.1f}".format(
+                    endpoint,
+                    totals["count"],
+                    totals["errors"],
+                    totals["cached"],
+                    totals["time"],
+                    totals["bytes"] / 1024.0,
+                )
+            )
+
+        if self.phases:
+            lines.append("")
+            lines.append("{:<16}{:>10}".format("phase", "seconds"))
+            for name, elapsed in self.phases.items():
+                lines.append("{:<16}{:>10.3f}".format(name, elapsed))
+
+        rate_limit = self.rate_limit
+        if rate_limit is not None:
+            lines.append("")
+            lines.append(
+                "rate limit: {} of {} remaining, resets at {}".format(
+                    rate_limit.remaining,
+                    rate_limit.limit,
+                    time.strftime(
+                        "%H:%M:%S", time.localtime(rate_limit.reset)
+                    ),
+                )
+            )
+        return lines
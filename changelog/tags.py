@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+An index of every tag in a repo and the commit it points to.
+
+GitHub's tag listing already includes the commit each tag points to, with
+annotated tags peeled, so one paginated pass over it resolves every tag.
+Indexes are kept in memory for each set of credentials, since they may not
+see the same tags, until they expire or too many repos have been indexed,
+and can be saved to and loaded from disk.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from changelog import GitHubClient, GitHubCommitSource, GitHubError, iter_pages
+
+
+# The most tags GitHub returns in one page of the listing
+TAGS_PAGE_SIZE = 100
+
+# Seconds an index is used for before the tags are listed again
+TAG_INDEX_MAX_AGE = 300
+
+# Indexes kept at once before the least recently used are dropped
+MAX_TAG_INDEXES = 100
+
+SEMVER_RE = re.compile(
+    r"^v?(?P<major>0|[1-9][0-9]*)\.(?P<minor>0|[1-9][0-9]*)"
+    r"\.(?P<patch>0|[1-9][0-9]*)"
+    r"(?:-(?P<prerelease>[0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$"
+)
+
+
+def version_key(tag):
+    """Get a key that sorts semantic version tags by precedence, or None if
+    the tag isn't a semantic version"""
+    match = SEMVER_RE.match(tag)
+    if match is None:
+        return None
+
+    release = tuple(
+        int(match.group(part)) for part in ("major", "minor", "patch")
+    )
+    prerelease = match.group("prerelease")
+    if prerelease is None:
+        # Releases come after all of their prereleases
+        return release + (1, ())
+
+    # Numeric identifiers sort numerically and before alphanumeric ones
+    identifiers = tuple(
+        (0, int(part), "") if part.isdigit() else (1, 0, part)
+        for part in prerelease.split(".")
+    )
+    return release + (0, identifiers)
+
+
+class TagIndex(object):
+    """Every tag in a repo mapped to the commit it points to
+
+    Tags are kept in the order GitHub lists them.
+    """
+
+    def __init__(self, tags, created=None):
+        self.tags = list(tags)
+        self.commits = dict(self.tags)
+        self.created = time.time() if created is None else created
+
+    @classmethod
+    def from_github(cls, github_config, owner, repo, client=None):
+        """Build an index by listing all of a repo's tags"""
+        if client is None:
+            client = GitHubClient(github_config)
+        tags_url = "/".join(
+            [github_config.api_url, "repos", owner, repo, "tags"]
+        )
+        pages = iter_pages(
+            client,
+            tags_url,
+            {"per_page": TAGS_PAGE_SIZE},
+            "Unable to get tags",
+        )
+        tags = []
+        for tags_response in pages:
+            tags.extend(
+                (t["name"], t["commit"]["sha"]) for t in tags_response.json()
+            )
+        return cls(tags)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls([tuple(tag) for tag in data["tags"]], data["created"])
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"tags": self.tags, "created": self.created}, f)
+
+    def age(self):
+        return time.time() - self.created
+
+    def commit_for_tag(self, tag):
+        """Get the commit sha a tag points to, or None if there's no such
+        tag"""
+        return self.commits.get(tag)
+
+    def latest(self):
+        """Get the tag with the highest semantic version
+
+        If no tags are semantic versions this is the first tag GitHub lists,
+        the same tag get_last_tag returns.
+        """
+        versions = [
+            (version_key(name), name)
+            for name, _ in self.tags
+            if version_key(name) is not None
+        ]
+        if versions:
+            return max(versions)[1]
+        if self.tags:
+            return self.tags[0][0]
+        raise GitHubError("No tags found.")
+
+
+_indexes = OrderedDict()
+_index_locks = {}
+_lock = threading.Lock()
+
+
+def index_key(github_config, owner, repo, client=None):
+    """Key a repo's index by the credentials its tags are listed with"""
+    if client is not None:
+        identity = client.identity
+    else:
+        identity = github_config.headers.get("Authorization")
+    return (github_config.api_url, owner, repo, identity)
+
+
+def get_tag_index(
+    github_config,
+    owner,
+    repo,
+    client=None,
+    max_age=TAG_INDEX_MAX_AGE,
+):
+    """Get the TagIndex for a repo, listing its tags only if this process
+    has no index for it that is younger than max_age seconds"""
+    key = index_key(github_config, owner, repo, client)
+    with _lock:
+        index_lock = _index_locks.setdefault(key, threading.Lock())
+
+    # Concurrent callers for the same repo wait for a single listing
+    with index_lock:
+        with _lock:
+            index = _indexes.get(key)
+        if index is None or index.age() > max_age:
+            index = TagIndex.from_github(github_config, owner, repo, client)
+        keep_tag_index(key, index)
+    return index
+
+
+def keep_tag_index(key, index):
+    """Keep an index as the most recently used, dropping those older than
+    TAG_INDEX_MAX_AGE and then the least recently used beyond
+    MAX_TAG_INDEXES"""
+    with _lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        for kept_key, kept in list(_indexes.items()):
+            if kept_key != key and kept.age() > TAG_INDEX_MAX_AGE:
+                del _indexes[kept_key]
+        while len(_indexes) > MAX_TAG_INDEXES:
+            _indexes.popitem(last=False)
+
+        # Locks of repos that are no longer indexed, unless they're in use
+        for lock_key, index_lock in list(_index_locks.items()):
+            if lock_key not in _indexes and not index_lock.locked():
+                del _index_locks[lock_key]
+
+
+def set_tag_index(github_config, owner, repo, index, client=None):
+    """Use an index, e.g. one loaded from disk, for a repo in this process,
+    for requests made with the client's credentials"""
+    keep_tag_index(index_key(github_config, owner, repo, client), index)
+
+
+def forget_tag_index(github_config, owner, repo):
+    """Drop this process's indexes for a repo, e.g. after a tag was
+    pushed"""
+    with _lock:
+        for key in list(_indexes):
+            if key[:3] == (github_config.api_url, owner, repo):
+                del _indexes[key]
+
+
+class IndexedCommitSource(GitHubCommitSource):
+    """Get tags from a TagIndex and commits from the GitHub REST API
+
+    Resolving both ends of a range takes at most the one listing of tags
+    that builds the index, rather than a request for the last tag and one
+    or more for each tag's ref.
+    """
+
+    def __init__(self, github_config, owner, repo, client=None, index=None):
+        super(IndexedCommitSource, self).__init__(
+            github_config, owner, repo, client
+        )
+        self.index = index
+
+    def tag_index(self):
+        if self.index is None:
+            return get_tag_index(
+                self.github_config, self.owner, self.repo, self.client
+            )
+        return self.index
+
+    def get_last_tag(self):
+        return self.tag_index().latest()
+
+    def get_commit_for_tag(self, tag):
+        commit = self.tag_index().commit_for_tag(tag)
+        if commit is None:
+            # The tag may have been pushed since the index was built
+            return super(IndexedCommitSource, self).get_commit_for_tag(tag)
+        return commit
@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+"""
+A small local stand-in for the parts of the GitHub REST API that changelog
+uses, for benchmarks and tests that need real HTTP round trips.
+"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+LONG_DESCRIPTION = "\n\n".join(
+    [" ".join(["Lorem ipsum dolor sit amet, see #12."] * 12)] * 5
+)
+
+# Commit messages of different shapes, given the commit's position
+MESSAGE_SHAPES = {
+    # A merge commit
+    "merge": lambda i: (
+        "Merge pull request #{0} from some/branch-{0}\n\n"
+        "Title for change {0}".format(i)
+    ),
+    # A squash-and-merge commit
+    "squash": lambda i: (
+        "Title for change {0} (#{0})\n\nDescription".format(i)
+    ),
+    # A squash-and-merge commit with a long, multi-paragraph description
+    "long": lambda i: "Title for change {0} (#{0})\n\n{1}".format(
+        i, LONG_DESCRIPTION
+    ),
+    # A commit that wasn't a PR merge
+    "plain": lambda i: "Plain commit {0}".format(i),
+}
+
+DEFAULT_SHAPES = ("merge", "squash", "plain")
+
+
+def synthetic_commits(count, shapes=DEFAULT_SHAPES):
+    """Build a linear history of `count` commits in compare API format
+
+    Commits are returned oldest first, with messages cycling through the
+    given MESSAGE_SHAPES: by default a merge commit, a squash-and-merge
+    commit and a plain commit.
+    """
+    commits = []
+    for i in range(count):
+        message = MESSAGE_SHAPES[shapes[i % len(shapes)]](i)
+        commits.append(
+            {"sha": "{:040x}".format(i + 1), "commit": {"message": message}}
+        )
+    return commits
+
+
+def synthetic_files(count, patch_lines=40):
+    """Build the `files` array of a compare response for `count` changed
+    files, each with a patch of `patch_lines` lines"""
+    files = []
+    for i in range(count):
+        patch = "\n".join(
+            "+line {} of a change to file {}".format(j, i)
+            for j in range(patch_lines)
+        )
+        files.append(
+            {
+                "sha": "{:040x}".format(i + 1),
+                "filename": "src/module_{}/file_{}.py".format(i % 50, i),
+                "status": "modified",
+                "additions": patch_lines,
+                "deletions": 0,
+                "changes": patch_lines,
+                "patch": "@@ -1,0 +1,{} @@\n{}".format(patch_lines, patch),
+            }
+        )
+    return files
+
+
+def compare_response(commits, files=(), status="ahead", total=None):
+    """Build a compare API response body, with its keys in the order
+    GitHub sends them
+
+    `total` is the number of commits in the whole comparison, when
+    `commits` is only one page of it.
+    """
+    if total is None:
+        total = len(commits)
+    return {
+        "status": status,
+        "ahead_by": total,
+        "behind_by": 0,
+        "total_commits": total,
+        "commits": commits,
+        "files": list(files),
+    }
+
+
+# Labels given to synthetic PRs in turn
+SYNTHETIC_LABELS = [["feature"], ["fix"], [], ["breaking", "feature"]]
+
+
+def synthetic_pulls(count, labels=SYNTHETIC_LABELS):
+    """Build the PRs merged by synthetic_commits(count), in pulls API format,
+    keyed by number
+
+    Every commit's position is also the number of the PR it could merge,
+    and PRs are labeled by cycling through `labels`.
+    """
+    pulls = {}
+    for i in range(count):
+        pulls[i] = {
+            "number": i,
+            "title": "Title for change {}".format(i),
+            "body": "Description",
+            "state": "closed",
+            "merged_at": "2020-01-01T00:00:{:02d}Z".format(i % 60),
+            "user": {"login": "author-{}".format(i % 3)},
+            "labels": [{"name": name} for name in labels[i % len(labels)]],
+        }
+    return pulls
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+def synthetic_commit_files(commits, packages=10):
+    """Build the names of the files changed by each commit, keyed by sha
+
+    Commits change a file in each of one or two of `packages` packages,
+    named packages/package-0 and so on, and every third commit also changes
+    a file at the root of the repo.
+    """
+    files = {}
+    for i, commit in enumerate(commits):
+        names = ["packages/package-{}/file_{}.py".format(i % packages, i)]
+        if i % 4 == 0:
+            names.append(
+                "packages/package-{}/README.md".format((i + 1) % packages)
+            )
+        if i % 3 == 0:
+            names.append("setup.py")
+        files[commit["sha"]] = names
+    return files
+
+
+class StubRepo(object):
+    """A linear commit history with tags pointing into it
+
+    Every comparison lists `files` as the files changed. `pulls` are the
+    repo's PRs in pulls API format, keyed by number, and `commit_files` the
+    names of the files changed by each commit, keyed by sha. `side_commits`
+    are commits off the history, e.g. hotfixes, given as the position of
+    the commit in the history each was made on top of, keyed by sha.
+    """
+
+    def __init__(
+        self,
+        commits,
+        tags=None,
+        branch="main",
+        files=(),
+        pulls=None,
+        commit_files=None,
+        side_commits=None,
+    ):
+        self.commits = commits
+        self.tags = tags or {}
+        self.branch = branch
+        self.files = files
+        self.pulls = pulls or {}
+        self.commit_files = commit_files or {}
+        self.side_commits = side_commits or {}
+
+    def index_of(self, ref):
+        ref = self.tags.get(ref, ref)
+        if ref == self.branch:
+            return len(self.commits) - 1
+        for i, commit in enumerate(self.commits):
+            if commit["sha"] == ref:
+                return i
+        return None
+
+
+def synthetic_repo(
+    commits=100,
+    tags=1,
+    shapes=DEFAULT_SHAPES,
+    branch="main",
+    files=0,
+    packages=10,
+):
+    """Build a StubRepo of synthetic commits with tags spread evenly
+    through its history, the first on the first commit
+
+    Tags are named 1.0.0, 1.1.0 and so on, and every comparison lists
+    `files` changed files. Each commit changes files in some of `packages`
+    packages; see synthetic_commit_files.
+    """
+    history = synthetic_commits(commits, shapes)
+    tag_shas = {}
+    for k in range(tags):
+        tag_shas["1.{}.0".format(k)] = history[k * commits // tags]["sha"]
+    return StubRepo(
+        history,
+        tag_shas,
+        branch,
+        synthetic_files(files),
+        commit_files=synthetic_commit_files(history, packages),
+    )
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients may close connections they no longer need, e.g. the one
+        # that lost a hedged request
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            HTTPServer.handle_error(self, request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections alive so clients can reuse them between requests
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    routes = [
+        (
+            re.compile(r"^/repos/[^/]+/[^/]+/compare/(.+)\.\.\.(.+)$"),
+            "compare",
+        ),
+        (re.compile(r"^/repos/[^/]+/[^/]+/git/refs/tags/(.+)$"), "tag_ref"),
+        (re.compile(r"^/repos/[^/]+/[^/]+/commits$"), "commits"),
+        (re.compile(r"^/repos/[^/]+/[^/]+/commits/([0-9a-f]+)$"), "commit"),
+        (re.compile(r"^/repos/[^/]+/[^/]+/tags$"), "tags"),
+        (re.compile(r"^/repos/[^/]+/[^/]+/pulls$"), "pulls"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def count_request(self):
+        stub = self.server.stub
+        stub.request_count += 1
+        stub.connections.add(self.client_address)
+        delay = stub.latency + stub.tail_delay()
+        if delay:
+            time.sleep(delay)
+        return stub
+
+    def do_POST(self):
+        stub = self.count_request()
+        content = self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.loads(content.decode("utf-8"))
+        if urlparse(self.path).path != "/graphql":
+            return self.send_json(404, {"message": "Not Found"})
+
+        # Recorded exchanges are matched on operation name and variables
+        operation = re.search(r"query\s+(\w+)", body["query"]).group(1)
+        if operation == "PullRequests" and stub.repo is not None:
+            return self.post_pull_requests(stub.repo, body["variables"])
+        recorded = {
+            "operationName": operation,
+            "variables": body["variables"],
+        }
+        for exchange in stub.graphql:
+            if exchange["request"] == recorded:
+                return self.send_json(200, exchange["response"])
+
+        message = "No recorded response for {} {}".format(
+            operation, body["variables"]
+        )
+        self.send_json(200, {"errors": [{"message": message}]})
+
+    def post_pull_requests(self, repo, variables):
+        """Answer a query for PRs by number, one aliased field per PR"""
+        repository = {}
+        errors = []
+        for alias, number in variables.items():
+            if alias in ("owner", "repo"):
+                continue
+            pull = repo.pulls.get(number)
+            if pull is None:
+                repository[alias] = None
+                errors.append(
+                    {
+                        "type": "NOT_FOUND",
+                        "path": ["repository", alias],
+                        "message": "Could not resolve to a PullRequest with "
+                        "the number of {}.".format(number),
+                    }
+                )
+                continue
+            repository[alias] = {
+                "number": pull["number"],
+                "title": pull["title"],
+                "body": pull["body"],
+                "mergedAt": pull["merged_at"],
+                "author": pull["user"],
+                "labels": {"nodes": pull["labels"]},
+            }
+        body = {"data": {"repository": repository}}
+        if errors:
+            body["errors"] = errors
+        self.send_json(200, body)
+
+    def do_GET(self):
+        stub = self.count_request()
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for pattern, name in self.routes:
+            match = pattern.match(url.path)
+            if match is not None:
+                handler = getattr(self, "get_" + name)
+                return handler(stub.repo, url.path, query, *match.groups())
+        self.send_json(404, {"message": "Not Found"})
+
+    def send_json(self, status, body, links=None):
+        content = json.dumps(body).encode("utf-8")
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.server.stub.not_modified_count += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        accept_encoding = self.headers.get("Accept-Encoding", "")
+        if self.server.stub.gzip and "gzip" in accept_encoding:
+            content = gzip.compress(content)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        if links:
+            self.send_header(
+                "Link",
+                ", ".join(
+                    '<{}>; rel="{}"'.format(url, rel)
+                    for rel, url in links.items()
+                ),
+            )
+        self.end_headers()
+        try:
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients may stop reading once they have what they need
+            pass
+
+    def paginate(self, path, query, items, default_per_page=30):
+        page = int(query.get("page", 1))
+        per_page = int(query.get("per_page", default_per_page))
+        start = (page - 1) * per_page
+        end = start + per_page
+        links = {}
+        if end < len(items):
+            next_query = dict(query, page=page + 1, per_page=per_page)
+            links["next"] = "{}{}?{}".format(
+                self.server.stub.api_url, path, urlencode(next_query)
+            )
+        return items[start:end], links
+
+    def get_compare(self, repo, path, query, base, head):
+        base_index = repo.index_of(base)
+        head_index = repo.index_of(head)
+        # A side commit is compared from where it left the history
+        diverged = repo.side_commits.get(repo.tags.get(base, base))
+        if diverged is not None:
+            base_index = diverged
+        if base_index is None or head_index is None:
+            return self.send_json(404, {"message": "Not Found"})
+        first, last = base_index + 1, head_index + 1
+        commits = repo.commits[first:last]
+        if diverged is not None:
+            status = "diverged"
+        elif base_index == head_index:
+            status = "identical"
+        else:
+            status = "ahead" if base_index < head_index else "behind"
+        page, links = self.paginate(path, query, commits, 250)
+        self.send_json(
+            200,
+            compare_response(page, repo.files, status, len(commits)),
+            links,
+        )
+
+    def get_tag_ref(self, repo, path, query, tag):
+        if tag not in repo.tags:
+            return self.send_json(404, {"message": "Not Found"})
+        self.send_json(
+            200, {"object": {"type": "commit", "sha": repo.tags[tag]}}
+        )
+
+    def get_commits(self, repo, path, query):
+        head_index = repo.index_of(query.get("sha", repo.branch))
+        if head_index is None:
+            return self.send_json(404, {"message": "Not Found"})
+        commits = repo.commits[head_index::-1]
+        page, links = self.paginate(path, query, commits)
+        self.send_json(200, page, links)
+
+    def get_commit(self, repo, path, query, sha):
+        index = repo.index_of(sha)
+        if index is None:
+            return self.send_json(404, {"message": "Not Found"})
+        files = [
+            {"filename": name, "status": "modified"}
+            for name in repo.commit_files.get(sha, [])
+        ]
+        page, links = self.paginate(path, query, files, 300)
+        commit = dict(repo.commits[index], files=page)
+        self.send_json(200, commit, links)
+
+    def get_pulls(self, repo, path, query):
+        # Only the newest first listing of closed PRs is supported
+        pulls = [repo.pulls[number] for number in sorted(repo.pulls)]
+        pulls.reverse()
+        page, links = self.paginate(path, query, pulls)
+        self.send_json(200, page, links)
+
+    def get_tags(self, repo, path, query):
+        tags = [
+            {"name": name, "commit": {"sha": sha}}
+            for name, sha in reversed(list(repo.tags.items()))
+        ]
+        page, links = self.paginate(path, query, tags)
+        self.send_json(200, page, links)
+
+
+class StubGitHub(object):
+    """Serve a StubRepo over HTTP on a local port in a background thread
+
+    Usable as a context manager; `api_url` can be passed anywhere a GitHub
+    API URL is expected. Every response is delayed by `latency` seconds.
+    Given `tail`, a (fraction, seconds) pair, that fraction of responses,
+    picked at random, are delayed by that many seconds more.
+
+    GraphQL requests are answered from `graphql`, a list of recorded
+    exchanges like those in fixtures/graphql.json. With gzip, responses are
+    compressed for clients that accept it.
+    """
+
+    def __init__(
+        self,
+        repo=None,
+        latency=0,
+        graphql=None,
+        port=0,
+        gzip=False,
+        tail=None,
+        seed=0,
+    ):
+        self.repo = repo
+        self.latency = latency
+        self.tail = tail
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.port = port
+        self.gzip = gzip
+        self.graphql = graphql or []
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.connections = set()
+        self._server = None
+        self._thread = None
+
+    def tail_delay(self):
+        if self.tail is None:
+            return 0
+        fraction, seconds = self.tail
+        with self.random_lock:
+            slow = self.random.random() < fraction
+        return seconds if slow else 0
+
+    @property
+    def api_url(self):
+        host, port = self._server.server_address
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", self.port), _Handler)
+        self._server.stub = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """Serve a synthetic repo until interrupted, to point changelog at"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--commits", type=int, default=1000)
+    parser.add_argument("--tags", type=int, default=10)
+    parser.add_argument(
+        "--shapes",
+        default=",".join(DEFAULT_SHAPES),
+        help="comma separated message shapes, from {}".format(
+            ", ".join(sorted(MESSAGE_SHAPES))
+        ),
+    )
+    parser.add_argument("--files", type=int, default=0)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds per request"
+    )
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    repo = synthetic_repo(
+        args.commits, args.tags, args.shapes.split(","), files=args.files
+    )
+    with StubGitHub(repo, args.latency, port=args.port) as stub:
+        print(
+            "Serving {} commits at {}".format(args.commits, stub.api_url),
+            flush=True,
+        )
+        try:
+            stub._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
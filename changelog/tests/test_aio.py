@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from unittest import TestCase, skipIf
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubError,
+    fetch_changes,
+    generate_changelog,
+    get_github_config,
+)
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+try:
+    import aiohttp
+
+    from changelog import aio
+except ImportError:
+    aiohttp = None
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@skipIf(aiohttp is None, "aiohttp is not installed")
+class TestAsyncGenerateChangelog(TestCase):
+    def setUp(self):
+        commits = synthetic_commits(301)
+        self.stub = StubGitHub(
+            StubRepo(
+                commits,
+                {"0.1.0": commits[0]["sha"], "0.2.0": commits[150]["sha"]},
+            )
+        ).start()
+        self.addCleanup(self.stub.stop)
+        self.options = {
+            "github_base_url": PUBLIC_GITHUB_URL,
+            "github_api_url": self.stub.api_url,
+        }
+
+    def test_same_output_as_generate_changelog(self):
+        """The async API produces exactly what the sync one does"""
+        for args in [(), ("0.1.0",), ("0.1.0", "0.2.0")]:
+            expected = generate_changelog(
+                "someone", "one-repo", *args, markdown=True, **self.options
+            )
+            result = run(
+                aio.generate_changelog(
+                    "someone", "one-repo", *args, markdown=True, **self.options
+                )
+            )
+            self.assertEqual(result, expected)
+
+    def test_many_changelogs_on_one_loop(self):
+        """Concurrent changelogs share one connection pool"""
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+
+        async def generate_all():
+            connector = aiohttp.TCPConnector(limit=4)
+            async with aio.AsyncGitHubClient(
+                github_config, connector=connector
+            ) as client:
+                results = await asyncio.gather(
+                    *[
+                        aio.generate_changelog(
+                            "someone", repo, client=client, **self.options
+                        )
+                        for repo in ["one", "two", "three"]
+                    ]
+                )
+            await connector.close()
+            return results
+
+        results = run(generate_all())
+        self.assertEqual(len(set(results)), 1)
+        self.assertLessEqual(len(self.stub.connections), 4)
+
+    def test_fetch_changes_without_client(self):
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        self.assertEqual(
+            run(aio.fetch_changes(github_config, "someone", "one-repo")),
+            fetch_changes(github_config, "someone", "one-repo"),
+        )
+
+    def test_missing_tag(self):
+        with self.assertRaises(GitHubError):
+            run(
+                aio.generate_changelog(
+                    "someone", "one-repo", "nope", **self.options
+                )
+            )
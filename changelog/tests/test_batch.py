@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    BatchEntry,
+    GitHubError,
+    generate_changelogs,
+    main,
+)
+from changelog.manifest import ManifestError, read_manifest
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+class TestReadManifest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_json(self):
+        path = self.write(
+            "repos.json",
+            '[{"owner": "cfpb", "repo": "one", "previous": "1.0"},'
+            ' {"owner": "cfpb", "repo": "two", "branch": "develop"}]',
+        )
+        self.assertEqual(
+            read_manifest(path, "main"),
+            [
+                BatchEntry("cfpb", "one", "1.0", None, "main"),
+                BatchEntry("cfpb", "two", None, None, "develop"),
+            ],
+        )
+
+    def test_csv(self):
+        path = self.write(
+            "repos.csv",
+            "owner,repo,previous,current,branch\n"
+            "cfpb,one,1.0,1.1,\n"
+            "cfpb,two,,,develop\n",
+        )
+        self.assertEqual(
+            read_manifest(path, "main"),
+            [
+                BatchEntry("cfpb", "one", "1.0", "1.1", "main"),
+                BatchEntry("cfpb", "two", None, None, "develop"),
+            ],
+        )
+
+    def test_yaml(self):
+        path = self.write(
+            "repos.yml",
+            "- owner: cfpb\n  repo: one\n  previous: '1.0'\n",
+        )
+        self.assertEqual(
+            read_manifest(path, "main"),
+            [BatchEntry("cfpb", "one", "1.0", None, "main")],
+        )
+
+    def test_values_are_text(self):
+        """Numbers are kept as written, rather than 1.10 becoming 1.1"""
+        path = self.write(
+            "repos.yml",
+            "- owner: cfpb\n  repo: 2048\n  previous: 1.10\n  current: ~\n",
+        )
+        self.assertEqual(
+            read_manifest(path, "main"),
+            [BatchEntry("cfpb", "2048", "1.10", None, "main")],
+        )
+        path = self.write(
+            "repos.json", '[{"owner": "cfpb", "repo": 2048, "previous": 1.10}]'
+        )
+        self.assertEqual(
+            read_manifest(path, "main"),
+            [BatchEntry("cfpb", "2048", "1.10", None, "main")],
+        )
+
+    def test_unreadable(self):
+        path = self.write("repos.json", '[{"owner": "cfpb",')
+        with self.assertRaises(ManifestError):
+            read_manifest(path, "main")
+        path = self.write("repos.yml", "- owner: [cfpb\n")
+        with self.assertRaises(ManifestError):
+            read_manifest(path, "main")
+        with self.assertRaises(ManifestError):
+            read_manifest(os.path.join(self.directory, "none.csv"), "main")
+
+    def test_missing_repo(self):
+        path = self.write("repos.json", '[{"owner": "cfpb"}]')
+        with self.assertRaises(ManifestError):
+            read_manifest(path, "main")
+
+    def test_unknown_format(self):
+        path = self.write("repos.txt", "cfpb one")
+        with self.assertRaises(ManifestError):
+            read_manifest(path, "main")
+
+
+class TestGenerateChangelogs(TestCase):
+    def setUp(self):
+        commits = synthetic_commits(10)
+        self.stub = StubGitHub(
+            StubRepo(commits, {"0.1.0": commits[5]["sha"]})
+        ).start()
+        self.addCleanup(self.stub.stop)
+
+    def test_failures_do_not_stop_the_batch(self):
+        """Each repo's result or error is reported separately"""
+        entries = [
+            BatchEntry("someone", "good", None, None, "main"),
+            BatchEntry("someone", "bad", "no-such-tag", None, "main"),
+            BatchEntry("someone", "also-good", "0.1.0", None, "main"),
+        ]
+        results = {
+            result.entry.repo: result
+            for result in generate_changelogs(
+                entries,
+                github_base_url=PUBLIC_GITHUB_URL,
+                github_api_url=self.stub.api_url,
+                max_workers=2,
+            )
+        }
+
+        self.assertEqual(
+            results["good"].changelog,
+            "- Title for change 9 #9\n- Title for change 7 #7\n"
+            "- Title for change 6 #6",
+        )
+        self.assertIsNone(results["good"].error)
+        self.assertEqual(
+            results["also-good"].changelog, results["good"].changelog
+        )
+        self.assertIsNone(results["bad"].changelog)
+        self.assertIsInstance(results["bad"].error, GitHubError)
+
+    def test_batch_command(self):
+        """The batch subcommand prints each changelog and exits non-zero
+        if any repo failed"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "repos.csv")
+        with open(path, "w") as f:
+            f.write("owner,repo,previous\nsomeone,good,\nsomeone,bad,nope\n")
+
+        with mock.patch("sys.stdout") as stdout, mock.patch("sys.stderr"):
+            status = main(
+                [
+                    "batch",
+                    path,
+                    "--markdown",
+                    "--github-api-url",
+                    self.stub.api_url,
+                    "--no-cache",
+                ]
+            )
+
+        output = "".join(call[0][0] for call in stdout.write.call_args_list)
+        self.assertIn("## someone/good\n", output)
+        self.assertNotIn("someone/bad", output)
+        self.assertEqual(status, 1)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubClient,
+    get_commits_between,
+    get_github_config,
+    get_last_tag,
+    main,
+)
+from changelog.cache import CacheEntry, MemoryCache, ResponseCache
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_round_trip(self):
+        """Cached entries come back as equivalent responses"""
+        cache = ResponseCache(self.directory)
+        key = cache.key("http://foo", {"page": 2})
+        cache.set(
+            key,
+            CacheEntry("http://foo", 200, {"ETag": '"abc"'}, '{"a": 1}'),
+        )
+        entry = cache.get(key)
+        self.assertEqual(entry.etag, '"abc"')
+        self.assertEqual(entry.to_response().json(), {"a": 1})
+
+    def test_missing_entry(self):
+        cache = ResponseCache(self.directory)
+        self.assertIsNone(cache.get(cache.key("http://foo")))
+
+    def test_key_depends_on_identity(self):
+        """Different credentials never share cache entries"""
+        cache = ResponseCache(self.directory)
+        self.assertNotEqual(
+            cache.key("http://foo", identity="token one"),
+            cache.key("http://foo", identity="token two"),
+        )
+        self.assertNotEqual(
+            cache.key("http://foo"), cache.key("http://foo", {"page": 2})
+        )
+
+    def test_evicts_least_recently_used(self):
+        """Once over the size cap the least recently used entries go"""
+        cache = ResponseCache(self.directory, max_size=10**6)
+        for i, name in enumerate(["a", "b", "c"]):
+            cache.set(name, CacheEntry(name, 200, {}, "x" * 100))
+            os.utime(cache.path(name), (i, i))
+
+        # Using "a" makes "b" the least recently used entry
+        cache.get("a")
+        cache.max_size = os.path.getsize(cache.path("a")) * 2
+        cache.evict()
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+
+class TestMemoryCache(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = MemoryCache(max_size=250)
+        for name in ["a", "b", "c"]:
+            cache.set(name, CacheEntry(name, 200, {}, "x" * 100))
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b").body, "x" * 100)
+        cache.set("d", CacheEntry("d", 200, {}, "x" * 100))
+        self.assertIsNone(cache.get("c"))
+        self.assertIsNotNone(cache.get("b"))
+        self.assertEqual(cache.size, 200)
+
+
+class TestCachingClient(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.commits = synthetic_commits(10)
+        self.stub = StubGitHub(
+            StubRepo(self.commits, {"0.1.0": self.commits[2]["sha"]})
+        ).start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+
+    def test_revalidates_with_etag(self):
+        """Unchanged responses are revalidated rather than refetched"""
+        for _ in range(2):
+            client = GitHubClient(
+                self.github_config, cache=ResponseCache(self.directory)
+            )
+            tag = get_last_tag(self.github_config, "o", "r", client)
+            self.assertEqual(tag, "0.1.0")
+        self.assertEqual(self.stub.request_count, 2)
+        self.assertEqual(self.stub.not_modified_count, 1)
+
+    def test_compare_between_shas_is_not_revalidated(self):
+        """Comparisons between two shas are served from the cache"""
+        for _ in range(2):
+            client = GitHubClient(
+                self.github_config, cache=ResponseCache(self.directory)
+            )
+            commits = get_commits_between(
+                self.github_config,
+                "o",
+                "r",
+                self.commits[0]["sha"],
+                self.commits[-1]["sha"],
+                client,
+            )
+            self.assertEqual(len(commits), 9)
+        self.assertEqual(self.stub.request_count, 1)
+
+
+class TestCacheOptions(TestCase):
+    @mock.patch("changelog.generate_changelog")
+    def test_cache_dir(self, mock_generate_changelog):
+        mock_generate_changelog.return_value = ""
+        with mock.patch("sys.argv", ["changelog", "o", "r", "--cache-dir=c"]):
+            main()
+        self.assertEqual(
+            mock_generate_changelog.call_args[1]["cache_dir"], "c"
+        )
+
+    @mock.patch("changelog.generate_changelog")
+    def test_no_cache(self, mock_generate_changelog):
+        mock_generate_changelog.return_value = ""
+        with mock.patch.dict(os.environ, {"CHANGELOG_CACHE_DIR": "c"}):
+            with mock.patch("sys.argv", ["changelog", "o", "r", "--no-cache"]):
+                main()
+        self.assertIsNone(mock_generate_changelog.call_args[1]["cache_dir"])
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import json
+import threading
 from unittest import TestCase
 
 import mock
@@ -7,9 +9,14 @@ import mock
 from changelog import (
     PUBLIC_GITHUB_API_URL,
     PUBLIC_GITHUB_URL,
+    GitHubClient,
     GitHubError,
+    PRMatcher,
     PullRequest,
+    Release,
     extract_pr,
+    fetch_changes,
+    fetch_history,
     format_changes,
     generate_changelog,
     get_commit_for_tag,
@@ -17,7 +24,23 @@ from changelog import (
     get_github_config,
     get_last_commit,
     is_pr,
+    iter_commits_between,
+    iter_pages,
 )
+from changelog.client import DEFAULT_TIMEOUT
+from changelog.tags import forget_tag_index
+from changelog.tests.stub_server import (
+    StubGitHub,
+    StubRepo,
+    synthetic_commits,
+    synthetic_files,
+)
+
+
+def stream_json(response):
+    """Serve a mocked response's JSON body to streaming readers too"""
+    body = json.dumps(response.json.return_value).encode("utf-8")
+    response.iter_content.return_value = iter([body])
 
 
 fake_github_config = get_github_config(
@@ -54,7 +77,19 @@ class TestChangelog(TestCase):
             # despite its leading underscore
             self.assertEqual(github_config._asdict(), expected_output)
 
-    @mock.patch("requests.get")
+    def test_github_client_defaults(self):
+        """The client authenticates and applies a default timeout"""
+        client = GitHubClient(fake_github_config)
+        self.assertEqual(
+            client.session.headers["Authorization"], "token fake-github-token"
+        )
+        with mock.patch.object(client.session, "get") as mock_get:
+            client.get("http://foo", params={"a": "b"})
+        mock_get.assert_called_once_with(
+            "http://foo", params={"a": "b"}, timeout=DEFAULT_TIMEOUT
+        )
+
+    @mock.patch("requests.Session.get")
     def test_get_commit_for_tag_exists(self, mock_requests_get):
         """Test getting the commit sha for a tag if the tag exists"""
         response = mock.MagicMock()
@@ -68,7 +103,7 @@ class TestChangelog(TestCase):
         )
         self.assertEqual(result, "0123456789abcdef")
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_commit_for_tag_not_found(self, mock_requests_get):
         """Getting commit sha for a tag fails if tag doesn't exist"""
         response = mock.MagicMock()
@@ -80,7 +115,7 @@ class TestChangelog(TestCase):
                 fake_github_config, "someone", "one-repo", "mytag"
             )
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_commit_for_tag_tag_object(self, mock_requests_get):
         """Test getting the commit sha when tagged object is itself a tag"""
         response = mock.MagicMock()
@@ -101,7 +136,7 @@ class TestChangelog(TestCase):
         )
         self.assertEqual(result, "0123456789abcdef")
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_last_commit_exists(self, mock_requests_get):
         """Test getting commit sha for latest commit on the default branch"""
         response = mock.MagicMock()
@@ -111,7 +146,7 @@ class TestChangelog(TestCase):
         result = get_last_commit(fake_github_config, "someone", "one-repo")
         self.assertEqual(result, "0123456789abcdef")
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_last_commit_custom_branch(self, mock_requests_get):
         """Test getting commit sha for latest commit on a specific branch"""
         response = mock.MagicMock()
@@ -123,7 +158,7 @@ class TestChangelog(TestCase):
         )
         self.assertEqual(result, "0123456789abcdef")
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_last_commit_not_found(self, mock_requests_get):
         """Getting the commit sha for latest commit fails if no commits"""
         response = mock.MagicMock()
@@ -133,7 +168,7 @@ class TestChangelog(TestCase):
         with self.assertRaises(GitHubError):
             get_last_commit(fake_github_config, "someone", "one-repo")
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_commits_between(self, mock_requests_get):
         """Test getting commits between two commits"""
         response = mock.MagicMock()
@@ -144,6 +179,8 @@ class TestChangelog(TestCase):
                 {"sha": "123456789abcdef0", "commit": {"message": "Bar"}},
             ]
         }
+        response.links = {}
+        stream_json(response)
         mock_requests_get.return_value = response
         result = get_commits_between(
             fake_github_config, "someone", "one-repo", "one", "two"
@@ -152,19 +189,72 @@ class TestChangelog(TestCase):
             result, [("0123456789abcdef", "Foo"), ("123456789abcdef0", "Bar")]
         )
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
+    def test_get_commits_between_paginated(self, mock_requests_get):
+        """Test that commits are collected across every page of results"""
+        first_page = mock.MagicMock()
+        first_page.status_code = 200
+        first_page.json.return_value = {
+            "commits": [
+                {"sha": "0123456789abcdef", "commit": {"message": "Foo"}},
+            ]
+        }
+        first_page.links = {"next": {"url": "http://foo?page=2"}}
+        second_page = mock.MagicMock()
+        second_page.status_code = 200
+        second_page.json.return_value = {
+            "commits": [
+                {"sha": "123456789abcdef0", "commit": {"message": "Bar"}},
+            ]
+        }
+        second_page.links = {}
+        stream_json(first_page)
+        stream_json(second_page)
+        mock_requests_get.side_effect = [first_page, second_page]
+        result = get_commits_between(
+            fake_github_config, "someone", "one-repo", "one", "two"
+        )
+        self.assertEqual(
+            result, [("0123456789abcdef", "Foo"), ("123456789abcdef0", "Bar")]
+        )
+        self.assertEqual(
+            mock_requests_get.call_args[0][0], "http://foo?page=2"
+        )
+
+    @mock.patch("requests.Session.get")
+    def test_iter_commits_between_is_lazy(self, mock_requests_get):
+        """Pages are only requested as the commits are consumed"""
+        response = mock.MagicMock()
+        response.status_code = 200
+        response.json.return_value = {
+            "commits": [
+                {"sha": "0123456789abcdef", "commit": {"message": "Foo"}},
+            ]
+        }
+        response.links = {"next": {"url": "http://foo?page=2"}}
+        stream_json(response)
+        mock_requests_get.return_value = response
+        commits = iter_commits_between(
+            fake_github_config, "someone", "one-repo", "one", "two"
+        )
+        self.assertEqual(mock_requests_get.call_count, 0)
+        self.assertEqual(next(commits), ("0123456789abcdef", "Foo"))
+        self.assertEqual(mock_requests_get.call_count, 1)
+
+    @mock.patch("requests.Session.get")
     def test_get_commits_between_no_commits(self, mock_requests_get):
         """Test when there are no commits in the data"""
         response = mock.MagicMock()
         response.status_code = 200
         response.json.return_value = {}
+        stream_json(response)
         mock_requests_get.return_value = response
         with self.assertRaises(GitHubError):
             get_commits_between(
                 fake_github_config, "someone", "one-repo", "one", "two"
             )
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_get_commits_between_not_found(self, mock_requests_get):
         """Test when one commit is not found"""
         response = mock.MagicMock()
@@ -176,6 +266,50 @@ class TestChangelog(TestCase):
                 fake_github_config, "someone", "one-repo", "one", "two"
             )
 
+    def test_get_commits_between_large_range(self):
+        """Ranges beyond a single compare page are returned in full"""
+        commits = synthetic_commits(601)
+        with StubGitHub(StubRepo(commits)) as stub:
+            github_config = get_github_config(
+                PUBLIC_GITHUB_URL, stub.api_url, None
+            )
+            result = get_commits_between(
+                github_config,
+                "someone",
+                "one-repo",
+                commits[0]["sha"],
+                commits[-1]["sha"],
+            )
+        self.assertEqual(len(result), 600)
+        self.assertEqual(result[-1].sha, commits[-1]["sha"])
+        self.assertEqual(stub.request_count, 6)
+
+    def test_iter_pages(self):
+        """Pages are followed by their links, and a failed one raises"""
+        pages = []
+        for status_code, link in [(200, "http://next"), (404, None)]:
+            response = mock.MagicMock()
+            response.status_code = status_code
+            response.json.return_value = {"message": "Not Found"}
+            response.links = {"next": {"url": link}} if link else {}
+            pages.append(response)
+        client = mock.Mock()
+        client.get.side_effect = pages
+
+        responses = iter_pages(
+            client, "http://first", {"per_page": 1}, "Unable to get tags"
+        )
+        self.assertIs(next(responses), pages[0])
+        with self.assertRaisesRegex(GitHubError, "^Unable to get tags. Not"):
+            next(responses)
+        self.assertEqual(
+            client.get.call_args_list,
+            [
+                mock.call("http://first", params={"per_page": 1}),
+                mock.call("http://next", params=None),
+            ],
+        )
+
     def test_is_pr_merge(self):
         """Test our PR extractor with merge PRa"""
         message = "Merge pull request #1234 from some/branch\n\nMy Title"
@@ -234,6 +368,62 @@ class TestChangelog(TestCase):
         self.assertEqual(result.number, "345")
         self.assertEqual(result.title, "Some title addresses bug")
 
+    def test_extract_pr_last_number_on_line(self):
+        """The last parenthesized number on the first line is the PR"""
+        message = "Revert (#12) for now (#34)\n\nMentions (#56)"
+        result = extract_pr(message)
+        self.assertEqual(result.number, "34")
+        self.assertEqual(result.title, "Revert (#12) for now")
+
+    def test_extract_pr_ignores_later_paragraphs(self):
+        """Only the first lines of a message are considered"""
+        message = "I made some changes!\n\nMore\n\nSee #1 (#2)"
+        self.assertFalse(is_pr(message))
+
+    def test_pr_matcher_custom_pattern(self):
+        """Extra patterns are tried after the built in ones"""
+        matcher = PRMatcher(
+            [r"^Merged in (?P<title>.*) \[!(?P<number>[0-9]+)\]"]
+        )
+        self.assertEqual(
+            matcher.match("Merged in Add a thing [!12]\n\nBody"),
+            PullRequest("12", "Add a thing"),
+        )
+        self.assertEqual(
+            matcher.match("My Title (#1234)"), PullRequest("1234", "My Title")
+        )
+        self.assertIsNone(matcher.match("I made some changes!"))
+
+    def test_pr_matcher_pattern_needs_groups(self):
+        with self.assertRaises(ValueError):
+            PRMatcher([r"^Merged in (.*)"])
+
+    def test_fetch_changes_resolves_refs_concurrently(self):
+        """Both ends of the range are resolved at the same time"""
+        # Each side waits for the other, so this only passes if they overlap
+        barrier = threading.Barrier(2, timeout=5)
+
+        def resolve(sha):
+            def wait_for_other_side(*args):
+                barrier.wait()
+                return sha
+
+            return wait_for_other_side
+
+        with mock.patch(
+            "changelog.resolve_previous_commit", side_effect=resolve("one")
+        ), mock.patch(
+            "changelog.resolve_current_commit", side_effect=resolve("two")
+        ), mock.patch(
+            "changelog.iter_commits_between", return_value=iter([])
+        ) as mock_iter_commits_between:
+            result = fetch_changes(fake_github_config, "someone", "one-repo")
+
+        self.assertEqual(result, [])
+        self.assertEqual(
+            mock_iter_commits_between.call_args[0][3:5], ("one", "two")
+        )
+
     def test_format_changes_uses_correct_base_url(self):
         """Test format_changes() with a custom GitHub base url"""
         github_config = get_github_config(
@@ -251,10 +441,12 @@ class TestChangelog(TestCase):
         ]
         self.assertEqual(actual, expected)
 
-    @mock.patch("requests.get")
+    @mock.patch("requests.Session.get")
     def test_generate_changelog(self, mock_requests_get):
         """Test the main method that generates a changelog"""
-        responses = []
+        # The two ends of the range are resolved concurrently, so respond
+        # by URL rather than by the order of the requests
+        responses = {}
 
         get_last_tag_response = mock.MagicMock()
         get_last_tag_response.status_code = 200
@@ -262,14 +454,14 @@ class TestChangelog(TestCase):
             {"name": "0.1.0", "commit": {"sha": "4"}},
             {"name": "0.0.1", "commit": {"sha": "1"}},
         ]
-        responses.append(get_last_tag_response)
+        responses["/one-repo/tags"] = get_last_tag_response
 
         get_commit_for_tag_response = mock.MagicMock()
         get_commit_for_tag_response.status_code = 200
         get_commit_for_tag_response.json.return_value = {
             "object": {"type": "commit", "sha": "4"}
         }
-        responses.append(get_commit_for_tag_response)
+        responses["/tags/0.1.0"] = get_commit_for_tag_response
 
         get_last_commit_response = mock.MagicMock()
         get_last_commit_response.status_code = 200
@@ -327,7 +519,7 @@ class TestChangelog(TestCase):
                 "commit": {"message": "Some title addresses bug (#345)"},
             },
         ]
-        responses.append(get_last_commit_response)
+        responses["/one-repo/commits"] = get_last_commit_response
 
         get_commits_between_response = mock.MagicMock()
         get_commits_between_response.status_code = 200
@@ -368,9 +560,15 @@ class TestChangelog(TestCase):
                 },
             ]
         }
-        responses.append(get_commits_between_response)
-
-        mock_requests_get.side_effect = responses
+        get_commits_between_response.links = {}
+        stream_json(get_commits_between_response)
+        responses["/compare/4...10"] = get_commits_between_response
+
+        mock_requests_get.side_effect = lambda url, **kwargs: next(
+            response
+            for suffix, response in responses.items()
+            if url.endswith(suffix)
+        )
         result = generate_changelog(
             "someone",
             "one-repo",
@@ -387,3 +585,141 @@ class TestChangelog(TestCase):
                 "- My Title #10"
             ),
         )
+
+    def test_commits_between_skips_files(self):
+        """Large lists of files changed don't get in the way of commits"""
+        commits = synthetic_commits(600)
+        repo = StubRepo(commits, files=synthetic_files(2000))
+        with StubGitHub(repo) as stub:
+            github_config = get_github_config(
+                PUBLIC_GITHUB_URL, stub.api_url, None
+            )
+            result = get_commits_between(
+                github_config,
+                "someone",
+                "one-repo",
+                commits[0]["sha"],
+                commits[-1]["sha"],
+            )
+        self.assertEqual(
+            [c.sha for c in result], [c["sha"] for c in commits[1:]]
+        )
+
+    def test_generate_changelog_reuses_client(self):
+        """A client passed in is reused across changelogs and requests"""
+        commits = synthetic_commits(10)
+        tags = {"0.1.0": commits[2]["sha"]}
+        with StubGitHub(StubRepo(commits, tags)) as stub:
+            github_config = get_github_config(
+                PUBLIC_GITHUB_URL, stub.api_url, None
+            )
+            with GitHubClient(github_config) as client:
+                for _ in range(2):
+                    result = generate_changelog(
+                        "someone",
+                        "one-repo",
+                        github_base_url=PUBLIC_GITHUB_URL,
+                        github_api_url=stub.api_url,
+                        client=client,
+                    )
+        self.assertEqual(
+            result.splitlines(),
+            [
+                "- Title for change 9 #9",
+                "- Title for change 7 #7",
+                "- Title for change 6 #6",
+                "- Title for change 4 #4",
+                "- Title for change 3 #3",
+            ],
+        )
+        self.assertEqual(stub.request_count, 8)
+        # One connection for each end of the range resolved concurrently
+        self.assertLessEqual(len(stub.connections), 2)
+
+
+class TestFullHistory(TestCase):
+    def setUp(self):
+        commits = synthetic_commits(12)
+        tags = {
+            "0.1.0": commits[0]["sha"],
+            "0.2.0": commits[4]["sha"],
+            "0.3.0": commits[8]["sha"],
+        }
+        self.stub = StubGitHub(StubRepo(commits, tags))
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        self.addCleanup(
+            forget_tag_index, self.github_config, "someone", "one-repo"
+        )
+
+    def prs(self, *numbers):
+        return [
+            PullRequest(str(n), "Title for change {}".format(n))
+            for n in numbers
+        ]
+
+    def test_fetch_history(self):
+        """Every release is found from one tag listing and one walk"""
+        releases = fetch_history(self.github_config, "someone", "one-repo")
+        self.assertEqual(
+            releases,
+            [
+                Release(None, self.prs(10, 9)),
+                Release("0.3.0", self.prs(7, 6)),
+                Release("0.2.0", self.prs(4, 3, 1)),
+                Release("0.1.0", self.prs(0)),
+            ],
+        )
+        # The tags, the head of the branch and one page of history
+        self.assertEqual(self.stub.request_count, 3)
+
+    def test_same_as_fetch_changes(self):
+        releases = fetch_history(
+            self.github_config, "someone", "one-repo", "0.1.0", "0.3.0"
+        )
+        self.assertEqual(
+            releases,
+            [
+                Release("0.3.0", self.prs(7, 6)),
+                Release("0.2.0", self.prs(4, 3, 1)),
+            ],
+        )
+        for release, previous_tag in zip(releases, ["0.2.0", "0.1.0"]):
+            prs = fetch_changes(
+                self.github_config,
+                "someone",
+                "one-repo",
+                previous_tag,
+                release.tag,
+            )
+            self.assertEqual(prs, release.prs)
+
+    def test_generate_changelog(self):
+        result = generate_changelog(
+            "someone",
+            "one-repo",
+            "0.2.0",
+            markdown=True,
+            github_base_url=PUBLIC_GITHUB_URL,
+            github_api_url=self.stub.api_url,
+            full_history=True,
+        )
+        self.assertEqual(
+            result.splitlines(),
+            [
+                "## Unreleased",
+                "- Title for change 10 "
+                "[#10](https://github.com/someone/one-repo/pull/10)",
+                "- Title for change 9 "
+                "[#9](https://github.com/someone/one-repo/pull/9)",
+                "",
+                "## 0.3.0",
+                "- Title for change 7 "
+                "[#7](https://github.com/someone/one-repo/pull/7)",
+                "- Title for change 6 "
+                "[#6](https://github.com/someone/one-repo/pull/6)",
+            ],
+        )
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+
+from changelog import PUBLIC_GITHUB_URL, Merge, PullRequest, get_github_config
+from changelog.checkpoint import (
+    Checkpoint,
+    CheckpointStore,
+    fetch_changes_incremental,
+)
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+class TestCheckpointStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = CheckpointStore(self.directory)
+
+    def test_save_and_load(self):
+        checkpoint = Checkpoint(
+            "a", "b", [Merge("c", PullRequest("1", "Title"))]
+        )
+        self.store.save("someone", "one-repo", "feature/x", checkpoint)
+        self.assertEqual(
+            self.store.load("someone", "one-repo", "feature/x"), checkpoint
+        )
+        self.assertIsNone(self.store.load("someone", "one-repo", "feature"))
+
+    def test_earlier_format(self):
+        """Checkpoints saved before they had the merge commits are ignored
+        rather than misread"""
+        path = self.store.path("someone", "one-repo", "main")
+        with open(path, "w") as f:
+            json.dump(
+                {"previous_commit": "a", "last_commit": "b", "prs": []}, f
+            )
+        self.assertIsNone(self.store.load("someone", "one-repo", "main"))
+
+
+class TestFetchChangesIncremental(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = CheckpointStore(self.directory)
+
+        self.commits = synthetic_commits(12)
+        self.tags = {"0.1.0": self.commits[2]["sha"]}
+        self.stub = StubGitHub(StubRepo(self.commits[:8], self.tags))
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+
+    def fetch(self):
+        return fetch_changes_incremental(
+            self.github_config, "someone", "one-repo", self.store, "0.1.0"
+        )
+
+    def prs(self, *numbers):
+        return [
+            PullRequest(str(n), "Title for change {}".format(n))
+            for n in numbers
+        ]
+
+    def mark_checkpoint(self):
+        """Add a PR only the checkpoint knows about, to tell whether a run
+        resumed from it"""
+        checkpoint = self.store.load("someone", "one-repo", "main")
+        self.store.save(
+            "someone",
+            "one-repo",
+            "main",
+            checkpoint._replace(
+                merges=checkpoint.merges + [Merge("f" * 40, self.prs(99)[0])]
+            ),
+        )
+
+    def test_resumes_from_checkpoint(self):
+        self.assertEqual(self.fetch(), self.prs(7, 6, 4, 3))
+        self.mark_checkpoint()
+
+        self.stub.repo.commits = self.commits
+        self.assertEqual(self.fetch(), self.prs(10, 9, 7, 6, 4, 3, 99))
+        self.assertEqual(
+            self.store.load("someone", "one-repo", "main").last_commit,
+            self.commits[-1]["sha"],
+        )
+
+    def test_nothing_new(self):
+        self.fetch()
+        self.mark_checkpoint()
+        self.assertEqual(self.fetch(), self.prs(7, 6, 4, 3, 99))
+
+    def test_force_push_recomputes(self):
+        self.fetch()
+        self.mark_checkpoint()
+
+        # Rewrite the history after the tag
+        rewritten = self.commits[:4] + [
+            dict(commit, sha="{:040x}".format(0xF0 + i))
+            for i, commit in enumerate(self.commits[4:10])
+        ]
+        self.stub.repo.commits = rewritten
+        self.assertEqual(self.fetch(), self.prs(9, 7, 6, 4, 3))
+
+    def test_new_previous_tag_recomputes(self):
+        self.fetch()
+        self.mark_checkpoint()
+
+        self.tags["0.1.0"] = self.commits[5]["sha"]
+        self.assertEqual(self.fetch(), self.prs(7, 6))
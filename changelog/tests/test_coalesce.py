@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from unittest import TestCase
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    Deadline,
+    DeadlineExceeded,
+    get_github_config,
+    get_last_commit,
+)
+from changelog.client import GitHubClient
+from changelog.coalesce import SingleFlight
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+KEY = ("https://api.github.com", "o", "r", "branch", "main")
+
+
+def run_concurrently(count, function):
+    """Call function from count threads at once, returning their results
+    in order"""
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        results[i] = function()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def clock(self):
+        return self.now
+
+    def lookup(self, value):
+        self.calls.append(value)
+        self.started.set()
+        self.release.wait(5)
+        return value
+
+    def test_concurrent_calls_share_one(self):
+        single_flight = SingleFlight()
+        thread = threading.Thread(
+            target=single_flight.do, args=(KEY, self.lookup, "first")
+        )
+        thread.start()
+        self.started.wait(5)
+
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(
+                single_flight.do(KEY, self.lookup, "second")
+            )
+        )
+        waiter.start()
+        # Give the second call time to start waiting for the first
+        time.sleep(0.05)
+        self.release.set()
+        thread.join()
+        waiter.join()
+        self.assertEqual(results, ["first"])
+        self.assertEqual(self.calls, ["first"])
+
+        # Once finished, the result isn't kept
+        self.assertEqual(single_flight.do(KEY, self.lookup, "third"), "third")
+
+    def test_max_age(self):
+        single_flight = SingleFlight(max_age=2, clock=self.clock)
+        self.release.set()
+        single_flight.do(KEY, self.lookup, "first")
+        self.now = 2.0
+        self.assertEqual(single_flight.do(KEY, self.lookup, "second"), "first")
+        self.now = 2.5
+        self.assertEqual(single_flight.do(KEY, self.lookup, "third"), "third")
+
+        single_flight.forget("https://api.github.com", "O", "R")
+        self.assertEqual(
+            single_flight.do(KEY, self.lookup, "fourth"), "fourth"
+        )
+
+    def test_waiting_within_a_deadline(self):
+        single_flight = SingleFlight()
+        thread = threading.Thread(
+            target=single_flight.do, args=(KEY, self.lookup, "first")
+        )
+        thread.start()
+        self.started.wait(5)
+        self.addCleanup(thread.join)
+        self.addCleanup(self.release.set)
+
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            single_flight.do(
+                KEY, self.lookup, "second", deadline=Deadline(0.1)
+            )
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.calls, ["first"])
+
+    def test_deadline_exceeded_is_not_shared(self):
+        single_flight = SingleFlight()
+
+        def run_out():
+            self.calls.append("leader")
+            self.started.set()
+            self.release.wait(5)
+            raise DeadlineExceeded("Gave up after 1 seconds")
+
+        thread = threading.Thread(
+            target=lambda: self.assertRaises(
+                DeadlineExceeded, single_flight.do, KEY, run_out
+            )
+        )
+        thread.start()
+        self.started.wait(5)
+
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(
+                single_flight.do(KEY, self.lookup, "waiter")
+            )
+        )
+        waiter.start()
+        # Give the second call time to start waiting for the first
+        time.sleep(0.05)
+        self.release.set()
+        thread.join()
+        waiter.join()
+        # The waiter made its own call rather than fail with the leader
+        self.assertEqual(results, ["waiter"])
+        self.assertEqual(self.calls, ["leader", "waiter"])
+
+    def test_errors_are_not_kept(self):
+        single_flight = SingleFlight(max_age=2, clock=self.clock)
+
+        def fail():
+            raise ValueError("Not Found")
+
+        with self.assertRaises(ValueError):
+            single_flight.do(KEY, fail)
+        self.release.set()
+        self.assertEqual(single_flight.do(KEY, self.lookup, "found"), "found")
+
+
+class TestCoalescedLookups(TestCase):
+    def setUp(self):
+        self.commits = synthetic_commits(10)
+        self.stub = StubGitHub(StubRepo(self.commits), latency=0.2).start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+
+    def get_last_commit(self):
+        with GitHubClient(self.github_config) as client:
+            return get_last_commit(
+                self.github_config, "o", "r", "main", client
+            )
+
+    def test_concurrent_callers(self):
+        results = run_concurrently(8, self.get_last_commit)
+        self.assertEqual(results, [self.commits[-1]["sha"]] * 8)
+        self.assertEqual(self.stub.request_count, 1)
+
+    def test_deadline_of_waiting_client(self):
+        self.stub.latency = 0.5
+        thread = threading.Thread(target=self.get_last_commit)
+        thread.start()
+        self.addCleanup(thread.join)
+        # Let the first lookup get in flight
+        time.sleep(0.1)
+
+        start = time.monotonic()
+        with GitHubClient(self.github_config) as client:
+            client = client.with_deadline(Deadline(0.2))
+            with self.assertRaises(DeadlineExceeded):
+                get_last_commit(self.github_config, "o", "r", "main", client)
+        self.assertLess(time.monotonic() - start, 0.35)
+        self.assertEqual(self.stub.request_count, 1)
+
+    def test_sequential_callers(self):
+        self.get_last_commit()
+        self.stub.repo.commits = self.commits[:5]
+        self.assertEqual(self.get_last_commit(), self.commits[4]["sha"])
+        self.assertEqual(self.stub.request_count, 2)
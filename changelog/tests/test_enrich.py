@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    DEFAULT_LABEL_GROUPS,
+    PUBLIC_GITHUB_URL,
+    GitHubClient,
+    PullRequest,
+    enrich,
+    format_changes,
+    generate_changelog,
+    get_github_config,
+    label_group,
+    main,
+)
+from changelog.enrich import PRDetails, forget_pr_details, get_pr_details
+from changelog.tests.stub_server import (
+    StubGitHub,
+    StubRepo,
+    synthetic_commits,
+    synthetic_pulls,
+)
+
+
+GROUPED_CHANGELOG = """Breaking changes
+- Title for change 7 #7
+- Title for change 3 #3
+
+Features
+- Title for change 4 #4
+
+Fixes
+- Title for change 9 #9
+
+Other changes
+- Title for change 6 #6"""
+
+
+class TestGetPRDetails(TestCase):
+    def setUp(self):
+        commits = synthetic_commits(10)
+        self.stub = StubGitHub(
+            StubRepo(
+                commits,
+                {"0.1.0": commits[2]["sha"]},
+                pulls=synthetic_pulls(10),
+            )
+        ).start()
+        self.addCleanup(self.stub.stop)
+
+    def github_config(self, token=None):
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, token
+        )
+        self.addCleanup(forget_pr_details, github_config, "o", "r")
+        return github_config
+
+    @mock.patch("changelog.enrich.PRS_PER_QUERY", 2)
+    def test_graphql_batches(self):
+        github_config = self.github_config("fake-github-token")
+        details = get_pr_details(
+            github_config, "o", "r", ["3", "4", "6", "7", "9", "42"]
+        )
+        self.assertEqual(sorted(details, key=int), ["3", "4", "6", "7", "9"])
+        self.assertEqual(
+            details["7"],
+            PRDetails(
+                number="7",
+                title="Title for change 7",
+                labels=["breaking", "feature"],
+                author="author-1",
+                merged_at="2020-01-01T00:00:07Z",
+                body="Description",
+            ),
+        )
+        self.assertEqual(self.stub.request_count, 3)
+
+        # Known PRs aren't fetched again
+        details = get_pr_details(github_config, "o", "r", ["3", "9"])
+        self.assertEqual(sorted(details), ["3", "9"])
+        self.assertEqual(self.stub.request_count, 3)
+
+    @mock.patch("changelog.enrich.PULLS_PAGE_SIZE", 2)
+    def test_rest_stops_past_the_oldest_pr(self):
+        github_config = self.github_config()
+        client = GitHubClient(github_config)
+        self.addCleanup(client.close)
+        details = get_pr_details(
+            github_config, "o", "r", ["9", "4", "3"], client, max_workers=2
+        )
+        self.assertEqual(details["4"].labels, ["feature"])
+        self.assertEqual(sorted(details), ["3", "4", "9"])
+        # Pages 1 to 4 hold PRs 9 to 2
+        self.assertEqual(self.stub.request_count, 4)
+
+    @mock.patch("changelog.enrich.MAX_DETAILS", 2)
+    def test_least_recently_used_are_dropped(self):
+        github_config = self.github_config("fake-github-token")
+        get_pr_details(github_config, "o", "r", ["3", "4"])
+        get_pr_details(github_config, "o", "r", ["3"])
+        get_pr_details(github_config, "o", "r", ["6"])
+        self.assertEqual(self.stub.request_count, 2)
+        self.assertEqual(
+            [key[-1] for key in enrich._details if key[1:3] == ("o", "r")],
+            ["3", "6"],
+        )
+
+    def test_kept_for_each_token(self):
+        """Details fetched with a token aren't shared without one"""
+        get_pr_details(
+            self.github_config("fake-github-token"), "o", "r", ["3"]
+        )
+        requests_made = self.stub.request_count
+        get_pr_details(self.github_config(), "o", "r", ["3"])
+        self.assertGreater(self.stub.request_count, requests_made)
+
+    def test_numbers_that_are_not_numbers(self):
+        for token in [None, "fake-github-token"]:
+            github_config = self.github_config(token)
+            details = get_pr_details(github_config, "o", "r", ["3", "ABC-1"])
+            self.assertEqual(sorted(details), ["3"])
+
+    def test_grouped_with_pr_pattern(self):
+        """PRs matched by a custom pattern without a PR number go under
+        the other changes"""
+        self.stub.repo.commits.append(
+            {"sha": "{:040x}".format(99), "commit": {"message": "[ABC-1] Fix"}}
+        )
+        changelog = generate_changelog(
+            "o",
+            "r",
+            "0.1.0",
+            branch="main",
+            github_base_url=PUBLIC_GITHUB_URL,
+            github_api_url=self.stub.api_url,
+            pr_patterns=[r"^\[(?P<number>[A-Z]+-\d+)\] (?P<title>.*)"],
+            label_groups=DEFAULT_LABEL_GROUPS,
+        )
+        self.assertEqual(
+            changelog,
+            GROUPED_CHANGELOG.replace(
+                "Other changes\n", "Other changes\n- Fix #ABC-1\n"
+            ),
+        )
+        forget_pr_details(self.github_config(), "o", "r")
+
+    def test_generate_changelog_grouped(self):
+        for token in [None, "fake-github-token"]:
+            changelog = generate_changelog(
+                "o",
+                "r",
+                "0.1.0",
+                branch="main",
+                github_base_url=PUBLIC_GITHUB_URL,
+                github_api_url=self.stub.api_url,
+                github_token=token,
+                label_groups=DEFAULT_LABEL_GROUPS,
+            )
+            self.assertEqual(changelog, GROUPED_CHANGELOG)
+            forget_pr_details(self.github_config(token), "o", "r")
+
+
+class TestFormatGroups(TestCase):
+    def test_markdown_headings(self):
+        github_config = get_github_config("https://github.com", None, None)
+        prs = [PullRequest("2", "Second"), PullRequest("1", "First")]
+        details = {"2": PRDetails("2", "Second", ["Bug"], None, None, None)}
+        lines = format_changes(
+            github_config,
+            "o",
+            "r",
+            prs,
+            markdown=True,
+            details=details,
+            label_groups=DEFAULT_LABEL_GROUPS,
+        )
+        self.assertEqual(
+            lines,
+            [
+                "### Fixes",
+                "- Second [#2](https://github.com/o/r/pull/2)",
+                "",
+                "### Other changes",
+                "- First [#1](https://github.com/o/r/pull/1)",
+            ],
+        )
+
+    def test_label_group_argument(self):
+        self.assertEqual(
+            label_group("Docs=documentation, docs"),
+            ("Docs", ["documentation", "docs"]),
+        )
+        with self.assertRaises(argparse.ArgumentTypeError):
+            label_group("Docs")
+
+    @mock.patch("changelog.generate_changelog")
+    def test_cli(self, mock_generate_changelog):
+        mock_generate_changelog.return_value = ""
+        main(["o", "r", "--group-by-labels"])
+        self.assertEqual(
+            mock_generate_changelog.call_args[1]["label_groups"],
+            DEFAULT_LABEL_GROUPS,
+        )
+        main(["o", "r", "--label-group", "Docs=docs"])
+        self.assertEqual(
+            mock_generate_changelog.call_args[1]["label_groups"],
+            [("Docs", ["docs"])],
+        )
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubError,
+    PullRequest,
+    fetch_changes,
+    fetch_merges,
+    generate_changelog,
+    get_github_config,
+)
+from changelog.graphql import GraphQLCommitSource, get_graphql_url
+from changelog.tests.stub_server import StubGitHub, StubRepo, load_fixture
+
+
+COMMIT_2 = "{:040x}".format(0xC2)
+COMMIT_4 = "{:040x}".format(0xC4)
+COMMIT_5 = "{:040x}".format(0xC5)
+# A hotfix on a release branch off the first commit, tagged 0.1.1
+HOTFIX = "{:040x}".format(0xD1)
+
+
+def fixture_repo(graphql):
+    """Build a StubRepo of the recorded history, for the REST API"""
+    nodes = []
+    for exchange in graphql:
+        request = exchange["request"]
+        if request["operationName"] == "History":
+            if request["variables"]["oid"] == COMMIT_5:
+                history = exchange["response"]["data"]["repository"]
+                nodes.extend(history["object"]["history"]["nodes"])
+    commits = [
+        {"sha": node["oid"], "commit": {"message": node["message"]}}
+        for node in reversed(nodes)
+    ]
+    return StubRepo(commits, {"0.1.1": HOTFIX}, side_commits={HOTFIX: 0})
+
+
+class TestGetGraphQLURL(TestCase):
+    def test_public_github(self):
+        self.assertEqual(
+            get_graphql_url("https://api.github.com"),
+            "https://api.github.com/graphql",
+        )
+
+    def test_github_enterprise(self):
+        self.assertEqual(
+            get_graphql_url("https://github.company.com/api/v3/"),
+            "https://github.company.com/api/graphql",
+        )
+
+
+# Use small pages so that the recorded history spans several of them
+@mock.patch("changelog.graphql.HISTORY_PAGE_SIZE", 2)
+class TestGraphQLCommitSource(TestCase):
+    def setUp(self):
+        graphql = load_fixture("graphql.json")
+        self.stub = StubGitHub(fixture_repo(graphql), graphql=graphql).start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, "fake-github-token"
+        )
+        self.source = GraphQLCommitSource(
+            self.github_config, "someone", "one-repo"
+        )
+
+    def test_get_last_tag(self):
+        self.assertEqual(self.source.get_last_tag(), "0.2.0")
+
+    def test_get_commit_for_annotated_tag(self):
+        """Annotated tags are peeled in the same request"""
+        self.assertEqual(self.source.get_commit_for_tag("0.2.0"), COMMIT_4)
+        self.assertEqual(self.stub.request_count, 1)
+
+    def test_get_commit_for_tag_of_a_tag(self):
+        """Deeper chains of tags are followed with further requests"""
+        self.assertEqual(self.source.get_commit_for_tag("signed"), COMMIT_4)
+        self.assertEqual(self.stub.request_count, 2)
+
+    def test_get_commit_for_tag_not_found(self):
+        with self.assertRaises(GitHubError):
+            self.source.get_commit_for_tag("nope")
+
+    def test_fetch_changes(self):
+        """The GraphQL source finds the same PRs as the REST API"""
+        prs = fetch_changes(
+            self.github_config,
+            "someone",
+            "one-repo",
+            source=self.source,
+        )
+        self.assertEqual(prs, [PullRequest("4", "Third title")])
+        self.assertEqual(self.stub.request_count, 4)
+
+    def test_generate_changelog(self):
+        result = generate_changelog(
+            "someone",
+            "one-repo",
+            "0.1.0",
+            "0.2.0",
+            github_base_url=PUBLIC_GITHUB_URL,
+            github_api_url=self.stub.api_url,
+            github_token="fake-github-token",
+            graphql=True,
+        )
+        self.assertEqual(result, "- Second title #3\n- First title #2")
+        # Both tags, two pages of history, and a check that the range is
+        # linear once it's longer than a page
+        self.assertEqual(self.stub.request_count, 5)
+
+    def test_previous_tag_off_the_history(self):
+        """A range from a tag on another branch is compared from their
+        merge base, as with the REST API, without walking all of history"""
+        merges = fetch_merges(
+            self.github_config,
+            "someone",
+            "one-repo",
+            "0.1.1",
+            source=self.source,
+        )
+        self.assertEqual(
+            [merge.pr.number for merge in merges],
+            ["4", "3", "2"],
+        )
+        self.assertEqual(merges[-1].sha, COMMIT_2)
+        # Both ends, the first page of history, the check that the range
+        # isn't linear and the comparison
+        self.assertEqual(self.stub.request_count, 5)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    Deadline,
+    DeadlineExceeded,
+    fetch_changes,
+    generate_changelog,
+    get_github_config,
+    hedge_percentile,
+)
+from changelog.client import GitHubClient
+from changelog.hedge import Hedger, percentile
+from changelog.tests.stub_server import StubGitHub, synthetic_repo
+
+
+class TestDeadline(TestCase):
+    def setUp(self):
+        self.now = 100.0
+
+    def clock(self):
+        return self.now
+
+    def test_timeout(self):
+        deadline = Deadline(10, clock=self.clock)
+        self.assertEqual(deadline.timeout((5, 30)), (5, 10))
+        self.assertEqual(deadline.timeout(None), 10)
+        self.now = 107.0
+        self.assertEqual(deadline.timeout(5), 3)
+        deadline.check()
+
+        self.now = 111.0
+        self.assertEqual(deadline.remaining(), 0)
+        with self.assertRaises(DeadlineExceeded):
+            deadline.check()
+
+    def test_sleep(self):
+        deadline = Deadline(10, clock=self.clock)
+        slept = []
+        deadline.sleep(4, slept.append)
+        self.assertEqual(slept, [4])
+        with self.assertRaises(DeadlineExceeded):
+            deadline.sleep(10, slept.append)
+        self.assertEqual(slept, [4])
+
+
+class TestHedger(TestCase):
+    def test_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3], 1), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_delay(self):
+        hedger = Hedger(90, window=10, min_samples=5, initial_delay=2)
+        for elapsed in [0.1, 0.2, 0.3, 0.4]:
+            hedger.record(elapsed)
+        self.assertEqual(hedger.delay(), 2)
+        for elapsed in [0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1]:
+            hedger.record(elapsed)
+        # The first response recorded has left the window
+        self.assertEqual(hedger.delay(), 1.0)
+
+    def test_first_result_wins(self):
+        hedger = Hedger(initial_delay=0.05)
+        slow = threading.Event()
+        losers = []
+        calls = itertools.count()
+
+        class Result(object):
+            def __init__(self, name):
+                self.name = name
+
+            def close(self):
+                losers.append(self.name)
+
+        def function():
+            if next(calls) == 0:
+                slow.wait(5)
+                return Result("first")
+            return Result("second")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(hedger.call(executor, function).name, "second")
+            slow.set()
+        self.assertEqual(hedger.hedged, 1)
+        self.assertEqual(losers, ["first"])
+
+    def test_fast_results_are_not_hedged(self):
+        hedger = Hedger(initial_delay=5)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(hedger.call(executor, lambda: 1), 1)
+        self.assertEqual(hedger.hedged, 0)
+
+    def test_argument(self):
+        self.assertEqual(hedge_percentile("99.5"), 99.5)
+        for value in ["0", "100", "fast"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                hedge_percentile(value)
+
+
+class TestSlowResponses(TestCase):
+    def setUp(self):
+        self.stub = StubGitHub(synthetic_repo(30, tags=1)).start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+
+    def test_hedged_request(self):
+        expected = fetch_changes(self.github_config, "o", "r", "1.0.0")
+        hedger = Hedger(initial_delay=0.05)
+        # Only the first response is slow
+        delays = itertools.chain([2.0], itertools.repeat(0))
+        with mock.patch.object(
+            self.stub, "tail_delay", side_effect=lambda: next(delays)
+        ):
+            with GitHubClient(self.github_config, hedger=hedger) as client:
+                start = time.perf_counter()
+                changes = fetch_changes(
+                    self.github_config, "o", "r", "1.0.0", client=client
+                )
+                elapsed = time.perf_counter() - start
+        self.assertEqual(changes, expected)
+        self.assertEqual(hedger.hedged, 1)
+        self.assertLess(elapsed, 1.0)
+
+    def test_timeout(self):
+        self.stub.latency = 0.2
+        with self.assertRaises(DeadlineExceeded):
+            generate_changelog(
+                "o",
+                "r",
+                "1.0.0",
+                github_base_url=PUBLIC_GITHUB_URL,
+                github_api_url=self.stub.api_url,
+                timeout=0.3,
+            )
+
+        self.stub.latency = 0
+        self.assertTrue(
+            generate_changelog(
+                "o",
+                "r",
+                "1.0.0",
+                github_base_url=PUBLIC_GITHUB_URL,
+                github_api_url=self.stub.api_url,
+                timeout=10,
+            )
+        )
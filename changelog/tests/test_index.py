@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubCommitSource,
+    Merge,
+    PullRequest,
+    generate_changelog,
+    get_github_config,
+    main,
+)
+from changelog.index import IndexedPR, ReleaseIndex
+from changelog.tags import forget_tag_index
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+def pr(n):
+    return PullRequest(str(n), "Title for change {}".format(n))
+
+
+def sha(n):
+    return "{:040x}".format(n + 1)
+
+
+class TestReleaseIndex(TestCase):
+    def setUp(self):
+        self.commits = synthetic_commits(20)
+        self.repo = StubRepo(
+            self.commits[:10],
+            {"0.1.0": sha(2), "0.2.0": sha(6)},
+        )
+        self.stub = StubGitHub(self.repo).start()
+        self.addCleanup(self.stub.stop)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "index.sqlite3")
+        self.index = ReleaseIndex(self.path)
+        self.addCleanup(self.index.close)
+
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        self.source = GitHubCommitSource(self.github_config, "o", "r")
+        self.addCleanup(forget_tag_index, self.github_config, "o", "r")
+
+    def sync(self):
+        forget_tag_index(self.github_config, "o", "r")
+        return self.index.sync(self.source, "o", "r")
+
+    def test_lookup(self):
+        self.assertEqual(self.sync(), 10)
+        self.assertEqual(
+            self.index.lookup("o", "r", 4),
+            IndexedPR("4", "Title for change 4", sha(4), "0.2.0"),
+        )
+        self.assertEqual(self.index.lookup("o", "r", "1").release, "0.1.0")
+        self.assertIsNone(self.index.lookup("o", "r", 9).release)
+        self.assertIsNone(self.index.lookup("o", "r", 5))
+        self.assertIsNone(self.index.lookup("o", "other", 4))
+
+    def test_incremental_sync(self):
+        self.sync()
+        requests_made = self.stub.request_count
+        self.assertEqual(self.sync(), 0)
+
+        # Only the unreleased commits and the new ones are walked again
+        self.repo.commits = self.commits
+        self.repo.tags["0.3.0"] = sha(12)
+        self.assertEqual(self.sync(), 13)
+        self.assertEqual(self.index.lookup("o", "r", 9).release, "0.3.0")
+        self.assertEqual(self.index.lookup("o", "r", 12).release, "0.3.0")
+        self.assertIsNone(self.index.lookup("o", "r", 13).release)
+        self.assertEqual(self.index.lookup("o", "r", 4).release, "0.2.0")
+        self.assertGreater(self.stub.request_count, requests_made)
+
+    def test_moved_tag_rebuilds(self):
+        self.sync()
+        self.repo.tags["0.2.0"] = sha(3)
+        self.assertEqual(self.sync(), 10)
+        self.assertIsNone(self.index.lookup("o", "r", 4).release)
+        self.assertEqual(self.index.lookup("o", "r", 3).release, "0.2.0")
+
+    def test_force_push_drops_unreleased_commits(self):
+        self.sync()
+        self.repo.commits = self.commits[:8]
+        self.sync()
+        self.assertIsNone(self.index.lookup("o", "r", 9))
+        self.assertIsNotNone(self.index.lookup("o", "r", 7))
+
+    def test_changes(self):
+        self.sync()
+        self.assertEqual(
+            self.index.changes("o", "r", "0.1.0", "0.2.0"),
+            [pr(6), pr(4), pr(3)],
+        )
+        self.assertIsNone(self.index.changes("o", "r", "0.1.0", "9.9.9"))
+        self.assertEqual(
+            self.index.merges("o", "r", "0.1.0", "0.2.0"),
+            [Merge(sha(n), pr(n)) for n in [6, 4, 3]],
+        )
+
+    def test_generate_changelog_without_requests(self):
+        self.sync()
+        requests_made = self.stub.request_count
+        changelog = generate_changelog(
+            "o",
+            "r",
+            "0.1.0",
+            "0.2.0",
+            github_base_url=PUBLIC_GITHUB_URL,
+            github_api_url=self.stub.api_url,
+            index_path=self.path,
+        )
+        self.assertEqual(
+            changelog,
+            "\n".join(
+                "- Title for change {0} #{0}".format(n) for n in [6, 4, 3]
+            ),
+        )
+        self.assertEqual(self.stub.request_count, requests_made)
+
+    def test_cli(self):
+        args = ["o", "r", "--index", self.path]
+        args += ["--github-api-url", self.stub.api_url]
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["index"] + args)
+            self.assertEqual(main(["lookup"] + args + ["#3"]), 0)
+            with mock.patch("sys.stderr", io.StringIO()):
+                self.assertEqual(main(["lookup"] + args + ["5"]), 1)
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            ["Indexed 10 commits of o/r", "#3 Title for change 3: 0.2.0"],
+        )
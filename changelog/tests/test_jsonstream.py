@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import json
+from unittest import TestCase
+
+from changelog.jsonstream import KeyNotFoundError, iter_array
+
+
+def split(content, size):
+    chunks = []
+    while content:
+        chunks.append(content[:size])
+        content = content[size:]
+    return chunks
+
+
+class TestIterArray(TestCase):
+    body = {
+        "status": "ahead",
+        "ahead_by": 12345,
+        "base_commit": {"sha": "a", "parents": [{"sha": "b"}]},
+        "commits": [
+            {"sha": "1", "commit": {"message": "Café (#1)\n\nDetails"}},
+            {"sha": "2", "commit": {"message": 'Plain "quoted" [commit]'}},
+        ],
+        "files": [{"filename": "a.py", "patch": "+x\n" * 100}],
+    }
+
+    def test_any_chunk_boundaries(self):
+        """Values, including numbers and UTF-8 characters, may be split
+        across chunks anywhere"""
+        content = json.dumps(self.body, ensure_ascii=False).encode("utf-8")
+        for size in range(1, 64):
+            self.assertEqual(
+                list(iter_array(split(content, size), "commits")),
+                self.body["commits"],
+            )
+
+    def test_stops_at_end_of_array(self):
+        content = json.dumps(self.body, indent=2).encode("utf-8")
+        chunks = iter(split(content, 16))
+        self.assertEqual(
+            list(iter_array(chunks, "commits")), self.body["commits"]
+        )
+        # The files were never read
+        self.assertIn(b"patch", b"".join(chunks))
+
+    def test_empty_array(self):
+        self.assertEqual(
+            list(iter_array([b'{"commits": [ ]}'], "commits")), []
+        )
+
+    def test_missing_key(self):
+        with self.assertRaises(KeyNotFoundError):
+            list(iter_array([b"{}"], "commits"))
+        with self.assertRaises(KeyNotFoundError):
+            list(iter_array([b'{"files": []}'], "commits"))
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(iter_array([b'{"commits": [{"sha": "1"'], "commits"))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase, skipIf
+
+from changelog import (
+    PullRequest,
+    Release,
+    fetch_changes,
+    fetch_history,
+    generate_changelog,
+)
+from changelog.local import LocalCommitSource, LocalRepoError
+
+
+def git(path, *args):
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME="Someone",
+        GIT_AUTHOR_EMAIL="someone@example.com",
+        GIT_COMMITTER_NAME="Someone",
+        GIT_COMMITTER_EMAIL="someone@example.com",
+    )
+    return (
+        subprocess.check_output(["git", "-C", path] + list(args), env=env)
+        .decode("utf-8")
+        .strip()
+    )
+
+
+@skipIf(shutil.which("git") is None, "git is not installed")
+class TestLocalCommitSource(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        git(self.path, "init", "-q", "-b", "main")
+
+        self.commit("Initial commit")
+        git(self.path, "tag", "0.1.0")
+        self.commit("Merge pull request #2 from some/branch\n\nFirst title")
+        self.commit("Some fix")
+        self.commit("Second title (#3)\n\nA description\n")
+        git(self.path, "tag", "-a", "0.2.0", "-m", "Release 0.2.0")
+        self.commit("Third title (#4)")
+
+        self.source = LocalCommitSource(self.path)
+
+    def commit(self, message):
+        git(self.path, "commit", "-q", "--allow-empty", "-m", message)
+        return git(self.path, "rev-parse", "HEAD")
+
+    def test_get_commit_for_annotated_tag(self):
+        """Annotated tags are peeled to the commit they point to"""
+        self.assertEqual(
+            self.source.get_commit_for_tag("0.2.0"),
+            git(self.path, "rev-parse", "HEAD~1"),
+        )
+
+    def test_get_commit_for_missing_tag(self):
+        with self.assertRaises(LocalRepoError):
+            self.source.get_commit_for_tag("nope")
+
+    def test_get_last_commit(self):
+        self.assertEqual(
+            self.source.get_last_commit("main"),
+            git(self.path, "rev-parse", "HEAD"),
+        )
+        with self.assertRaises(LocalRepoError):
+            self.source.get_last_commit("nope")
+
+    def test_is_ancestor(self):
+        self.assertTrue(self.source.is_ancestor("0.1.0", "0.2.0"))
+        self.assertFalse(self.source.is_ancestor("0.2.0", "0.1.0"))
+        self.assertFalse(self.source.is_ancestor("0" * 40, "0.2.0"))
+
+    def test_iter_commits_between(self):
+        """Commits are listed oldest first with their full messages"""
+        commits = list(self.source.iter_commits_between("0.1.0", "0.2.0"))
+        self.assertEqual(
+            [c.message for c in commits],
+            [
+                "Merge pull request #2 from some/branch\n\nFirst title",
+                "Some fix",
+                "Second title (#3)\n\nA description",
+            ],
+        )
+        self.assertEqual(
+            commits[-1].sha, git(self.path, "rev-parse", "0.2.0^{}")
+        )
+
+    def test_fetch_changes(self):
+        """fetch_changes finds the same PRs from a local clone"""
+        prs = fetch_changes(
+            None, "o", "r", "0.1.0", branch="main", source=self.source
+        )
+        self.assertEqual(
+            prs,
+            [
+                PullRequest("4", "Third title"),
+                PullRequest("3", "Second title"),
+                PullRequest("2", "First title"),
+            ],
+        )
+
+    def test_get_tags(self):
+        """Annotated tags are peeled to the commit they point to"""
+        self.assertEqual(
+            dict(self.source.get_tags()),
+            {
+                "0.2.0": git(self.path, "rev-parse", "0.2.0^{}"),
+                "0.1.0": git(self.path, "rev-parse", "0.1.0"),
+            },
+        )
+
+    def test_fetch_history(self):
+        releases = fetch_history(None, "o", "r", source=self.source)
+        self.assertEqual(
+            releases,
+            [
+                Release(None, [PullRequest("4", "Third title")]),
+                Release(
+                    "0.2.0",
+                    [
+                        PullRequest("3", "Second title"),
+                        PullRequest("2", "First title"),
+                    ],
+                ),
+                Release("0.1.0", []),
+            ],
+        )
+
+    def test_generate_changelog(self):
+        result = generate_changelog(
+            "o",
+            "r",
+            "0.1.0",
+            "0.2.0",
+            markdown=True,
+            github_base_url="https://github.com",
+            local_repo=self.path,
+        )
+        self.assertEqual(
+            result,
+            "- Second title [#3](https://github.com/o/r/pull/3)\n"
+            "- First title [#2](https://github.com/o/r/pull/2)",
+        )
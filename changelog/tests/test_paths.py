@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubClient,
+    Merge,
+    PullRequest,
+    generate_changelog,
+    get_github_config,
+    main,
+)
+from changelog.cache import MemoryCache
+from changelog.local import LocalCommitSource
+from changelog.paths import (
+    PathChanges,
+    bucket_by_paths,
+    fetch_path_changes,
+    normalize_path,
+)
+from changelog.tests.stub_server import StubGitHub, synthetic_repo
+from changelog.tests.test_local import git
+
+
+class TestBucketByPaths(TestCase):
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path("./packages/api/"), "packages/api")
+        self.assertEqual(normalize_path("packages\\api"), "packages/api")
+        self.assertEqual(normalize_path("."), "")
+
+    def test_bucket_by_paths(self):
+        merges = [
+            Merge("c", PullRequest("3", "Both")),
+            Merge("b", PullRequest("2", "Neither")),
+            Merge("a", PullRequest("1", "API")),
+        ]
+        files = {
+            "a": ["packages/api/setup.py"],
+            "b": ["packages/api-client/setup.py", "README.md"],
+            "c": ["packages/api/x.py", "packages/web/y.py"],
+        }
+        self.assertEqual(
+            bucket_by_paths(
+                merges, files, ["packages/api/", "packages/web", "."]
+            ),
+            [
+                PathChanges("packages/api/", [merges[0], merges[2]]),
+                PathChanges("packages/web", [merges[0]]),
+                PathChanges(".", merges),
+            ],
+        )
+
+
+class TestGitHubPathChanges(TestCase):
+    def setUp(self):
+        self.repo = synthetic_repo(commits=60, tags=1, packages=5)
+        self.stub = StubGitHub(self.repo).start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        self.paths = ["packages/package-{}".format(i) for i in range(5)]
+
+    def expected(self, path):
+        """The numbers of the PRs that changed files under a path, newest
+        first"""
+        numbers = []
+        for i, commit in enumerate(self.repo.commits[1:], 1):
+            if i % 3 == 2:
+                continue
+            files = self.repo.commit_files[commit["sha"]]
+            if any(name.startswith(path + "/") for name in files):
+                numbers.append(str(i))
+        numbers.reverse()
+        return numbers
+
+    def fetch(self, paths, client=None):
+        return fetch_path_changes(
+            self.github_config, "o", "r", paths, "1.0.0", client=client
+        )
+
+    def test_fetch_path_changes(self):
+        changes = self.fetch(self.paths)
+        self.assertEqual([c.path for c in changes], self.paths)
+        for path_changes in changes:
+            self.assertEqual(
+                [pr.number for pr in path_changes.prs],
+                self.expected(path_changes.path),
+            )
+
+        # Two lookups to resolve the range, one page of it, and one
+        # request for each of the 39 PRs whatever the number of paths
+        self.assertEqual(self.stub.request_count, 42)
+        self.stub.request_count = 0
+        self.fetch(self.paths[:1])
+        self.assertEqual(self.stub.request_count, 42)
+
+    def test_files_are_cached(self):
+        with GitHubClient(self.github_config, cache=MemoryCache()) as client:
+            first = self.fetch(self.paths, client)
+            self.stub.request_count = 0
+            self.assertEqual(self.fetch(self.paths, client), first)
+        # Only the ends of the range are looked up again, as the commits
+        # between two shas and the files they changed never change
+        self.assertEqual(self.stub.request_count, 2)
+
+    @mock.patch("changelog.paths.COMMIT_FILES_PAGE_SIZE", 1)
+    def test_pages_of_files(self):
+        changes = self.fetch(["setup.py"])
+        self.assertEqual(
+            [pr.number for pr in changes[0].prs],
+            [str(i) for i in range(59, 0, -1) if i % 3 == 0],
+        )
+
+    def test_generate_changelog(self):
+        options = {
+            "github_base_url": PUBLIC_GITHUB_URL,
+            "github_api_url": self.stub.api_url,
+            "paths": ["packages/package-1", "packages/package-4"],
+        }
+        changelog = generate_changelog("o", "r", "1.0.0", **options)
+        lines = changelog.split("\n")
+        self.assertEqual(lines[0], "packages/package-1")
+        self.assertEqual(
+            lines[1:4],
+            [
+                "- Title for change 51 #51",
+                "- Title for change 46 #46",
+                "- Title for change 40 #40",
+            ],
+        )
+        self.assertIn("\n\npackages/package-4\n- Title", changelog)
+
+        document = json.loads(
+            generate_changelog(
+                "o", "r", "1.0.0", output_format="json", **options
+            )
+        )
+        self.assertEqual(
+            [path["path"] for path in document["paths"]], options["paths"]
+        )
+        self.assertEqual(
+            [pr["number"] for pr in document["paths"][0]["pull_requests"]],
+            [int(n) for n in self.expected("packages/package-1")],
+        )
+
+    def test_command_line_conflicts(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                main(["o", "r", "--path", "packages/a", "--full-history"])
+            with self.assertRaises(SystemExit):
+                main(["o", "r", "--path", "packages/a", "--ndjson"])
+
+
+@skipIf(shutil.which("git") is None, "git is not installed")
+class TestLocalPathChanges(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        git(self.path, "init", "-q", "-b", "main")
+        self.write("packages/api/setup.py")
+        git(self.path, "add", ".")
+        git(self.path, "commit", "-q", "-m", "Initial commit")
+        git(self.path, "tag", "0.1.0")
+
+        # A PR merged with a merge commit changes the web package
+        git(self.path, "checkout", "-q", "-b", "feature")
+        self.write("packages/web/app file.js")
+        git(self.path, "add", ".")
+        git(self.path, "commit", "-q", "-m", "Add the app")
+        git(self.path, "checkout", "-q", "main")
+        self.write("README.md")
+        git(self.path, "add", ".")
+        git(self.path, "commit", "-q", "-m", "Add a readme")
+        git(
+            self.path,
+            "merge",
+            "-q",
+            "--no-ff",
+            "feature",
+            "-m",
+            "Merge pull request #2 from some/feature\n\nAdd the app",
+        )
+
+        # A squashed PR moves a file from the api package to the web one
+        git(
+            self.path,
+            "mv",
+            "packages/api/setup.py",
+            "packages/web/setup.py",
+        )
+        git(self.path, "commit", "-q", "-m", "Move setup.py (#3)")
+        self.source = LocalCommitSource(self.path)
+
+    def write(self, name):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(name)
+
+    def test_fetch_path_changes(self):
+        changes = fetch_path_changes(
+            None,
+            "o",
+            "r",
+            ["packages/api", "packages/web", "README.md"],
+            "0.1.0",
+            branch="main",
+            source=self.source,
+        )
+        self.assertEqual(
+            [[pr.number for pr in c.prs] for c in changes],
+            [["3"], ["3", "2"], []],
+        )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import mock
+
+from changelog import Deadline, DeadlineExceeded, GitHubClient, get_last_commit
+from changelog.ratelimit import RateLimitBudget, RateLimiter
+from changelog.tests.test_changelog import fake_github_config
+
+
+def make_response(status_code, headers=None, json=None, text=""):
+    response = mock.MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = json
+    response.text = text
+    return response
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self):
+        self.sleep = mock.Mock()
+        self.rate_limiter = RateLimiter(clock=lambda: 1000, sleep=self.sleep)
+
+    def test_budget_from_headers(self):
+        self.rate_limiter.update(
+            "token a",
+            make_response(
+                200,
+                {
+                    "X-RateLimit-Limit": "5000",
+                    "X-RateLimit-Remaining": "4999",
+                    "X-RateLimit-Reset": "1600",
+                },
+            ),
+        )
+        self.assertEqual(
+            self.rate_limiter.budget("token a"),
+            RateLimitBudget(5000, 4999, 1600),
+        )
+        self.assertIsNone(self.rate_limiter.budget("token b"))
+
+    def test_no_delay_with_plenty_of_budget(self):
+        self.rate_limiter.budgets["token"] = RateLimitBudget(5000, 600, 1600)
+        self.assertEqual(self.rate_limiter.delay("token"), 0)
+
+    def test_paces_requests_as_budget_drains(self):
+        """Remaining requests are spread over the time until reset"""
+        self.rate_limiter.budgets["token"] = RateLimitBudget(5000, 100, 1600)
+        self.assertEqual(self.rate_limiter.delay("token"), 6)
+
+    def test_waits_for_reset_when_exhausted(self):
+        self.rate_limiter.budgets["token"] = RateLimitBudget(5000, 0, 1060)
+        self.rate_limiter.wait("token")
+        self.sleep.assert_called_once_with(60)
+
+    def test_does_not_wait_too_long(self):
+        """Waits longer than max_wait are left to the caller"""
+        self.rate_limiter.budgets["token"] = RateLimitBudget(5000, 0, 4600)
+        self.rate_limiter.wait("token")
+        self.sleep.assert_not_called()
+
+    @mock.patch("random.uniform", side_effect=lambda low, high: high)
+    def test_exponential_backoff(self, mock_uniform):
+        response = make_response(502)
+        delays = [self.rate_limiter.retry_delay(response, n) for n in range(6)]
+        self.assertEqual(delays, [1, 2, 4, 8, 16, None])
+
+    def test_retry_after(self):
+        """Secondary rate limits say how long to wait"""
+        response = make_response(403, {"Retry-After": "30"})
+        self.assertEqual(self.rate_limiter.retry_delay(response, 0), 30)
+
+    def test_secondary_rate_limit_message(self):
+        response = make_response(
+            403, text='{"message": "You have exceeded a secondary rate limit"}'
+        )
+        self.assertIsNotNone(self.rate_limiter.retry_delay(response, 0))
+
+    def test_primary_rate_limit_reset(self):
+        response = make_response(
+            429, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1045"}
+        )
+        self.assertEqual(self.rate_limiter.retry_delay(response, 0), 45)
+
+    def test_does_not_retry_other_errors(self):
+        self.assertIsNone(self.rate_limiter.retry_delay(make_response(404), 0))
+        self.assertIsNone(
+            self.rate_limiter.retry_delay(make_response(403, text="Nope"), 0)
+        )
+
+
+class TestGitHubClientRetries(TestCase):
+    def setUp(self):
+        self.sleep = mock.Mock()
+        self.client = GitHubClient(
+            fake_github_config,
+            rate_limiter=RateLimiter(clock=lambda: 1000, sleep=self.sleep),
+        )
+
+    def test_retries_server_errors(self):
+        """Requests are retried until GitHub answers successfully"""
+        responses = [
+            make_response(502),
+            make_response(403, {"Retry-After": "5"}),
+            make_response(
+                200,
+                {
+                    "X-RateLimit-Limit": "5000",
+                    "X-RateLimit-Remaining": "4000",
+                    "X-RateLimit-Reset": "1600",
+                },
+                [{"sha": "0123456789abcdef"}],
+            ),
+        ]
+        with mock.patch.object(
+            self.client.session, "get", side_effect=responses
+        ) as mock_get:
+            result = get_last_commit(
+                fake_github_config, "someone", "one-repo", client=self.client
+            )
+
+        self.assertEqual(result, "0123456789abcdef")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(self.sleep.call_args[0][0], 5)
+        self.assertEqual(
+            self.client.rate_limit, RateLimitBudget(5000, 4000, 1600)
+        )
+
+    def test_deadline_stops_waiting_for_reset(self):
+        """A client whose budget is spent gives up at once rather than wait
+        past its deadline for the reset"""
+        identity = self.client.identity
+        self.client.rate_limiter.budgets[identity] = RateLimitBudget(
+            5000, 0, 1100
+        )
+        client = self.client.with_deadline(Deadline(1))
+        with mock.patch.object(client.session, "get") as mock_get:
+            with self.assertRaises(DeadlineExceeded):
+                get_last_commit(
+                    fake_github_config, "someone", "one-repo", client=client
+                )
+        mock_get.assert_not_called()
+        self.sleep.assert_not_called()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    Merge,
+    PullRequest,
+    fetch_changes,
+    fetch_merges,
+    generate_changelog,
+    get_github_config,
+    iter_changelog_records,
+    main,
+)
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+def record(n):
+    return {
+        "sha": "{:040x}".format(n + 1),
+        "number": n,
+        "title": "Title for change {}".format(n),
+        "link": "https://github.com/someone/one-repo/pull/{}".format(n),
+    }
+
+
+class TestRecords(TestCase):
+    def setUp(self):
+        commits = synthetic_commits(10)
+        self.stub = StubGitHub(
+            StubRepo(
+                commits,
+                {"0.1.0": commits[2]["sha"], "0.2.0": commits[6]["sha"]},
+            )
+        ).start()
+        self.addCleanup(self.stub.stop)
+        self.options = {
+            "github_base_url": PUBLIC_GITHUB_URL,
+            "github_api_url": self.stub.api_url,
+            "branch": "main",
+        }
+
+    def test_merges(self):
+        """The shas in records come with the PRs, which are still just a
+        number and a title"""
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        args = (github_config, "someone", "one-repo", "0.2.0")
+        self.assertEqual(
+            fetch_merges(*args),
+            [
+                Merge(r["sha"], PullRequest(str(r["number"]), r["title"]))
+                for r in [record(9), record(7)]
+            ],
+        )
+        number, title = fetch_changes(*args)[0]
+        self.assertEqual((number, title), ("9", "Title for change 9"))
+
+    def test_json_document(self):
+        document = json.loads(
+            generate_changelog(
+                "someone",
+                "one-repo",
+                "0.2.0",
+                output_format="json",
+                **self.options,
+            )
+        )
+        self.assertEqual(
+            document,
+            {
+                "owner": "someone",
+                "repo": "one-repo",
+                "pull_requests": [record(9), record(7)],
+            },
+        )
+
+    def test_json_history(self):
+        document = json.loads(
+            generate_changelog(
+                "someone",
+                "one-repo",
+                "0.1.0",
+                full_history=True,
+                output_format="json",
+                single_line=True,
+                **self.options,
+            )
+        )
+        self.assertEqual(
+            [release["tag"] for release in document["releases"]],
+            [None, "0.2.0"],
+        )
+        self.assertEqual(
+            document["releases"][1]["pull_requests"],
+            [record(6), record(4), record(3)],
+        )
+
+    def test_records_stream_oldest_first(self):
+        records = iter_changelog_records(
+            "someone", "one-repo", "0.1.0", **self.options
+        )
+        self.assertEqual(next(records), record(3))
+        self.assertEqual(
+            list(records), [record(4), record(6), record(7), record(9)]
+        )
+
+    def test_history_records_have_releases(self):
+        records = list(
+            iter_changelog_records(
+                "someone",
+                "one-repo",
+                "0.1.0",
+                full_history=True,
+                **self.options,
+            )
+        )
+        self.assertEqual(
+            [(r["release"], r["number"]) for r in records],
+            [
+                (None, 9),
+                (None, 7),
+                ("0.2.0", 6),
+                ("0.2.0", 4),
+                ("0.2.0", 3),
+            ],
+        )
+
+    def test_cli_ndjson(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(
+                [
+                    "someone",
+                    "one-repo",
+                    "0.2.0",
+                    "--ndjson",
+                    "--github-api-url",
+                    self.stub.api_url,
+                ]
+            )
+        self.assertEqual(
+            [json.loads(line) for line in output.getvalue().splitlines()],
+            [record(7), record(9)],
+        )
+
+    def test_cli_rejects_markdown(self):
+        with redirect_stdout(io.StringIO()), self.assertRaises(SystemExit):
+            main(["someone", "one-repo", "--json", "-m"])
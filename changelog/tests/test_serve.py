@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+from unittest import TestCase
+
+import mock
+import requests
+
+from changelog import PUBLIC_GITHUB_URL, GitHubClient, get_github_config
+from changelog.cache import MemoryCache
+from changelog.serve import ChangelogServer, ChangelogService
+from changelog.tags import forget_tag_index
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+class TestServe(TestCase):
+    def setUp(self):
+        self.commits = synthetic_commits(10)
+        self.repo = StubRepo(self.commits, {"0.1.0": self.commits[2]["sha"]})
+        self.stub = StubGitHub(self.repo).start()
+        self.addCleanup(self.stub.stop)
+
+        github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        forget_tag_index(github_config, "someone", "one-repo")
+        self.addCleanup(forget_tag_index, github_config, "someone", "one-repo")
+
+        client = GitHubClient(github_config, cache=MemoryCache())
+        self.addCleanup(client.close)
+        self.service = ChangelogService(
+            client, PUBLIC_GITHUB_URL, self.stub.api_url
+        )
+        self.server = ChangelogServer(
+            ("127.0.0.1", 0), self.service, webhook_secret="s3cret", quiet=True
+        )
+        thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+
+    def get(self, path, **params):
+        return self.session.get(self.server.url + path, params=params)
+
+    def webhook(self, event, payload, secret="s3cret"):
+        body = json.dumps(payload).encode("utf-8")
+        digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256)
+        return self.session.post(
+            self.server.url + "/webhook",
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-GitHub-Event": event,
+                "X-Hub-Signature-256": "sha256=" + digest.hexdigest(),
+            },
+        )
+
+    def test_changelogs_are_kept(self):
+        response = self.get("/someone/one-repo", format="markdown")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Changelog-Cache"], "miss")
+        self.assertIn("text/markdown", response.headers["Content-Type"])
+        self.assertIn("- Title for change 9 [#9](", response.text)
+        requests_made = self.stub.request_count
+
+        response = self.get("/someone/one-repo", format="markdown")
+        self.assertEqual(response.headers["X-Changelog-Cache"], "hit")
+        self.assertEqual(self.stub.request_count, requests_made)
+
+    def test_push_to_branch_drops_its_changelogs(self):
+        self.get("/someone/one-repo")
+        self.get("/someone/one-repo", branch=self.commits[-1]["sha"])
+        self.get("/someone/one-repo", previous="0.1.0", current="0.1.0")
+
+        response = self.webhook(
+            "push",
+            {
+                "ref": "refs/heads/main",
+                "repository": {"full_name": "Someone/One-Repo"},
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"dropped": 1})
+
+        response = self.get("/someone/one-repo")
+        self.assertEqual(response.headers["X-Changelog-Cache"], "miss")
+        response = self.get(
+            "/someone/one-repo", branch=self.commits[-1]["sha"]
+        )
+        self.assertEqual(response.headers["X-Changelog-Cache"], "hit")
+
+    def test_new_tag_drops_every_changelog(self):
+        self.get("/someone/one-repo")
+        self.get("/someone/one-repo", previous="0.1.0", current="0.1.0")
+        self.repo.tags["0.2.0"] = self.commits[5]["sha"]
+
+        response = self.webhook(
+            "create",
+            {
+                "ref": "0.2.0",
+                "ref_type": "tag",
+                "repository": {"full_name": "someone/one-repo"},
+            },
+        )
+        self.assertEqual(response.json(), {"dropped": 2})
+
+        # The tags are listed again, so the new tag is the previous one
+        response = self.get("/someone/one-repo")
+        self.assertEqual(response.headers["X-Changelog-Cache"], "miss")
+        self.assertNotIn("change 5 ", response.text)
+        self.assertIn("change 6 ", response.text)
+
+    def test_webhook_during_generation(self):
+        started = threading.Event()
+        release = threading.Event()
+        heads = iter(["old head", "new head"])
+
+        def generate(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return next(heads)
+
+        push = {
+            "ref": "refs/heads/main",
+            "repository": {"full_name": "someone/one-repo"},
+        }
+        results = []
+        with mock.patch("changelog.serve.generate_changelog", generate):
+            thread = threading.Thread(
+                target=lambda: results.append(
+                    self.service.changelog("someone", "one-repo")
+                )
+            )
+            thread.start()
+            started.wait(5)
+            self.service.handle_event("push", push)
+            release.set()
+            thread.join()
+            self.assertEqual(results, [("old head", False)])
+
+            # The changelog generated across the push isn't kept
+            self.assertEqual(
+                self.service.changelog("someone", "one-repo"),
+                ("new head", False),
+            )
+        self.assertEqual(
+            self.service.changelog("someone", "one-repo"), ("new head", True)
+        )
+
+    def test_changelogs_are_bounded(self):
+        self.service.max_changelogs = 2
+        generate = mock.Mock(side_effect=lambda *args, **kwargs: args[2])
+        with mock.patch("changelog.serve.generate_changelog", generate):
+            for previous in ["a", "b", "a", "c"]:
+                self.service.changelog("someone", "one-repo", previous)
+            # b was used least recently
+            self.assertEqual(
+                [key[2] for key in self.service.changelogs], ["a", "c"]
+            )
+
+            # Expired changelogs are dropped when another is kept
+            self.service.max_age = 0
+            with mock.patch("time.time", return_value=time.time() + 1):
+                self.service.changelog("someone", "one-repo", "d")
+            self.assertEqual(
+                [key[2] for key in self.service.changelogs], ["d"]
+            )
+        self.assertEqual(self.service.pending, [])
+
+    def test_other_events_are_ignored(self):
+        self.get("/someone/one-repo")
+        response = self.webhook("ping", {"zen": "Keep it logically awesome."})
+        self.assertEqual(response.json(), {"dropped": 0})
+        response = self.get("/someone/one-repo")
+        self.assertEqual(response.headers["X-Changelog-Cache"], "hit")
+
+    def test_bad_webhook_signature(self):
+        response = self.webhook("push", {}, secret="wrong")
+        self.assertEqual(response.status_code, 401)
+
+    def test_errors(self):
+        self.assertEqual(self.get("/someone").status_code, 404)
+        self.assertEqual(
+            self.get("/someone/one-repo", format="html").status_code, 400
+        )
+        response = self.get("/someone/one-repo", previous="9.9.9")
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("Unable to get tag 9.9.9", response.text)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    fetch_changes,
+    generate_changelog,
+    get_github_config,
+)
+from changelog.shard import ShardedCommitSource, shard_boundaries
+from changelog.tags import TagIndex
+from changelog.tests.stub_server import StubGitHub, synthetic_repo
+
+
+class TestShardBoundaries(TestCase):
+    def test_tags_in_version_order(self):
+        tags = [
+            ("v2.0.0", "e"),
+            ("1.10.0", "d"),
+            ("1.9.0", "c"),
+            ("1.9.0-rc.1", "b"),
+            ("nightly", "x"),
+            ("1.0.0", "a"),
+        ]
+        self.assertEqual(
+            shard_boundaries(tags, "a", "d"), ["a", "b", "c", "d"]
+        )
+        self.assertEqual(
+            shard_boundaries(tags, "c", "head"), ["c", "d", "e", "head"]
+        )
+        self.assertEqual(shard_boundaries(tags, "x", "e"), ["x", "e"])
+
+
+class TestShardedCommitSource(TestCase):
+    def setUp(self):
+        self.repo = synthetic_repo(commits=500, tags=5)
+        self.stub = StubGitHub(self.repo).start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+
+    def fetch(self, source=None, previous_tag="1.0.0"):
+        return fetch_changes(
+            self.github_config,
+            "o",
+            "r",
+            previous_tag,
+            branch="main",
+            source=source,
+        )
+
+    def sharded_source(self):
+        index = TagIndex(sorted(self.repo.tags.items()))
+        return ShardedCommitSource(
+            self.github_config, "o", "r", index=index, max_workers=4
+        )
+
+    @mock.patch("changelog.shard.COMPARE_PAGE_SIZE", 30)
+    def test_same_changes(self):
+        serial = self.fetch()
+        self.stub.request_count = 0
+        self.assertEqual(self.fetch(self.sharded_source()), serial)
+        # Shards of 100 commits in pages of 30, and the ends resolved
+        self.assertEqual(self.stub.request_count, 5 * 4 + 1)
+
+    def test_untagged_range(self):
+        # Without a version tag to start from, the range is one shard
+        self.repo.tags["nightly"] = self.repo.commits[250]["sha"]
+        self.assertEqual(
+            self.fetch(self.sharded_source(), "nightly"),
+            self.fetch(previous_tag="nightly"),
+        )
+
+    def test_tags_out_of_history_order(self):
+        # A patch release tagged after the next minor release falls back to
+        # comparing the whole range
+        self.repo.tags["1.1.5"] = self.repo.commits[350]["sha"]
+        serial = self.fetch()
+        self.assertEqual(self.fetch(self.sharded_source()), serial)
+
+    def test_generate_changelog(self):
+        options = {
+            "github_base_url": PUBLIC_GITHUB_URL,
+            "github_api_url": self.stub.api_url,
+            "branch": "main",
+        }
+        self.assertEqual(
+            generate_changelog("o", "r", "1.2.0", sharded=True, **options),
+            generate_changelog("o", "r", "1.2.0", **options),
+        )
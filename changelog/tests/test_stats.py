@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import shutil
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+
+from changelog import PUBLIC_GITHUB_URL, generate_changelog, main
+from changelog.ratelimit import RateLimitBudget
+from changelog.stats import RequestEvent, Stats, endpoint_name
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+class TestStats(TestCase):
+    def setUp(self):
+        commits = synthetic_commits(10)
+        tags = {"0.1.0": commits[2]["sha"]}
+        self.stub = StubGitHub(StubRepo(commits, tags))
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def generate(self, stats):
+        return generate_changelog(
+            "someone",
+            "one-repo",
+            "0.1.0",
+            github_base_url=PUBLIC_GITHUB_URL,
+            github_api_url=self.stub.api_url,
+            branch="main",
+            cache_dir=self.cache_dir,
+            observer=stats,
+        )
+
+    def test_requests_and_phases(self):
+        stats = Stats()
+        self.generate(stats)
+        self.assertEqual(
+            sorted(e.endpoint for e in stats.requests),
+            ["commits", "compare", "git/refs/tags"],
+        )
+        for event in stats.requests:
+            self.assertEqual(event.status_code, 200)
+            self.assertEqual(event.cache, "miss")
+            self.assertGreater(event.bytes, 0)
+        self.assertEqual(
+            sorted(stats.phases), ["extract", "fetch", "format", "resolve"]
+        )
+
+        # The refs are revalidated the second time around, while the
+        # comparison of two shas is served straight from the cache
+        stats = Stats()
+        self.generate(stats)
+        self.assertEqual(
+            {e.endpoint: e.cache for e in stats.requests},
+            {
+                "commits": "revalidated",
+                "git/refs/tags": "revalidated",
+                "compare": "hit",
+            },
+        )
+        self.assertEqual(
+            sum(totals["cached"] for totals in stats.summary().values()), 3
+        )
+
+    def test_cli_json(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            main(
+                [
+                    "someone",
+                    "one-repo",
+                    "0.1.0",
+                    "--github-api-url",
+                    self.stub.api_url,
+                    "--stats",
+                    "json",
+                ]
+            )
+        report = json.loads(stderr.getvalue())
+        self.assertEqual(len(report["requests"]), 3)
+        self.assertEqual(report["endpoints"]["compare"]["count"], 1)
+        self.assertIn("- Title for change 9 #9", stdout.getvalue())
+
+    def test_format_table(self):
+        stats = Stats()
+        stats.on_request(
+            RequestEvent(
+                "GET",
+                "https://api.github.com/repos/o/r/compare/a...b",
+                "compare",
+                200,
+                0.25,
+                2048,
+                None,
+                RateLimitBudget(5000, 4999, 0),
+                0,
+            )
+        )
+        lines = stats.format_table()
+        self.assertEqual(
+            lines[1].split(), ["compare", "1", "0", "0", "0.250", "2.0"]
+        )
+        self.assertTrue(lines[-1].startswith("rate limit: 4999 of 5000"))
+
+    def test_endpoint_name(self):
+        self.assertEqual(
+            endpoint_name("https://h/api/v3/repos/o/r/git/refs/tags/1.0"),
+            "git/refs/tags",
+        )
+        self.assertEqual(endpoint_name("https://h/repos/o/r/tags"), "tags")
+        self.assertEqual(endpoint_name("https://h/repos/o/r/tagsx"), "other")
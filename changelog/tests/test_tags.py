@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from unittest import TestCase
+
+import mock
+
+from changelog import (
+    PUBLIC_GITHUB_URL,
+    GitHubClient,
+    PullRequest,
+    fetch_changes,
+    get_github_config,
+    tags,
+)
+from changelog.tags import (
+    IndexedCommitSource,
+    TagIndex,
+    forget_tag_index,
+    get_tag_index,
+    set_tag_index,
+    version_key,
+)
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+
+
+class TestVersionKey(TestCase):
+    def test_precedence(self):
+        tags = [
+            "1.0.0-alpha",
+            "1.0.0-alpha.1",
+            "1.0.0-alpha.beta",
+            "1.0.0-beta.2",
+            "1.0.0-beta.11",
+            "1.0.0-rc.1",
+            "1.0.0",
+            "v1.9.0",
+            "1.10.0+build.5",
+        ]
+        self.assertEqual(sorted(tags[::-1], key=version_key), tags)
+
+    def test_not_a_version(self):
+        self.assertIsNone(version_key("release-2020"))
+        self.assertIsNone(version_key("1.2"))
+        self.assertIsNone(version_key("01.2.3"))
+
+
+class TestTagIndex(TestCase):
+    def test_latest_is_highest_version(self):
+        """GitHub lists tags by name, which puts 1.9.0 ahead of 1.10.0"""
+        index = TagIndex(
+            [("nightly", "a"), ("1.9.0", "b"), ("1.10.0", "c"), ("1.1", "d")]
+        )
+        self.assertEqual(index.latest(), "1.10.0")
+
+    def test_latest_without_versions(self):
+        index = TagIndex([("nightly", "a"), ("stable", "b")])
+        self.assertEqual(index.latest(), "nightly")
+
+    def test_save_and_load(self):
+        index = TagIndex([("1.0.0", "a"), ("0.9.0", "b")])
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        index.save(path)
+        loaded = TagIndex.load(path)
+        self.assertEqual(loaded.tags, index.tags)
+        self.assertEqual(loaded.created, index.created)
+        self.assertEqual(loaded.commit_for_tag("0.9.0"), "b")
+
+
+class TestIndexedCommitSource(TestCase):
+    def setUp(self):
+        self.commits = synthetic_commits(12)
+        tags = OrderedDict(
+            (name, self.commits[i]["sha"])
+            for i, name in enumerate(["0.1.0", "0.9.0", "0.10.0", "v0.11.0"])
+        )
+        for i in range(4, 8):
+            tags["build-{}".format(i)] = self.commits[i]["sha"]
+
+        self.stub = StubGitHub(StubRepo(self.commits, tags))
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        self.github_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, None
+        )
+        self.addCleanup(
+            forget_tag_index, self.github_config, "someone", "one-repo"
+        )
+
+    @mock.patch("changelog.tags.TAGS_PAGE_SIZE", 3)
+    def test_index_lists_every_page(self):
+        index = TagIndex.from_github(self.github_config, "someone", "one-repo")
+        self.assertEqual(len(index.tags), 8)
+        self.assertEqual(self.stub.request_count, 3)
+        self.assertEqual(index.commit_for_tag("0.9.0"), self.commits[1]["sha"])
+
+    def test_both_ends_from_one_listing(self):
+        """Both tags are resolved from the index, built once and shared"""
+        with GitHubClient(self.github_config) as client:
+            source = IndexedCommitSource(
+                self.github_config, "someone", "one-repo", client
+            )
+            result = fetch_changes(
+                self.github_config,
+                "someone",
+                "one-repo",
+                "0.9.0",
+                "v0.11.0",
+                source=source,
+            )
+            self.assertEqual(
+                result,
+                [PullRequest(number="3", title="Title for change 3")],
+            )
+            # One listing of tags and one compare
+            self.assertEqual(self.stub.request_count, 2)
+
+            # A second changelog reuses the index from the first
+            fetch_changes(
+                self.github_config,
+                "someone",
+                "one-repo",
+                "0.1.0",
+                "0.10.0",
+                source=source,
+            )
+            self.assertEqual(self.stub.request_count, 3)
+
+    def test_defaults_to_highest_version(self):
+        source = IndexedCommitSource(self.github_config, "someone", "one-repo")
+        self.assertEqual(source.get_last_tag(), "v0.11.0")
+
+    def test_shared_within_the_process(self):
+        first = get_tag_index(self.github_config, "someone", "one-repo")
+        second = get_tag_index(self.github_config, "someone", "one-repo")
+        self.assertIs(first, second)
+
+        third = get_tag_index(
+            self.github_config, "someone", "one-repo", max_age=-1
+        )
+        self.assertIsNot(first, third)
+
+    def test_kept_for_each_token(self):
+        """An index listed with a token isn't shared without one"""
+        token_config = get_github_config(
+            PUBLIC_GITHUB_URL, self.stub.api_url, "fake-github-token"
+        )
+        first = get_tag_index(token_config, "someone", "one-repo")
+        self.assertIsNot(
+            get_tag_index(self.github_config, "someone", "one-repo"), first
+        )
+        self.assertIs(
+            get_tag_index(token_config, "someone", "one-repo"), first
+        )
+
+        forget_tag_index(self.github_config, "someone", "one-repo")
+        self.assertIsNot(
+            get_tag_index(token_config, "someone", "one-repo"), first
+        )
+
+    @mock.patch("changelog.tags.MAX_TAG_INDEXES", 2)
+    def test_least_recently_used_are_dropped(self):
+        for repo in ["a", "b", "a", "c"]:
+            get_tag_index(self.github_config, "someone", repo)
+            self.addCleanup(
+                forget_tag_index, self.github_config, "someone", repo
+            )
+        kept = [key[2] for key in tags._indexes if key[1] == "someone"]
+        self.assertEqual(kept, ["a", "c"])
+
+        # Expired indexes are dropped when another is kept
+        with mock.patch("time.time", return_value=time.time() + 3600):
+            set_tag_index(self.github_config, "someone", "d", TagIndex([]))
+        kept = [key[2] for key in tags._indexes if key[1] == "someone"]
+        self.assertEqual(kept, ["d"])
+
+    def test_new_tag_falls_back_to_ref(self):
+        index = TagIndex([("0.1.0", self.commits[0]["sha"])])
+        source = IndexedCommitSource(
+            self.github_config, "someone", "one-repo", index=index
+        )
+        self.assertEqual(
+            source.get_commit_for_tag("0.9.0"), self.commits[1]["sha"]
+        )
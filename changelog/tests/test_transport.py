@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import subprocess
+import sys
+from unittest import TestCase
+
+from changelog import PUBLIC_GITHUB_URL, generate_changelog
+from changelog.tests.stub_server import StubGitHub, StubRepo, synthetic_commits
+from changelog.transport import (
+    Headers,
+    HTTPError,
+    Response,
+    UrllibSession,
+    parse_links,
+)
+
+
+# Most milliseconds `import changelog` may take, including everything it
+# imports. Without requests and its dependencies it takes a fraction of this.
+IMPORT_TIME_BUDGET_MS = float(
+    os.environ.get("CHANGELOG_IMPORT_TIME_BUDGET_MS", 100)
+)
+
+# Modules that only the code that needs them may import
+DEFERRED_MODULES = [
+    "requests",
+    "urllib3",
+    "http.client",
+    "ssl",
+    "concurrent.futures",
+]
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+class TestHeaders(TestCase):
+    def test_case_insensitive(self):
+        headers = Headers({"ETag": '"abc"'})
+        headers["content-type"] = "application/json"
+        self.assertEqual(headers["etag"], '"abc"')
+        self.assertIn("Content-Type", headers)
+        self.assertEqual(sorted(headers), ["ETag", "content-type"])
+
+    def test_parse_links(self):
+        links = parse_links(
+            '<https://api.github.com/x?page=2>; rel="next", '
+            '<https://api.github.com/x?page=5>; rel="last"'
+        )
+        self.assertEqual(
+            links["next"],
+            {"url": "https://api.github.com/x?page=2", "rel": "next"},
+        )
+        self.assertEqual(
+            links["last"]["url"], "https://api.github.com/x?page=5"
+        )
+        self.assertEqual(parse_links(None), {})
+
+    def test_raise_for_status(self):
+        Response(200, {}).raise_for_status()
+        with self.assertRaises(HTTPError):
+            Response(404, {}, b"", "http://foo").raise_for_status()
+
+
+class TestUrllibTransport(TestCase):
+    def setUp(self):
+        self.commits = synthetic_commits(10)
+        self.repo = StubRepo(self.commits, {"0.1.0": self.commits[2]["sha"]})
+
+    def generate(self, stub, transport, branch="main"):
+        return generate_changelog(
+            "someone",
+            "one-repo",
+            "0.1.0",
+            github_base_url=PUBLIC_GITHUB_URL,
+            github_api_url=stub.api_url,
+            branch=branch,
+            transport=transport,
+        )
+
+    def test_same_changelog_as_requests(self):
+        with StubGitHub(self.repo) as stub:
+            self.assertEqual(
+                self.generate(stub, "urllib"), self.generate(stub, "requests")
+            )
+
+    def test_default_branch(self):
+        """Without a branch, none is asked for rather than one named None"""
+        with StubGitHub(self.repo) as stub:
+            self.assertEqual(
+                self.generate(stub, "urllib", branch=None),
+                self.generate(stub, "requests", branch=None),
+            )
+
+    def test_gzip(self):
+        with StubGitHub(self.repo, gzip=True) as stub:
+            changelog = self.generate(stub, "urllib")
+        self.assertIn("- Title for change 9 #9", changelog)
+
+    def test_reuses_connections(self):
+        session = UrllibSession(pool_maxsize=2)
+        self.addCleanup(session.close)
+        with StubGitHub(self.repo) as stub:
+            url = stub.api_url + "/repos/o/r/commits"
+            for _ in range(3):
+                response = session.get(url, params={"per_page": 2})
+                self.assertEqual(len(response.json()), 2)
+                self.assertIn("next", response.links)
+
+            # A streamed response read part of the way can't be reused
+            response = session.get(url, stream=True)
+            next(response.iter_content(10))
+            response.close()
+            session.get(url)
+        self.assertEqual(len(stub.connections), 2)
+
+    def test_cli_never_imports_requests(self):
+        with StubGitHub(self.repo) as stub:
+            output = run_python(
+                "-c",
+                "import sys\n"
+                "from changelog import main\n"
+                "main(sys.argv[1:])\n"
+                "assert 'requests' not in sys.modules\n",
+                "someone",
+                "one-repo",
+                "0.1.0",
+                "--github-api-url",
+                stub.api_url,
+                "--transport",
+                "urllib",
+            ).stdout
+        self.assertIn("- Title for change 9 #9", output)
+
+
+class TestImportTime(TestCase):
+    def test_deferred_modules(self):
+        output = run_python(
+            "-c",
+            "import json, sys\n"
+            "import changelog\n"
+            "changelog.extract_pr('Fix a bug (#12)')\n"
+            "print(json.dumps(sorted(sys.modules)))\n",
+        ).stdout
+        modules = json.loads(output)
+        for name in DEFERRED_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_budget(self):
+        stderr = run_python(
+            "-X", "importtime", "-c", "import changelog"
+        ).stderr
+        cumulative = None
+        for line in stderr.splitlines():
+            match = IMPORT_TIME_RE.match(line)
+            if match is not None and match.group(4) == "changelog":
+                cumulative = int(match.group(2)) / 1000.0
+        self.assertIsNotNone(cumulative)
+        self.assertLess(cumulative, IMPORT_TIME_BUDGET_MS)
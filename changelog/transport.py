@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+The HTTP libraries GitHubClient can make its requests with.
+
+By default requests are made with a requests.Session. The "urllib"
+transport is a session built only on the standard library's http.client,
+for installs where importing requests, urllib3 and their dependencies costs
+more than the requests themselves, e.g. a CLI invoked many times over from
+CI. Its responses have the parts of requests' Response that changelog uses.
+
+Neither transport's HTTP library is imported until a session is created.
+"""
+import io
+import json
+import re
+import threading
+import zlib
+from collections.abc import MutableMapping
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+
+TRANSPORTS = ("requests", "urllib")
+DEFAULT_TRANSPORT = "requests"
+
+# Bytes read from the socket at a time when a whole response is read
+READ_SIZE = 64 * 1024
+
+# Sent by the urllib transport, as GitHub rejects requests without one
+USER_AGENT = "github-changelog"
+
+LINK_SEPARATOR_RE = re.compile(r",\s*(?=<)")
+
+
+class HTTPError(IOError):
+    """A response had a 4xx or 5xx status"""
+
+    def __init__(self, message, response=None):
+        super(HTTPError, self).__init__(message)
+        self.response = response
+
+
+class Headers(MutableMapping):
+    """A dict of HTTP headers with case insensitive names"""
+
+    def __init__(self, headers=()):
+        self._headers = {}
+        self.update(headers)
+
+    def __getitem__(self, name):
+        return self._headers[name.lower()][1]
+
+    def __setitem__(self, name, value):
+        self._headers[name.lower()] = (name, value)
+
+    def __delitem__(self, name):
+        del self._headers[name.lower()]
+
+    def __iter__(self):
+        return (name for name, _ in self._headers.values())
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def parse_links(value):
+    """Parse a Link header into a dict keyed by each link's rel, like
+    requests' Response.links"""
+    links = {}
+    for link in LINK_SEPARATOR_RE.split(value or ""):
+        url, _, params = link.partition(";")
+        url = url.strip().strip("<>")
+        if not url:
+            continue
+        parsed = {"url": url}
+        for param in params.split(";"):
+            name, _, param_value = param.partition("=")
+            if name.strip():
+                parsed[name.strip()] = param_value.strip().strip("'\"")
+        links[parsed.get("rel") or url] = parsed
+    return links
+
+
+class Response(object):
+    """The parts of an HTTP response that changelog uses, held in memory"""
+
+    def __init__(self, status_code, headers, content=b"", url=None):
+        self.status_code = status_code
+        self.headers = Headers(headers)
+        self.url = url
+        self._content = content
+
+    @property
+    def content(self):
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+    @property
+    def links(self):
+        return parse_links(self.headers.get("Link"))
+
+    def iter_content(self, chunk_size=1):
+        stream = io.BytesIO(self.content)
+        return iter(lambda: stream.read(chunk_size), b"")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError(
+                "{} error for url: {}".format(self.status_code, self.url),
+                response=self,
+            )
+
+    def close(self):
+        pass
+
+
+class UrllibResponse(Response):
+    """A response read from an http.client connection as it's needed
+
+    Once the body has been read to its end the connection goes back to its
+    session's pool. Closing a response part way through closes the
+    connection instead.
+    """
+
+    def __init__(self, session, key, connection, raw, url):
+        headers = Headers()
+        for name, value in raw.getheaders():
+            if name in headers:
+                value = headers[name] + ", " + value
+            headers[name] = value
+        super(UrllibResponse, self).__init__(raw.status, headers, None, url)
+        self.session = session
+        self.key = key
+        self.connection = connection
+        self.raw = raw
+
+        encoding = headers.get("Content-Encoding", "").lower()
+        if encoding == "gzip":
+            self.decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self.decoder = zlib.decompressobj()
+        else:
+            self.decoder = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b"".join(self.read_chunks(READ_SIZE))
+        return self._content
+
+    def iter_content(self, chunk_size=1):
+        if self._content is not None:
+            return super(UrllibResponse, self).iter_content(chunk_size)
+        return self.read_chunks(chunk_size)
+
+    def read_chunks(self, chunk_size):
+        try:
+            while True:
+                chunk = self.raw.read(chunk_size)
+                if not chunk:
+                    break
+                if self.decoder is not None:
+                    chunk = self.decoder.decompress(chunk)
+                if chunk:
+                    yield chunk
+            if self.decoder is not None:
+                chunk = self.decoder.flush()
+                if chunk:
+                    yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        if self.raw.isclosed() and not self.raw.will_close:
+            self.session.release(self.key, connection)
+        else:
+            self.raw.close()
+            connection.close()
+
+
+class UrllibSession(object):
+    """A keep-alive session built on http.client
+
+    Only the parts of requests.Session that GitHubClient uses are provided:
+    headers sent with every request, get, post and close. Idle connections
+    are kept for reuse, at most pool_maxsize for each host. Proxies set in
+    the environment are not used.
+    """
+
+    def __init__(self, pool_maxsize):
+        self.pool_maxsize = pool_maxsize
+        self.headers = Headers({"User-Agent": USER_AGENT})
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.ssl_context = None
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def connect(self, key, timeout):
+        """Take an idle connection to a host, or open a new one
+
+        Also returns whether the connection was used before.
+        """
+        with self.lock:
+            idle = self.pools.get(key)
+            if idle:
+                return idle.pop(), True
+
+        import http.client
+
+        scheme, host, port = key
+        if scheme == "https":
+            if self.ssl_context is None:
+                import ssl
+
+                self.ssl_context = ssl.create_default_context()
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=timeout, context=self.ssl_context
+            )
+        else:
+            connection = http.client.HTTPConnection(
+                host, port, timeout=timeout
+            )
+        connection.connect()
+        return connection, False
+
+    def release(self, key, connection):
+        """Keep a connection for the next request to its host"""
+        with self.lock:
+            idle = self.pools.setdefault(key, [])
+            if len(idle) < self.pool_maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(
+        self,
+        method,
+        url,
+        params=None,
+        json=None,
+        headers=None,
+        timeout=None,
+        stream=False,
+    ):
+        import http.client
+
+        # Like requests, parameters set to None are left out
+        if params:
+            params = [(k, v) for k, v in params.items() if v is not None]
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+
+        request_headers = Headers(self.headers)
+        request_headers.update(headers or {})
+        body = None
+        if json is not None:
+            body = _json_dumps(json).encode("utf-8")
+            request_headers["Content-Type"] = "application/json"
+
+        # Like requests, a timeout is a number or a (connect, read) pair
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+
+        while True:
+            connection, reused = self.connect(key, connect_timeout)
+            try:
+                connection.sock.settimeout(read_timeout)
+                connection.request(
+                    method, path, body=body, headers=dict(request_headers)
+                )
+                raw = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # The server may have closed an idle connection since it
+                # was last used, so try again on another
+                if reused:
+                    continue
+                raise
+            break
+
+        response = UrllibResponse(self, key, connection, raw, url)
+        if not stream:
+            # Read the whole body now, which frees the connection
+            response.content
+        return response
+
+    def close(self):
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for idle in pools.values():
+            for connection in idle:
+                connection.close()
+
+
+# request's json argument shadows the module
+_json_dumps = json.dumps
+
+
+def new_session(transport, pool_connections, pool_maxsize):
+    """Create a session for a transport named in TRANSPORTS"""
+    if transport == "requests":
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    if transport == "urllib":
+        return UrllibSession(pool_maxsize)
+    raise ValueError(
+        "Unknown transport {}, use one of: {}".format(
+            transport, ", ".join(TRANSPORTS)
+        )
+    )
@@ -16,12 +16,21 @@ setup(
     long_description_content_type="text/markdown",
     include_package_data=True,
     packages=find_packages(),
+    package_data={"changelog.tests": ["fixtures/*.json"]},
     install_requires=[
         "requests>=2.13",
     ],
     extras_require={
+        "async": [
+            "aiohttp>=3.7",
+        ],
+        "yaml": [
+            "PyYAML",
+        ],
         "testing": [
+            "aiohttp>=3.7",
             "mock>=2.0.0",
+            "PyYAML",
             "coverage>=3.7.0",
             "flake8>=2.2.0",
         ],